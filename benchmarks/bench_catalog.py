@@ -0,0 +1,98 @@
+# coding: utf-8
+
+"""
+Latency of the component lookups on a generated catalog of 100 000
+components. Run it with FreeCADCmd, the workbench must be installed :
+
+    FreeCADCmd benchmarks/bench_catalog.py
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import g3d_connect_db
+
+
+__title__ = "Gespal3D catalog benchmark"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+def makeSyntheticCatalog(sqlite_db, count=100000, familles=50):
+    """
+    Create a database filled with generated components, for the benchmarks.
+    :param sqlite_db: str, path of the new database
+    :param count: int, number of components
+    :param familles: int, number of categories
+    """
+    con = sqlite3.connect(sqlite_db)
+    try:
+        g3d_connect_db.create_new_db(con)
+        con.executemany(
+            "INSERT INTO Famille_Composant VALUES (?, ?, ?)",
+            [(n, "Famille {}".format(n), "BO" if n % 2 else "PX")
+             for n in range(1, familles + 1)])
+        rng = random.Random(0)
+        rows = []
+        for n in range(1, count + 1):
+            width = rng.choice((22, 27, 35, 45, 63, 75, 100))
+            height = rng.choice((22, 45, 75, 100, 120, 150, 200))
+            length = rng.randrange(400, 4000, 50)
+            rows.append((
+                n, "REC {}x{} L{} {}".format(width, height, length, n),
+                rng.randint(1, familles), length, height, width, "R",
+                "203,193,124", 450, None))
+        con.executemany(
+            "INSERT INTO Composant VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        con.commit()
+    finally:
+        con.close()
+
+
+def benchmarkLookups(count=100000, familles=50, repeat=200):
+    """
+    Print the latency of the component lookups on a generated catalog, the
+    family query with and without the indexes and the lookup by id.
+    :param count: int, number of components
+    :param familles: int, number of categories
+    :param repeat: int, queries per measure
+    :return: dict, measure: ms per query
+    """
+    family_query = "SELECT * FROM Composant WHERE CO_FAMILLE = ? ORDER BY CO_NOM"
+    id_query = "SELECT * FROM Composant WHERE CO_COMPTEUR = ?"
+
+    def measure(con, query, values):
+        start = time.perf_counter()
+        for value in values:
+            con.execute(query, (value,)).fetchall()
+        return (time.perf_counter() - start) * 1000 / len(values)
+
+    rng = random.Random(1)
+    family_values = [rng.randint(1, familles) for n in range(repeat)]
+    id_values = [rng.randint(1, count) for n in range(repeat)]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="g3d_bench_") as workdir:
+        sqlite_db = os.path.join(workdir, "catalog.sqdb")
+        makeSyntheticCatalog(sqlite_db, count, familles)
+        con = sqlite3.connect(sqlite_db)
+        try:
+            for index in ("IDX_CO_FAMILLE", "IDX_CO_FAMILLE_NOM", "IDX_CO_DIMENSIONS"):
+                con.execute("DROP INDEX IF EXISTS {}".format(index))
+            results["family, no index"] = measure(con, family_query, family_values)
+            g3d_connect_db.checkDBintegrity(con)
+            results["family, indexed"] = measure(con, family_query, family_values)
+            results["by id"] = measure(con, id_query, id_values)
+        finally:
+            con.close()
+    for name, ms in results.items():
+        App.Console.PrintMessage("{:<18} : {:.3f} ms\n".format(name, ms))
+    return results
+
+
+if __name__ == "__main__":
+    benchmarkLookups()
@@ -0,0 +1,109 @@
+# coding: utf-8
+
+"""
+Time to condense 10 000 listing rows into the bill of material, with the
+loop of the workbench before the keyed aggregation and with
+g3d_listing.condenseListing. Run it with FreeCADCmd, the workbench must be
+installed :
+
+    FreeCADCmd benchmarks/bench_listing.py
+"""
+
+import random
+import time
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import g3d_listing
+from freecad.workbench_gespal3d import print_debug
+
+
+__title__ = "Gespal3D listing benchmark"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+def baselineCondensedListing(listing):
+    """
+    gespal3d_exports.makeCondensedListing as it was before the keyed
+    aggregation, self.GespalBOM replaced by the returned list.
+    """
+    GespalBOM = []
+    for obj in listing:
+        if len(GespalBOM) > 0:
+            listed = False
+            for comp in GespalBOM:
+                if obj["ID"] == comp["ID"]:
+                    if obj["Length"] == comp["Length"]:
+                        if obj["Width"] == comp["Width"] and obj["Height"] == comp["Height"] :
+                            comp["Quantity"] += 1
+                            listed = True
+                            print_debug("{} is already listed, let's add +1 to qty.".format(obj))
+
+            if listed == False:
+                print_debug("{} is not listed yet, creating a new component.".format(obj))
+                component = g3d_listing.createBOMComponent(obj)
+                component["Reference"] = reference_count
+                reference_count += 1
+                GespalBOM.append(component)
+        else:
+            print_debug("{} is not listed yet, creating a new component.".format(obj))
+            component = g3d_listing.createBOMComponent(obj)
+            reference_count = 1
+            component["Reference"] = reference_count
+            reference_count += 1
+            GespalBOM.append(component)
+    return GespalBOM
+
+
+def makeListing(count=10000, ids=300, seed=0):
+    """
+    Generate listing rows. The former loop did not compare the machining,
+    it is given by the id here so that both BOMs are the same.
+    :param count: int, number of rows
+    :param ids: int, number of distinct catalog ids
+    :param seed: int
+    :return: list of dict
+    """
+    rng = random.Random(seed)
+    listing = []
+    for n in range(count):
+        component_id = rng.randint(1, ids)
+        listing.append({
+            "ID": component_id,
+            "Label": "Composant {}".format(component_id),
+            "Type": "Beam",
+            "Width": float(rng.choice((22, 45, 100))),
+            "Height": float(rng.choice((22, 100, 1200))),
+            "Length": float(rng.randrange(400, 1200, 100)),
+            "Machining": component_id % 10 == 0,
+        })
+    return listing
+
+
+def benchmarkBOM(count=10000, ids=300, seed=0):
+    """
+    Print the time taken by both condensations and check that they give
+    the same bill of material.
+    :return: dict with the times in ms and the number of BOM lines
+    """
+    listing = makeListing(count, ids, seed)
+
+    start = time.perf_counter()
+    baseline = baselineCondensedListing(listing)
+    baseline_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    keyed = g3d_listing.condenseListing(listing)
+    keyed_ms = (time.perf_counter() - start) * 1000
+
+    if keyed != baseline:
+        raise RuntimeError("the keyed BOM differs from the baseline one")
+    App.Console.PrintMessage(
+        "{} rows, {} BOM lines : {:.0f} ms baseline, {:.0f} ms keyed\n".format(
+            count, len(keyed), baseline_ms, keyed_ms))
+    return {"baseline": baseline_ms, "keyed": keyed_ms, "lines": len(keyed)}
+
+
+if __name__ == "__main__":
+    benchmarkBOM()
@@ -0,0 +1,54 @@
+# coding: utf-8
+
+"""
+Time to cut drill holes from a panel, one cut per hole and with
+g3d_component.cutTools. Run it with FreeCADCmd, the workbench must be
+installed :
+
+    FreeCADCmd benchmarks/bench_machining.py
+"""
+
+import time
+
+import FreeCAD as App
+import Part
+from freecad.workbench_gespal3d import g3d_component
+
+
+__title__ = "Gespal3D machining benchmark"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+def benchmarkMachining(counts=(1, 5, 10, 20, 40)):
+    """
+    Print the time to cut n drill holes from a panel, one cut per hole
+    as before and in a single cut.
+    :param counts: list of int, numbers of holes
+    :return: dict, n: (one by one ms, single cut ms)
+    """
+    panel = Part.makeBox(1000, 600, 19, App.Vector(-500, -300, 0))
+    results = {}
+    for n in counts:
+        holes = []
+        for i in range(n):
+            center = App.Vector(-460 + (i % 10) * 90, -260 + (i // 10) * 110, -1)
+            holes.append(Part.makeCylinder(4, 21, center))
+        start = time.perf_counter()
+        shape = panel
+        for hole in holes:
+            shape = shape.cut(hole)
+        one_by_one = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        g3d_component.cutTools(panel, holes)
+        single = (time.perf_counter() - start) * 1000
+        results[n] = (one_by_one, single)
+        App.Console.PrintMessage(
+            "{:>3} machinings : {:.0f} ms one by one, {:.0f} ms in a single cut\n".format(
+                n, one_by_one, single))
+    return results
+
+
+if __name__ == "__main__":
+    benchmarkMachining()
@@ -0,0 +1,56 @@
+# coding: utf-8
+
+"""
+Time to build the face of each profile shape and to get it from the face
+cache. g3d_profiles_parser needs the GUI, run it from the FreeCAD Python
+console, the workbench must be installed :
+
+    exec(open("benchmarks/bench_profiles.py").read())
+"""
+
+import time
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import g3d_profiles_parser
+
+
+__title__ = "Gespal3D profiles benchmark"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+def benchmarkFaces(repeat=1000):
+    """
+    Print the time to build each profile face and to get it from the
+    cache.
+    :param repeat: int
+    :return: dict, code: (build ms, cached ms)
+    """
+    samples = {
+        "C": (60.0,),
+        "H": (100.0, 200.0, 6.0, 10.0),
+        "R": (100.0, 22.0),
+        "RH": (80.0, 40.0, 3.0),
+        "T": (100.0, 100.0),
+        "U": (100.0, 50.0, 5.0, 8.0),
+    }
+    results = {}
+    for code, dimensions in samples.items():
+        start = time.perf_counter()
+        for i in range(repeat):
+            g3d_profiles_parser.FACE_BUILDERS[code](*dimensions)
+        build = (time.perf_counter() - start) * 1000 / repeat
+        g3d_profiles_parser.getProfileFace(code, dimensions)
+        start = time.perf_counter()
+        for i in range(repeat):
+            g3d_profiles_parser.getProfileFace(code, dimensions)
+        cached = (time.perf_counter() - start) * 1000 / repeat
+        results[code] = (build, cached)
+        App.Console.PrintMessage(
+            "{:>2} : {:.4f} ms built, {:.4f} ms cached\n".format(code, build, cached))
+    return results
+
+
+if __name__ == "__main__":
+    benchmarkFaces()
@@ -0,0 +1,122 @@
+# coding: utf-8
+
+"""
+Readers and writers of the catalog in several processes at once, as when
+several FreeCAD instances share the components database. Fails when one of
+them gets a "database is locked" error. Run it with FreeCADCmd, the
+workbench must be installed :
+
+    FreeCADCmd benchmarks/stress_catalog.py
+"""
+
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import g3d_connect_db
+
+
+__title__ = "Gespal3D catalog stress test"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+def _stressWorker(sqlite_db, index, writer, duration, results):
+    """
+    One process of stressCatalog : the writers update the mass of 200
+    components per transaction like a flush of the components manager,
+    the readers read a family with the lookup query.
+    """
+    random.seed(index)
+    errors = []
+    done = 0
+    try:
+        con = g3d_connect_db.connectDatabase(sqlite_db, read_only=not writer)
+        count = g3d_connect_db.retryLocked(
+            con.execute, "SELECT MAX(CO_COMPTEUR) FROM Composant").fetchone()[0] or 1
+        familles = [row[0] for row in g3d_connect_db.retryLocked(
+            con.execute, "SELECT FC_COMPTEUR FROM Famille_Composant")] or [1]
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            try:
+                if writer:
+                    values = [(random.randint(1, 900), random.randint(1, count))
+                              for i in range(200)]
+                    g3d_connect_db.retryLocked(
+                        con.executemany,
+                        "UPDATE Composant SET CO_MASSE = ? WHERE CO_COMPTEUR = ?",
+                        values)
+                    g3d_connect_db.retryLocked(con.commit)
+                    time.sleep(0.01)
+                else:
+                    con.execute(
+                        "SELECT * FROM Composant WHERE CO_FAMILLE = ? ORDER BY CO_NOM",
+                        (random.choice(familles),)).fetchall()
+                done += 1
+            except sqlite3.OperationalError as error:
+                errors.append(str(error))
+                if con.in_transaction:
+                    con.rollback()
+        con.close()
+    except sqlite3.Error as error:
+        errors.append(str(error))
+    finally:
+        # The parent waits for one result per process
+        results.put((writer, done, errors))
+
+
+def stressCatalog(sqlite_db=None, processes=6, writers=2, duration=10.0):
+    """
+    Run readers and writers in several processes on a copy of the database
+    and check that none of them gets a "database is locked" error, with the
+    DatabaseWAL and DatabaseBusyTimeout parameters in use. The processes
+    are forked when the system allows it.
+    :param sqlite_db: str, the components database by default
+    :param processes: int, number of processes
+    :param writers: int, how many of them write
+    :param duration: float, seconds
+    :return: dict with the reads, writes and errors
+    """
+    if sqlite_db is None:
+        sqlite_db = g3d_connect_db.getDatabasePath()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="g3d_stress_") as workdir:
+        copy = os.path.join(workdir, os.path.basename(sqlite_db))
+        shutil.copy(sqlite_db, copy)
+        # Switch the journal mode before the workers share the file
+        g3d_connect_db.connectDatabase(copy).close()
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=_stressWorker,
+                args=(copy, index, index < writers, duration, results))
+            for index in range(processes)]
+        for worker in workers:
+            worker.start()
+        stats = {"reads": 0, "writes": 0, "errors": []}
+        for worker in workers:
+            writer, done, errors = results.get(timeout=duration + 60)
+            stats["writes" if writer else "reads"] += done
+            stats["errors"].extend(errors)
+        for worker in workers:
+            worker.join()
+    locked = [error for error in stats["errors"] if g3d_connect_db.isLockedError(error)]
+    App.Console.PrintMessage(
+        "{} reads, {} writes, {} errors, {} locked\n".format(
+            stats["reads"], stats["writes"], len(stats["errors"]), len(locked)))
+    if len(locked) > 0:
+        raise RuntimeError("database is locked : {}".format(locked[0]))
+    return stats
+
+
+if __name__ == "__main__":
+    stressCatalog()
@@ -1,18 +1,23 @@
 # coding: utf-8
 
 import os
+import sys
+import hashlib
+from collections import OrderedDict
 import FreeCAD as App
-import Draft
+import Part
+from freecad.workbench_gespal3d import print_debug
 
 if App.GuiUp:
     import FreeCADGui as Gui
     from DraftTools import translate
     from freecad.workbench_gespal3d import g3d_connect_db
+    from freecad.workbench_gespal3d import g3d_search
     from freecad.workbench_gespal3d import g3d_component_manager
+    from freecad.workbench_gespal3d import g3d_registry
     from freecad.workbench_gespal3d import PARAMPATH
     from freecad.workbench_gespal3d import ICONPATH
     from freecad.workbench_gespal3d import DEBUG
-    from freecad.workbench_gespal3d import print_debug
     from PySide import QtCore, QtGui
     from PySide.QtCore import QT_TRANSLATE_NOOP
 else:
@@ -31,57 +36,192 @@ __license__ = "LGPLv2.1"
 __author__ = "Jonathan Wiedemann"
 __url__ = "https://freecad-france.com"
 
-def add_accessory(g3d_profile):
-    p = App.ParamGet(str(PARAMPATH))
-    cao_path = p.GetString("PathCAO", "no_path_cao")
-    project_doc = App.ActiveDocument
+# Last repaired accessory shapes read during the session, by cache key. The
+# least recently used shape is dropped first, the BREP cache still has it.
+_accessory_shapes = OrderedDict()
+ACCESSORY_CACHE_SIZE = 32
 
-    path = os.path.join(cao_path, g3d_profile[9])
-    import Part
-    print_debug(path)
-    Part.open(path)
-    accessory_doc = App.ActiveDocument
-    for obj in accessory_doc.Objects:
-        if len(obj.Shape.Shells) == 0:
-            if obj.Shape.isClosed() == False:
-                try:
-                    _ = Part.Shell([]+ obj.Shape.Faces)
-                    if _.isNull(): raise RuntimeError('Failed to create shell')
-                    accessory_doc.addObject('Part::Feature','Shell').Shape = _.removeSplitter()
-                    del _
-                    accessory_doc.removeObject(obj.Name)
-                except:
-                    pass
-
-    for obj in accessory_doc.Objects:
-        if len(obj.Shape.Solids) == 0:
+
+def getAccessoryCacheKey(path):
+    """
+    Return the key of a CAD file, a digest of its path, size and
+    modification time.
+    :param path: str
+    :return: str
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = "{}|{}|{}".format(path, stat.st_size, stat.st_mtime_ns)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def getAccessoryCacheDir():
+    if hasattr(App, "getUserCachePath"):
+        cache_dir = App.getUserCachePath()
+    else:
+        cache_dir = App.getUserAppDataDir()
+    cache_dir = os.path.join(cache_dir, "Gespal3D", "accessories")
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+def getAccessoryCachePath(path):
+    return os.path.join(getAccessoryCacheDir(), getAccessoryCacheKey(path) + ".brep")
+
+
+def isAccessoryCached(path):
+    """True if the shape of the CAD file can be inserted without reading it."""
+    key = getAccessoryCacheKey(path)
+    return key in _accessory_shapes or os.path.exists(getAccessoryCachePath(path))
+
+
+def writeBrep(shape, brep_path):
+    # Written aside then renamed, a reader never sees a partial file
+    tmp_path = brep_path + ".tmp"
+    shape.exportBrep(tmp_path)
+    os.replace(tmp_path, brep_path)
+
+
+def buildAccessoryCache(path, brep_path):
+    """
+    Entry point of the FreeCADCmd worker started by the accessory task
+    panel : read and repair the CAD file, then write its BREP cache. The
+    progress is printed on stdout as "G3D_PROGRESS <percent> <step>" lines.
+    :param path: str
+    :param brep_path: str
+    """
+    def progress(value, message):
+        print("G3D_PROGRESS {} {}".format(value, message))
+        sys.stdout.flush()
+
+    shape = readAccessoryShape(path, progress)
+    progress(90, "Écriture du cache")
+    writeBrep(shape, brep_path)
+    progress(100, "Terminé")
+
+
+def getFreeCADCmd():
+    """Return the FreeCADCmd executable next to the running FreeCAD, or None."""
+    bin_dir = os.path.join(App.getHomePath(), "bin")
+    for name in ("FreeCADCmd.exe", "FreeCADCmd", "freecadcmd"):
+        path = os.path.join(bin_dir, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def repairShape(shape):
+    """
+    Turn an open set of faces into a shell and a shell into a solid,
+    the shape is returned unchanged when it fails. The parts of nested
+    compounds are repaired one by one.
+    :param shape: Part.Shape
+    :return: Part.Shape
+    """
+    if shape.ShapeType == "Compound":
+        parts = [repairShape(part) for part in shape.childShapes()]
+        if len(parts) == 0:
+            return shape
+        return Part.makeCompound(parts)
+    if len(shape.Shells) == 0:
+        if shape.isClosed() == False:
             try:
-                shell = obj.Shape
-                if shell.ShapeType != 'Shell': raise RuntimeError('Part object is not a shell')
-                _=Part.Solid(shell)
-                if _.isNull(): raise RuntimeError('Failed to create solid')
-                accessory_doc.addObject('Part::Feature','Solid').Shape=_.removeSplitter()
-                del _
-                accessory_doc.removeObject(obj.Name)
+                _ = Part.Shell([] + shape.Faces)
+                if _.isNull(): raise RuntimeError('Failed to create shell')
+                shape = _.removeSplitter()
             except:
                 pass
-    links = accessory_doc.Objects
-    if len(links) > 1:
-        obj = accessory_doc.addObject("Part::Compound","Compound")
-        obj.Links = links
-        accessory_doc.recompute()
-        Draft.move(
-            obj.OutList,
-            App.Vector(
-                -obj.Shape.BoundBox.XMin,
-                -obj.Shape.BoundBox.YMin,
-                -obj.Shape.BoundBox.ZMin
-                )
-            )
-        accessory_doc.recompute()
+    if len(shape.Solids) == 0:
+        try:
+            if shape.ShapeType != 'Shell': raise RuntimeError('Part object is not a shell')
+            _ = Part.Solid(shape)
+            if _.isNull(): raise RuntimeError('Failed to create solid')
+            shape = _.removeSplitter()
+        except:
+            pass
+    return shape
+
+
+def readAccessoryShape(path, progress=None):
+    """
+    Read a CAD file without opening a document, repair each of its parts
+    and move the result so its boundbox starts at the origin.
+    :param path: str
+    :param progress: function(int, str) called with a percentage and a step
+    :return: Part.Shape
+    """
+    if progress:
+        progress(5, "Lecture du fichier")
+    shape = Part.read(path)
+    if shape.ShapeType == "Compound":
+        parts = shape.childShapes()
     else:
-        obj = App.ActiveDocument.Objects[0]
-    App.ActiveDocument.recompute()
+        parts = [shape]
+    repaired = []
+    for n, part in enumerate(parts):
+        if progress:
+            progress(40 + 50 * n // len(parts), "Réparation des formes")
+        repaired.append(repairShape(part))
+    parts = repaired
+    if len(parts) > 1:
+        shape = Part.makeCompound(parts)
+    else:
+        shape = parts[0]
+    bb = shape.BoundBox
+    shape.translate(App.Vector(-bb.XMin, -bb.YMin, -bb.ZMin))
+    return shape
+
+
+def getAccessoryShape(path):
+    """
+    Return the repaired shape of a CAD file. Shapes are cached in memory and
+    as BREP files in the user cache folder, so a file is only analysed again
+    when it changes on disk.
+    :param path: str
+    :return: Part.Shape
+    """
+    key = getAccessoryCacheKey(path)
+    if key in _accessory_shapes:
+        print_debug("Accessory {} found in memory cache.".format(path))
+        _accessory_shapes.move_to_end(key)
+        return _accessory_shapes[key].copy()
+
+    brep_path = getAccessoryCachePath(path)
+    shape = None
+    if os.path.exists(brep_path):
+        try:
+            shape = Part.Shape()
+            shape.importBrep(brep_path)
+            print_debug("Accessory {} found in BREP cache.".format(path))
+        except Exception:
+            shape = None
+    if shape is None or shape.isNull():
+        shape = readAccessoryShape(path)
+        try:
+            writeBrep(shape, brep_path)
+        except Exception as e:
+            App.Console.PrintWarning(
+                "Gespal3D : impossible d'écrire le cache {} ({})\n".format(brep_path, e))
+
+    _accessory_shapes[key] = shape
+    if len(_accessory_shapes) > ACCESSORY_CACHE_SIZE:
+        _accessory_shapes.popitem(last=False)
+    return shape.copy()
+
+
+def makeAccessory(doc, g3d_profile, path):
+    """
+    Create an accessory (Arch Equipment) in doc from the catalog profile
+    and its CAD file.
+    :param doc: App.Document
+    :param g3d_profile: list
+    :param path: str
+    :return: object
+    """
+    shape = getAccessoryShape(path)
+    obj = doc.addObject("Part::Feature", "Accessory")
+    obj.Shape = shape
     if obj.Shape.isValid():
         import Arch
         obj = Arch.makeEquipment(obj)
@@ -92,19 +232,99 @@ def add_accessory(g3d_profile):
         obj.addProperty("App::PropertyString", "PredefinedType")
         obj.addProperty("App::PropertyString", "EquipmentPower")
     # Set color
-    color = g3d_profile[7].split(",")
-    r = float(color[0]) / 255.0
-    g = float(color[1]) / 255.0
-    b = float(color[2]) / 255.0
-    obj.ViewObject.ShapeColor = (r, g, b)
+    if App.GuiUp:
+        color = g3d_profile[7].split(",")
+        r = float(color[0]) / 255.0
+        g = float(color[1]) / 255.0
+        b = float(color[2]) / 255.0
+        obj.ViewObject.ShapeColor = (r, g, b)
     obj.Label = g3d_profile[1]
     obj.IfcType = u"Transport Element"
     obj.PredefinedType = u"NOTDEFINED"
     obj.Tag = u"Gespal"
     obj.Description = str(g3d_profile[0])
-    App.ActiveDocument.recompute()
-    obj = project_doc.copyObject(obj, True)
-    App.closeDocument(accessory_doc.Name)
+    return obj
+
+
+def findAccessoryMaster(doc, g3d_profile, key):
+    registry = g3d_registry.getRegistry(doc)
+    for obj in registry.getListedObjects():
+        if getattr(obj, "InstanceMaster", False) \
+                and obj.Description == str(g3d_profile[0]) \
+                and getattr(obj, "AccessoryKey", None) == key:
+            return obj
+    return None
+
+
+def getAccessoryMaster(doc, g3d_profile, path):
+    """
+    Return the hidden master of a catalog accessory in doc, it is created
+    the first time or when its CAD file changed.
+    :param doc: App.Document
+    :param g3d_profile: list
+    :param path: str
+    :return: object
+    """
+    key = getAccessoryCacheKey(path)
+    master = findAccessoryMaster(doc, g3d_profile, key)
+    if master is not None:
+        return master
+
+    master = makeAccessory(doc, g3d_profile, path)
+    master.addProperty(
+        "App::PropertyBool",
+        "InstanceMaster",
+        "Gespal",
+        QT_TRANSLATE_NOOP("App::Property", "Master of the accessory links")
+        ).InstanceMaster = True
+    master.addProperty(
+        "App::PropertyString",
+        "AccessoryKey",
+        "Gespal",
+        QT_TRANSLATE_NOOP("App::Property", "Cache key of the CAD file")
+        ).AccessoryKey = key
+    master.setEditorMode("InstanceMaster", 2)
+    master.setEditorMode("AccessoryKey", 2)
+    if App.GuiUp:
+        master.ViewObject.Visibility = False
+    return master
+
+
+def getAccessoryPath(g3d_profile):
+    p = App.ParamGet(str(PARAMPATH))
+    cao_path = p.GetString("PathCAO", "no_path_cao")
+    return os.path.join(cao_path, g3d_profile[9])
+
+
+def isAccessoryReady(g3d_profile):
+    """
+    True if the accessory can be inserted without reading its CAD file :
+    its master is in the document or its shape is in the cache.
+    """
+    p = App.ParamGet(str(PARAMPATH))
+    path = getAccessoryPath(g3d_profile)
+    if isAccessoryCached(path):
+        return True
+    if p.GetBool("AccessoryInstancing", True):
+        key = getAccessoryCacheKey(path)
+        return findAccessoryMaster(App.ActiveDocument, g3d_profile, key) is not None
+    return False
+
+
+def add_accessory(g3d_profile):
+    p = App.ParamGet(str(PARAMPATH))
+    project_doc = App.ActiveDocument
+
+    path = getAccessoryPath(g3d_profile)
+    print_debug(path)
+    if p.GetBool("AccessoryInstancing", True):
+        master = getAccessoryMaster(project_doc, g3d_profile, path)
+        obj = project_doc.addObject("App::Link", "Link")
+        obj.setLink(master)
+        obj.Label = g3d_profile[1]
+    else:
+        obj = makeAccessory(project_doc, g3d_profile, path)
+    project_doc.recompute()
     Gui.Selection.addSelection(project_doc.Name, obj.Name)
     Gui.runCommand('Draft_Move',0)
 
@@ -129,6 +349,10 @@ class _AccessoryTaskPanel:
         grid.addWidget(self.indication_label, 0, 0, 1, 2)
 
 
+        # search box
+        self.component_search = g3d_search.ComponentSearch(self)
+        self.component_search.addToGrid(grid, 1)
+
         # categories box
         categories_items = [x[1] for x in self.categories]
         categories_label = QtGui.QLabel(translate("Gespal3D", "C&atégorie"))
@@ -156,6 +380,15 @@ class _AccessoryTaskPanel:
             self.continueCmd = Gui.draftToolBar.continueMode
         grid.addWidget(continue_label, 17, 0, 1, 1)
         grid.addWidget(continue_cb, 17, 1, 1, 1)
+
+        # loading progress
+        self.progress_bar = QtGui.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.hide()
+        grid.addWidget(self.progress_bar, 18, 0, 1, 2)
+        self.process = None
+        self.cancelled = False
+
         self.retranslateUi(self.form)
 
         # connect slots
@@ -228,9 +461,91 @@ class _AccessoryTaskPanel:
         self.p.SetBool("PanelContinue", bool(i))
 
     def accept(self):
-        add_accessory(self.Profile)
-    
+        if self.process is not None:
+            # already loading, wait for the worker
+            return False
+        if isAccessoryReady(self.Profile):
+            add_accessory(self.Profile)
+            return True
+        freecadcmd = getFreeCADCmd()
+        if freecadcmd is None:
+            App.Console.PrintWarning(
+                "FreeCADCmd introuvable, l'accessoire est chargé dans l'interface.\n")
+            add_accessory(self.Profile)
+            return True
+        self.startLoading(freecadcmd)
+        return False
+
+    def startLoading(self, freecadcmd):
+        """
+        Read and repair the CAD file in a FreeCADCmd process, the window
+        stays responsive and the accessory is inserted from the BREP cache
+        once the process is done.
+        """
+        path = getAccessoryPath(self.Profile)
+        code = (
+            "from freecad.workbench_gespal3d import g3d_accessory; "
+            "g3d_accessory.buildAccessoryCache({!r}, {!r})"
+        ).format(path, getAccessoryCachePath(path))
+        self.cancelled = False
+        self.categories_cb.setEnabled(False)
+        self.composant_cb.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("Chargement %p%")
+        self.progress_bar.show()
+        self.process = QtCore.QProcess(self.form)
+        QtCore.QObject.connect(
+            self.process,
+            QtCore.SIGNAL("readyReadStandardOutput()"),
+            self.readProgress,
+        )
+        QtCore.QObject.connect(
+            self.process,
+            QtCore.SIGNAL("finished(int)"),
+            self.loadingFinished,
+        )
+        self.process.start(freecadcmd, ["-c", code])
+
+    def readProgress(self):
+        # A line cut between two chunks stays in the process buffer until
+        # its end arrives
+        while self.process is not None and self.process.canReadLine():
+            line = bytes(self.process.readLine()).decode("utf-8", "replace").strip()
+            if not line.startswith("G3D_PROGRESS "):
+                continue
+            value, _, message = line[len("G3D_PROGRESS "):].partition(" ")
+            try:
+                self.progress_bar.setValue(int(value))
+            except ValueError:
+                print_debug(["readProgress ignored", line])
+                continue
+            self.progress_bar.setFormat(message + " %p%")
+
+    def loadingFinished(self, exit_code):
+        process = self.process
+        self.process = None
+        self.progress_bar.hide()
+        self.categories_cb.setEnabled(True)
+        self.composant_cb.setEnabled(True)
+        if self.cancelled:
+            return
+        if exit_code == 0 and isAccessoryCached(getAccessoryPath(self.Profile)):
+            # Draft_Move opens its own task panel, close this one first
+            profile = self.Profile
+            Gui.Control.closeDialog()
+            add_accessory(profile)
+        else:
+            error = bytes(process.readAllStandardError()).decode("utf-8", "replace")
+            App.Console.PrintError(
+                "Le chargement de l'accessoire a échoué.\n{}\n".format(error))
+            self.indication_label.setText(
+                "Le chargement de l'accessoire a échoué, voir la vue rapport.")
+
     def reject(self):
+        if self.process is not None:
+            self.cancelled = True
+            self.process.kill()
+            self.process.waitForFinished(1000)
         App.Console.PrintMessage("Annulation de l'ajout d'un accessoire.\n")
         return True
 
@@ -265,11 +580,7 @@ class _CommandAccessory:
         }
 
     def IsActive(self):
-        active = False
-        if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if obj.Name == "Product":
-                    active = True
+        active = g3d_registry.hasProduct()
 
         return active
 
@@ -0,0 +1,315 @@
+# coding: utf-8
+
+import abc
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import (DEBUG_DB,
+                                        PARAMPATH,
+                                        print_debug)
+
+
+__title__ = "Gespal3D Database backup"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+# Folder of the snapshots, next to the database
+BACKUP_FOLDER = "Sauvegardes"
+BACKUP_TIME_FORMAT = "%Y%m%d-%H%M%S"
+# Defaults of the BackupPages and BackupKeep parameters
+BACKUP_PAGES = 256
+BACKUP_KEEP = 5
+# Seconds between two progress reports of a job
+PROGRESS_INTERVAL = 0.5
+
+
+def getBackupDir(sqlite_db):
+    return os.path.join(os.path.dirname(sqlite_db), BACKUP_FOLDER)
+
+
+def getBackupPrefix(sqlite_db):
+    return os.path.splitext(os.path.basename(sqlite_db))[0] + "_"
+
+
+def makeBackupPath(sqlite_db):
+    """
+    Return a new timestamped snapshot path for the database.
+    :param sqlite_db: str
+    :return: str
+    """
+    stamp = time.strftime(BACKUP_TIME_FORMAT)
+    base = os.path.join(getBackupDir(sqlite_db), getBackupPrefix(sqlite_db) + stamp)
+    path = base + ".sqdb"
+    n = 1
+    while os.path.exists(path):
+        path = "{}-{}.sqdb".format(base, n)
+        n += 1
+    return path
+
+
+def listBackups(sqlite_db):
+    """
+    Return the snapshots of the database, the newest first.
+    :param sqlite_db: str
+    :return: list of str
+    """
+    backup_dir = getBackupDir(sqlite_db)
+    prefix = getBackupPrefix(sqlite_db)
+    try:
+        names = os.listdir(backup_dir)
+    except OSError:
+        return []
+    paths = [
+        os.path.join(backup_dir, name) for name in names
+        if name.startswith(prefix) and name.endswith(".sqdb")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    return paths
+
+
+def rotateBackups(sqlite_db, keep):
+    """
+    Delete the oldest snapshots of the database, keeping the last ones.
+    :param sqlite_db: str
+    :param keep: int
+    """
+    for path in listBackups(sqlite_db)[keep:]:
+        try:
+            os.remove(path)
+        except OSError as error:
+            print_debug(["rotateBackups could not delete", path, error])
+
+
+def checkDatabase(path):
+    """
+    Run PRAGMA quick_check on a database opened read only.
+    :param path: str
+    :return: list of str, empty when the database is sound
+    """
+    if not os.path.isfile(path):
+        return ["{} does not exist".format(path)]
+    uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+    try:
+        con = sqlite3.connect(uri, uri=True)
+        try:
+            rows = con.execute("PRAGMA quick_check").fetchall()
+        finally:
+            con.close()
+    except sqlite3.Error as error:
+        return [str(error)]
+    problems = [row[0] for row in rows]
+    if problems == ["ok"]:
+        return []
+    return problems
+
+
+class BackupJob(abc.ABC):
+    """
+    Copy of a database into another one with the online backup API, by
+    batches of pages so that the other connections can work in between.
+    The subclasses implement run.
+    """
+
+    def __init__(self, kind, source, target, pages, on_done=None):
+        self.kind = kind
+        self.source = source
+        self.target = target
+        self.pages = pages
+        self.on_done = on_done
+        self.ok = False
+        self.error = None
+        self.copied = 0
+        self.total = 0
+        self.done = threading.Event()
+        self.cancelled = False
+        self.last_report = 0.0
+
+    def progress(self, status, remaining, total):
+        if self.cancelled:
+            # Raising from the callback aborts the backup
+            raise RuntimeError("backup cancelled")
+        self.copied = total - remaining
+        self.total = total
+        now = time.monotonic()
+        if remaining == 0 or now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            if DEBUG_DB:
+                print_debug("{} : {} / {} pages".format(self.kind, self.copied, total))
+
+    def copy(self, source, target):
+        src = sqlite3.connect(source)
+        try:
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst, pages=self.pages, progress=self.progress)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+
+    @abc.abstractmethod
+    def run(self):
+        """Do the job, set ok once it succeeded."""
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def finish(self):
+        self.done.set()
+        if self.on_done is not None:
+            self.on_done(self)
+
+
+class SnapshotJob(BackupJob):
+    """Take a snapshot of the database, then rotate the old ones."""
+
+    def __init__(self, sqlite_db, pages, keep, on_done=None):
+        super(SnapshotJob, self).__init__(
+            "backup", sqlite_db, makeBackupPath(sqlite_db), pages, on_done)
+        self.keep = keep
+
+    def run(self):
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        # The snapshot only gets its name once it is complete
+        partial = self.target + ".part"
+        try:
+            self.copy(self.source, partial)
+            os.replace(partial, self.target)
+        except (sqlite3.Error, OSError, RuntimeError):
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        rotateBackups(self.source, self.keep)
+        self.ok = True
+
+
+class RestoreJob(BackupJob):
+    """Check a snapshot with quick_check and copy it over the database."""
+
+    def __init__(self, sqlite_db, backup_path, pages, on_done=None):
+        super(RestoreJob, self).__init__(
+            "restore", backup_path, sqlite_db, pages, on_done)
+
+    def run(self):
+        problems = checkDatabase(self.source)
+        if len(problems) > 0:
+            self.error = "quick_check : {}".format("; ".join(problems[:5]))
+            return
+        self.copy(self.source, self.target)
+        self.ok = True
+
+
+class BackupService:
+    """
+    Runs the backup and restore jobs one after the other in a background
+    thread, a restore queued after a backup uses the finished snapshot.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.work, name="Gespal3D backup", daemon=True)
+                self.thread.start()
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job.cancelled:
+                    job.error = "cancelled"
+                else:
+                    job.run()
+            except Exception as error:
+                job.error = str(error)
+            finally:
+                if job.ok:
+                    App.Console.PrintLog(
+                        "Gespal3D {} done : {}\n".format(job.kind, job.target))
+                else:
+                    App.Console.PrintWarning(
+                        "Gespal3D {} failed : {}\n".format(job.kind, job.error))
+                job.finish()
+                self.jobs.task_done()
+
+    def submit(self, job):
+        self.start()
+        self.jobs.put(job)
+        return job
+
+    def wait(self):
+        """Block until every queued job is done."""
+        self.jobs.join()
+
+    def getParams(self):
+        params = App.ParamGet(str(PARAMPATH))
+        pages = params.GetInt("BackupPages", BACKUP_PAGES)
+        keep = params.GetInt("BackupKeep", BACKUP_KEEP)
+        return max(pages, 1), max(keep, 1)
+
+    def backup(self, sqlite_db, on_done=None):
+        """
+        Queue a snapshot of the database.
+        :param sqlite_db: str
+        :param on_done: callable taking the job, called from the worker thread
+        :return: SnapshotJob
+        """
+        pages, keep = self.getParams()
+        return self.submit(SnapshotJob(sqlite_db, pages, keep, on_done))
+
+    def restore(self, sqlite_db, backup_path=None, on_done=None):
+        """
+        Queue the restore of a snapshot, the newest one by default.
+        :param sqlite_db: str
+        :param backup_path: str
+        :param on_done: callable taking the job, called from the worker thread
+        :return: RestoreJob or None when there is no snapshot
+        """
+        if backup_path is None:
+            backups = listBackups(sqlite_db)
+            if len(backups) == 0:
+                return None
+            backup_path = backups[0]
+        pages, keep = self.getParams()
+        return self.submit(RestoreJob(sqlite_db, backup_path, pages, on_done))
+
+
+_service = BackupService()
+
+
+def make_backup(sqlite_db, on_done=None):
+    """
+    Take a snapshot of the database in the background.
+    :param sqlite_db: str
+    :return: SnapshotJob
+    """
+    return _service.backup(sqlite_db, on_done)
+
+
+def restore_backup(sqlite_db, backup_path=None, on_done=None):
+    """
+    Restore a snapshot of the database in the background.
+    :param sqlite_db: str
+    :param backup_path: str, the newest snapshot by default
+    :return: RestoreJob or None
+    """
+    return _service.restore(sqlite_db, backup_path, on_done)
+
+
+def wait():
+    """Wait for the queued backups and restores."""
+    _service.wait()
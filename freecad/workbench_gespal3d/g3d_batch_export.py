@@ -0,0 +1,218 @@
+# coding: utf-8
+
+"""
+Regenerate the listing exports (CP_, BOM_ and DIM_ CSV files) of many
+Gespal3D projects without the GUI.
+
+The files are shared between several workers, each worker is a
+FreeCADCmd process which opens its projects one after the other. A crash
+only fails the project being exported, a new process takes the others. Run this
+file with any Python 3 interpreter, FreeCAD is only needed by the workers :
+
+    python3 g3d_batch_export.py --workers 8 /archives/projets
+
+Folders are searched recursively for PL_*.FCStd files. The documents are
+never saved, the CSV files are written next to each project.
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+__title__ = "Gespal 3D Batch Export"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+JOB_ENV = "G3D_BATCH_JOB"
+WORKER_CODE = (
+    "from freecad.workbench_gespal3d import g3d_batch_export; "
+    "g3d_batch_export.workerMain()"
+)
+
+
+def exportProject(path):
+    """
+    Open a project, write its listing CSV files and close it.
+    Must run inside FreeCAD.
+
+    :param path: str, path of the .FCStd file
+    :return: dict with the number of listed and condensed components
+    """
+    import FreeCAD as App
+    from freecad.workbench_gespal3d import g3d_listing
+
+    doc = App.openDocument(path)
+    try:
+        export = g3d_listing.gespal3d_exports(doc=doc, use_spreadsheets=False)
+        export.makeInventory_Sheet()
+        export.makeCuttingList_Sheet()
+        export.makeBoundBox_sheet()
+        return {
+            "file": path,
+            "ok": True,
+            "components": len(export.GespalListing),
+            "bom": len(export.GespalBOM),
+        }
+    finally:
+        App.closeDocument(doc.Name)
+
+
+def exportProjects(paths, results_path=None):
+    """
+    Export each project in the current FreeCAD instance. A failing project
+    is reported and does not stop the others. When results_path is given,
+    one JSON line per project is appended to it as soon as it is done.
+
+    :param paths: list of .FCStd paths
+    :param results_path: str or None
+    :return: list of result dicts
+    """
+    results = []
+    for path in paths:
+        try:
+            result = exportProject(path)
+        except Exception as e:
+            result = {"file": path, "ok": False, "error": repr(e)}
+        results.append(result)
+        if results_path:
+            with open(results_path, "a", encoding="utf-8") as results_file:
+                results_file.write(json.dumps(result) + "\n")
+    return results
+
+
+def workerMain():
+    """
+    Entry point of a FreeCADCmd worker, the job file is given by the
+    G3D_BATCH_JOB environment variable.
+    """
+    with open(os.environ[JOB_ENV], encoding="utf-8") as job_file:
+        job = json.load(job_file)
+    exportProjects(job["files"], job["results"])
+
+
+def findProjects(paths, pattern="PL_*.FCStd"):
+    projects = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "**", pattern), recursive=True)
+            projects.extend(sorted(found))
+        else:
+            projects.append(path)
+    return projects
+
+
+def readResults(results_path):
+    results = {}
+    if os.path.exists(results_path):
+        with open(results_path, encoding="utf-8") as results_file:
+            for line in results_file:
+                result = json.loads(line)
+                results[result["file"]] = result
+    return results
+
+
+def runWorker(files, freecadcmd, workdir, index):
+    """
+    Export the files in FreeCADCmd processes, one after the other. When a
+    process crashes, the project it was exporting is reported as failed and
+    a fresh process goes on with the projects left.
+
+    :param files: list of .FCStd paths
+    :param freecadcmd: str, FreeCADCmd executable
+    :param workdir: str, folder of the job and result files
+    :param index: int, number of the worker
+    :return: list of result dicts, in the order of files
+    """
+    results = {}
+    pending = list(files)
+    attempt = 0
+    while pending:
+        name = "{}_{}".format(index, attempt)
+        job_path = os.path.join(workdir, "job_{}.json".format(name))
+        results_path = os.path.join(workdir, "results_{}.jsonl".format(name))
+        with open(job_path, "w", encoding="utf-8") as job_file:
+            json.dump({"files": pending, "results": results_path}, job_file)
+        env = dict(os.environ)
+        env[JOB_ENV] = job_path
+        process = subprocess.run(
+            [freecadcmd, "-c", WORKER_CODE],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        results.update(readResults(results_path))
+        remaining = [path for path in pending if path not in results]
+        if not remaining:
+            break
+        # The projects are exported in order, the first one without result
+        # is the one the process crashed on.
+        error = "worker exited with code {}".format(process.returncode)
+        stderr = process.stderr.decode("utf-8", "replace").strip()
+        if stderr:
+            error += " : " + stderr.splitlines()[-1]
+        results[remaining[0]] = {"file": remaining[0], "ok": False, "error": error}
+        pending = remaining[1:]
+        attempt += 1
+    return [results[path] for path in files]
+
+
+def runBatch(paths, workers=None, freecadcmd="FreeCADCmd"):
+    """
+    Share the projects between workers FreeCADCmd processes.
+
+    :param paths: list of .FCStd paths
+    :param workers: int, number of FreeCAD instances, one per CPU by default
+    :param freecadcmd: str, FreeCADCmd executable
+    :return: list of result dicts, in the order of paths
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    chunks = [paths[i::workers] for i in range(workers)]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="g3d_batch_") as workdir:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(runWorker, chunk, freecadcmd, workdir, index)
+                for index, chunk in enumerate(chunks)
+            ]
+            for future in futures:
+                for result in future.result():
+                    results[result["file"]] = result
+    return [results[path] for path in paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Régénère les listings CSV de projets Gespal3D sans interface.")
+    parser.add_argument("paths", nargs="+", help="fichiers .FCStd ou dossiers")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="nombre d'instances FreeCAD (une par processeur par défaut)")
+    parser.add_argument("--freecadcmd", default="FreeCADCmd",
+                        help="exécutable FreeCADCmd")
+    args = parser.parse_args(argv)
+
+    projects = findProjects(args.paths)
+    if not projects:
+        print("Aucun projet trouvé.")
+        return 1
+    results = runBatch(projects, args.workers, args.freecadcmd)
+    failed = [result for result in results if not result["ok"]]
+    for result in failed:
+        print("ÉCHEC {} : {}".format(result["file"], result["error"]))
+    print("{} projets exportés, {} échecs.".format(
+        len(results) - len(failed), len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
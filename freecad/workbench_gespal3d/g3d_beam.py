@@ -8,6 +8,7 @@ import FreeCAD as App
 if App.GuiUp:
     import FreeCADGui as Gui
     import Arch
+    import Draft
     import DraftVecUtils
 
     import math
@@ -19,6 +20,9 @@ if App.GuiUp:
     from freecad.workbench_gespal3d import g3d_tracker
     from freecad.workbench_gespal3d import g3d_connect_db
     from freecad.workbench_gespal3d import g3d_profiles_parser
+    from freecad.workbench_gespal3d import g3d_registry
+    from freecad.workbench_gespal3d import g3d_component
+    from freecad.workbench_gespal3d import g3d_search
     from freecad.workbench_gespal3d import DEBUG
     from freecad.workbench_gespal3d import print_debug
     from freecad.workbench_gespal3d import PARAMPATH
@@ -40,7 +44,7 @@ __url__ = "https://freecad-france.com"
 
 
 def makeG3DBeam(
-    g3d_profile = None,
+    g3d_profile,
     p1 = [0.0, 0.0, 0.0],
     p2 = [1000.0, 0.0, 0.0],
     anchor = 4,
@@ -70,16 +74,61 @@ def makeG3DBeam(
         ]
     )
 
-    p1 = App.Vector(p1[0], p1[1], p1[2])
-    p2 = App.Vector(p2[0], p2[1], p2[2])
-    
-    if g3d_profile is None:
-        section = g3d_profiles_parser.makeProfile() 
-    else:
-        section = g3d_profiles_parser.makeProfile(
-            profile = g3d_profile
-        ) 
-    
+    return makeG3DBeams(g3d_profile, [(p1, p2)], anchor, inclination)[0]
+
+
+def makeG3DBeams(
+    g3d_profile,
+    segments = None,
+    anchor = 4,
+    inclination = 0.0,
+    ):
+    """
+    Create several G3D Beams sharing the same profile, the document is
+    recomputed once when all of them are created.
+    Rectangular, triangular and round sections give Gespal components
+    built in closed form. The other ones give Arch Structures extruded from
+    the section shared by all the beams of this profile in the document,
+    each structure carries the placement of its segment.
+    :param g3d_profile: list, Composant row
+    :param segments: list[(p1, p2)], start and end point of each beam
+    :param anchor: int
+    :param inclination: float
+    :return: list[object]
+    """
+
+    if segments is None:
+        segments = []
+
+    print_debug(
+        [
+            "",
+            "makeG3DBeams called with :",
+            "g3d_profile : {}".format(g3d_profile),
+            "segments : {}".format(len(segments)),
+            "",
+        ]
+    )
+
+    p = App.ParamGet(str(PARAMPATH))
+    if g3d_profile[6] in g3d_component.BEAM_SECTIONS \
+            and p.GetBool("LightweightComponents", False):
+        beams = []
+        for p1, p2 in segments:
+            p1 = App.Vector(p1[0], p1[1], p1[2])
+            p2 = App.Vector(p2[0], p2[1], p2[2])
+            height = float(g3d_profile[4])
+            width = height if g3d_profile[6] == 'C' else float(g3d_profile[5])
+            pl = getBeamPlacement(p1, p2, height, width, anchor, inclination)
+            beams.append(g3d_component.makeG3DComponentBeam(
+                g3d_profile, DraftVecUtils.dist(p1, p2), pl))
+        App.activeDocument().recompute(None, True, True)
+        return beams
+
+    section = g3d_profiles_parser.getSection(
+        profile = g3d_profile
+    )
+
     if g3d_profile[6] == 'R':
         height = section.Height
         width = section.Width
@@ -89,8 +138,33 @@ def makeG3DBeam(
     elif g3d_profile[6] == 'C':
         height = width = section.Diameter
 
-    length = DraftVecUtils.dist(p1, p2)
-    
+    beams = []
+    for p1, p2 in segments:
+        p1 = App.Vector(p1[0], p1[1], p1[2])
+        p2 = App.Vector(p2[0], p2[1], p2[2])
+        length = DraftVecUtils.dist(p1, p2)
+        pl = getBeamPlacement(p1, p2, height, width, anchor, inclination)
+
+        beam = Arch.makeStructure(section, length=length)
+        setBeamProperties(beam, g3d_profile)
+        beam.Placement = pl
+        beams.append(beam)
+
+    App.activeDocument().recompute(None, True, True)
+    return beams
+
+
+def getBeamPlacement(p1, p2, height, width, anchor=4, inclination=0.0):
+    """
+    Return the placement of a beam section going from p1 to p2.
+    :param p1: App.Vector
+    :param p2: App.Vector
+    :param height: float
+    :param width: float
+    :param anchor: int, index of the section point put on p1
+    :param inclination: float, rotation of the section around the beam axis
+    :return: App.Placement
+    """
     delta_list = [
                 App.Vector(height/2,  -width/2, 0),
                 App.Vector(0,         -width/2, 0),
@@ -128,27 +202,26 @@ def makeG3DBeam(
     
     delta = pl.Rotation.multVec(delta)
     pl.Base = p1.add(delta)
+    return pl
 
-    section.Placement = pl
-
-    beam = Arch.makeStructure(section, length=length)
 
+def setBeamProperties(beam, g3d_profile):
     beam.Profile = g3d_profile[1]
     # Set color
-    color = g3d_profile[7].split(",")
-    r = float(color[0]) / 255.0
-    g = float(color[1]) / 255.0
-    b = float(color[2]) / 255.0
-    beam.ViewObject.ShapeColor = (r, g, b)
+    if App.GuiUp:
+        color = g3d_profile[7].split(",")
+        r = float(color[0]) / 255.0
+        g = float(color[1]) / 255.0
+        b = float(color[2]) / 255.0
+        beam.ViewObject.ShapeColor = (r, g, b)
 
     beam.Label = g3d_profile[1]
     beam.IfcType = u"Transport Element"
     beam.PredefinedType = u"NOTDEFINED"
     beam.Tag = u"Gespal"
     beam.Description = str(g3d_profile[0])
-    beam.MoveBase = True
-    App.activeDocument().recompute(None, True, True)
-    return beam
+    # the shared section stays at the origin when the beam moves
+    beam.MoveBase = False
 
 
 class _CommandComposant:
@@ -178,11 +251,7 @@ class _CommandComposant:
 
         "Conditions to the tool to be active"
 
-        active = False
-        if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if obj.Name == "Product":
-                    active = True
+        active = g3d_registry.hasProduct()
 
         return active
 
@@ -216,6 +285,8 @@ class _CommandComposant:
         self.clicked_points = []
 
         self.tracker = g3d_tracker.beamTracker(shaded=False)
+        self.array_tracker = g3d_tracker.arrayBoxTracker()
+        self.scheduler = g3d_tracker.UpdateScheduler(self.applyUpdate)
                 
         title = translate("Gespal3D", "Point de départ du composant") + ":"
         
@@ -236,6 +307,10 @@ class _CommandComposant:
         grid = QtGui.QGridLayout()
         layout_widget.addLayout(grid)
 
+        # search box
+        self.component_search = g3d_search.ComponentSearch(self)
+        self.component_search.addToGrid(grid, 1)
+
         # categories box
         categories_items = [x[1] for x in self.categories]
         categories_label = QtGui.QLabel(translate("Gespal3D", "C&atégorie"))
@@ -679,9 +754,13 @@ class _CommandComposant:
 
         # pas de point
         if point is None:
+            self.scheduler.stop()
             self.tracker.finalize()
+            self.array_tracker.finalize()
             return
         else:
+            # a pending mouse event belongs to the previous step
+            self.scheduler.reset()
             self.clicked_points.append(
                 App.Vector(
                     round(point.x, 2), round(point.y, 2), round(point.z, 2)
@@ -698,6 +777,8 @@ class _CommandComposant:
                     )
                 )
                 self.tracker.finalize()
+                # created on every activation, the pattern may change on the way
+                self.array_tracker.finalize()
                 self.makeTransaction()
                 return
             elif self.direction == 'line':
@@ -707,6 +788,7 @@ class _CommandComposant:
                     snapper_title = "Point suivant"
                 elif len(self.clicked_points) == 2:
                     self.tracker.finalize()
+                    self.array_tracker.finalize()
                     self.makeTransaction()
                     return
                 else:
@@ -728,6 +810,7 @@ class _CommandComposant:
                     snapper_title = "Point suivant"
                 elif len(self.clicked_points) == 3:
                     #self.tracker.finalize()
+                    self.array_tracker.finalize()
                     self.makeTransaction()
                     return
                 else:
@@ -741,6 +824,7 @@ class _CommandComposant:
                     snapper_last = self.clicked_points[0]
                     snapper_title = "Point d'arrivé de la répartition"
                 elif len(self.clicked_points) == 3:
+                    self.array_tracker.finalize()
                     self.makeTransaction()
                     return
                 else:
@@ -759,10 +843,30 @@ class _CommandComposant:
 
     def update(self, point, info):
         "this function is called by the Snapper when the mouse is moved"
+        self.scheduler.push(point, info)
+
+    def applyUpdate(self, point, info):
+        "update the trackers, at most once per frame"
 
         if Gui.Control.activeDialog():
 
-            if self.direction != "line":
+            if self.pattern in ('distribution', 'filling') \
+                    and len(self.clicked_points) == 2:
+                # preview every beam of the pattern
+                segments = self.getPatternSegments(point)
+                if len(segments) > 0:
+                    self.array_tracker.setSize(
+                        self.tracker.width(), self.tracker.height())
+                    self.array_tracker.update(
+                        inclination=self.inclination,
+                        anchor_idx=self.anchor_idx,
+                        segments=segments,
+                    )
+                    self.array_tracker.on()
+                else:
+                    self.array_tracker.off()
+
+            elif self.direction != "line":
                 if len(self.clicked_points) == 0:
                     final_point = point.add(self.get_final_point(self.direction))
                     self.tracker.update(
@@ -997,38 +1101,26 @@ class _CommandComposant:
             self.filling_start = False
         print_debug("self.filling_start = {}".format(self.filling_start))
 
-    def makeTransaction(self, point=None):
-        """g3d beam makeTransaction"""
-        msg = ["", "----------", "makeTransaction"]
-        msg.append("la direction est : {}".format(str(self.direction)))
-        msg.append("le mode de pattern est : {}".format(str(self.pattern)))
-        msg.append("Détails de la liste des points cliqués :")
-        msg.append("longueur = {}".format(len(self.clicked_points)))
-        for p in self.clicked_points:
-            msg.append(str(p))
-        print_debug(msg)
-
-        commands = []
-        if self.pattern == 'none':
-            transaction_name = "Create G3DBeam from 1 points"
-            command = "freecad.workbench_gespal3d.g3d_beam.makeG3DBeam(" \
-            + "g3d_profile={}, ".format(str(self.Profile)) \
-            + "p1={}, ".format(str(DraftVecUtils.tup(self.clicked_points[0],True))) \
-            + "p2={}, ".format(str(DraftVecUtils.tup(self.clicked_points[1],True))) \
-            + "anchor={}, ".format(self.anchor_idx) \
-            + "inclination={}, ".format(self.inclination) \
-            + ")"
-            commands.append(command)
-
-        elif self.pattern == 'distribution':
-            transaction_name = "Création d'une répartition de composants."
-            length = DraftVecUtils.dist(self.clicked_points[0], self.clicked_points[2])
+    def getPatternSegments(self, end_point):
+        """
+        Return the (p1, p2) segments of the beams of the distribution or
+        filling pattern, from the first beam (two first clicked points) up
+        to end_point. Used by makeTransaction and by the array preview.
+        :param end_point: App.Vector
+        :return: list[(App.Vector, App.Vector)]
+        """
+        segments = []
+        length = DraftVecUtils.dist(self.clicked_points[0], end_point)
+        if length == 0:
+            return segments
+        vec = end_point.sub(self.clicked_points[0])
+        vec_norm = vec.normalize()
+        p1 = self.clicked_points[0]
+        p2 = self.clicked_points[1]
+
+        if self.pattern == 'distribution':
             space = length / (self.distribution_qty + 1)
-            vec = self.clicked_points[2].sub(self.clicked_points[0])
-            vec_norm = vec.normalize()
-            vec_axe = vec_norm.multiply(space)
-            p1 = self.clicked_points[0]
-            p2 = self.clicked_points[1]
+            vec_axe = App.Vector(vec_norm).multiply(space)
             qty = self.distribution_qty
             if self.distribution_start.isChecked():
                 p1 = p1.sub(vec_axe)
@@ -1037,56 +1129,84 @@ class _CommandComposant:
             if self.distribution_end.isChecked():
                 qty += 1
             for distri in range(qty):
-                #if not self.distribution_start.isChecked():    
                 p1 = p1.add(vec_axe)
                 p2 = p2.add(vec_axe)
-                command = "freecad.workbench_gespal3d.g3d_beam.makeG3DBeam(" \
-                + "g3d_profile={}, ".format(str(self.Profile)) \
-                + "p1={}, ".format(str(DraftVecUtils.tup(p1, True))) \
-                + "p2={}, ".format(str(DraftVecUtils.tup(p2, True))) \
-                + "anchor={}, ".format(self.anchor_idx) \
-                + "inclination={}, ".format(self.inclination) \
-                + ")"
-                commands.append(command)
+                segments.append((p1, p2))
 
         elif self.pattern == 'filling':
-            transaction_name = "Création d'un remplissage de composants."
-            length = DraftVecUtils.dist(self.clicked_points[0], self.clicked_points[2])
             space = self.fill_space + self.getHeight()
+            if space <= 0:
+                return segments
             qty = int(length / space) + 1
-            vec = self.clicked_points[2].sub(self.clicked_points[0])
-            vec_norm = vec.normalize()
-            vec_axe = vec_norm.multiply(space)
-            vec = self.clicked_points[2].sub(self.clicked_points[0])
-            vec_norm = vec.normalize()
-            vec_fill_space = vec_norm.multiply(self.fill_space)
-            p1 = self.clicked_points[0]
-            p2 = self.clicked_points[1]
+            vec_axe = App.Vector(vec_norm).multiply(space)
+            vec_fill_space = App.Vector(vec_norm).multiply(self.fill_space)
             if self.filling_start is True:
-                p1 += vec_fill_space
-                p2 += vec_fill_space
+                p1 = p1.add(vec_fill_space)
+                p2 = p2.add(vec_fill_space)
             for q in range(qty):
-                command = "freecad.workbench_gespal3d.g3d_beam.makeG3DBeam(" \
-                + "g3d_profile={}, ".format(str(self.Profile)) \
-                + "p1={}, ".format(str(DraftVecUtils.tup(p1, True))) \
-                + "p2={}, ".format(str(DraftVecUtils.tup(p2, True))) \
-                + "anchor={}, ".format(self.anchor_idx) \
-                + "inclination={}, ".format(self.inclination) \
-                + ")"
-                commands.append(command)
+                segments.append((p1, p2))
                 p1 = p1.add(vec_axe)
                 p2 = p2.add(vec_axe)
 
+        return segments
+
+    def makeTransaction(self, point=None):
+        """g3d beam makeTransaction"""
+        msg = ["", "----------", "makeTransaction"]
+        msg.append("la direction est : {}".format(str(self.direction)))
+        msg.append("le mode de pattern est : {}".format(str(self.pattern)))
+        msg.append("Détails de la liste des points cliqués :")
+        msg.append("longueur = {}".format(len(self.clicked_points)))
+        for p in self.clicked_points:
+            msg.append(str(p))
+        print_debug(msg)
+        self.scheduler.stop()
+
+        segments = []
+        if self.pattern == 'none':
+            transaction_name = "Create G3DBeam from 1 points"
+            segments.append((self.clicked_points[0], self.clicked_points[1]))
+
+        elif self.pattern == 'distribution':
+            transaction_name = "Création d'une répartition de composants."
+            segments = self.getPatternSegments(self.clicked_points[2])
+
+        elif self.pattern == 'filling':
+            transaction_name = "Création d'un remplissage de composants."
+            segments = self.getPatternSegments(self.clicked_points[2])
+
         else:
             App.Console.PrintWarning("This mode is not implemented")
             return
-        
+
+        if len(segments) == 0:
+            App.Console.PrintWarning("Aucun composant à créer.\n")
+            return
+
+        segments = [
+            (DraftVecUtils.tup(p1, True), DraftVecUtils.tup(p2, True))
+            for p1, p2 in segments
+        ]
+        if len(segments) == 1:
+            command = "freecad.workbench_gespal3d.g3d_beam.makeG3DBeam(" \
+            + "g3d_profile={}, ".format(str(self.Profile)) \
+            + "p1={}, ".format(str(segments[0][0])) \
+            + "p2={}, ".format(str(segments[0][1])) \
+            + "anchor={}, ".format(self.anchor_idx) \
+            + "inclination={}, ".format(self.inclination) \
+            + ")"
+        else:
+            command = "freecad.workbench_gespal3d.g3d_beam.makeG3DBeams(" \
+            + "g3d_profile={}, ".format(str(self.Profile)) \
+            + "segments={}, ".format(str(segments)) \
+            + "anchor={}, ".format(self.anchor_idx) \
+            + "inclination={}, ".format(self.inclination) \
+            + ")"
+
         App.ActiveDocument.openTransaction(translate("Gespal3D", transaction_name))
         Gui.addModule("freecad.workbench_gespal3d.g3d_beam")
-        for command in commands:
-            Gui.doCommand(command)
+        Gui.doCommand(command)
         App.ActiveDocument.commitTransaction()
-        App.ActiveDocument.recompute()
 
         if self.continueCmd:
             self.Activated()
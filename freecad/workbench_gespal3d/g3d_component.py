@@ -0,0 +1,570 @@
+# coding: utf-8
+
+import os
+import FreeCAD as App
+import Part
+from freecad.workbench_gespal3d import print_debug
+
+if App.GuiUp:
+    import FreeCADGui as Gui
+    from DraftTools import translate
+    from PySide.QtCore import QT_TRANSLATE_NOOP
+    from freecad.workbench_gespal3d import g3d_registry
+    from freecad.workbench_gespal3d import ICONPATH
+else:
+    # \cond
+    def translate(ctxt, txt):
+        return txt
+
+    def QT_TRANSLATE_NOOP(ctxt, txt):
+        return txt
+
+    # \endcond
+
+
+__title__ = "Gespal3D Component"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+# Section shapes built in closed form, the others stay Arch Structures.
+BEAM_SECTIONS = ("R", "T", "C")
+# Relative tolerance when a migrated component is compared to the original.
+MIGRATION_TOLERANCE = 1e-6
+
+
+def getType(obj):
+    proxy = getattr(obj, "Proxy", None)
+    return getattr(proxy, "Type", None)
+
+
+def isComponent(obj):
+    return getType(obj) == "G3D::Component"
+
+
+def setColor(obj, g3d_profile):
+    if App.GuiUp:
+        color = g3d_profile[7].split(",")
+        r = float(color[0]) / 255.0
+        g = float(color[1]) / 255.0
+        b = float(color[2]) / 255.0
+        obj.ViewObject.ShapeColor = (r, g, b)
+
+
+def makeG3DComponentBeam(g3d_profile, length, placement=None, doc=None):
+    """
+    Create a beam component extruded along the Z axis of its placement,
+    the section is centered on the placement base like the Arch profiles.
+    :param g3d_profile: list
+    :param length: float
+    :param placement: App.Placement
+    :param doc: App.Document, the active one by default
+    :return: object
+    """
+    if doc is None:
+        doc = App.ActiveDocument
+    obj = doc.addObject("Part::FeaturePython", "Structure")
+    _G3DComponent(obj, "Beam")
+    obj.SectionShape = g3d_profile[6]
+    if g3d_profile[6] == "C":
+        obj.Height = obj.Width = g3d_profile[4]
+    else:
+        obj.Height = g3d_profile[4]
+        obj.Width = g3d_profile[5]
+    obj.Length = length
+    if placement is not None:
+        obj.Placement = placement
+    setComponentProperties(obj, g3d_profile)
+    return obj
+
+
+def makeG3DComponentPanel(g3d_profile, length, width, thickness, placement=None, doc=None):
+    """
+    Create a panel component, the rectangle is centered on the placement
+    base and the thickness goes along its Z axis like the Arch panels.
+    :param g3d_profile: list
+    :param length: float
+    :param width: float
+    :param thickness: float
+    :param placement: App.Placement
+    :param doc: App.Document, the active one by default
+    :return: object
+    """
+    if doc is None:
+        doc = App.ActiveDocument
+    obj = doc.addObject("Part::FeaturePython", "Panel")
+    _G3DComponent(obj, "Panel")
+    obj.Length = length
+    obj.Width = width
+    obj.Thickness = thickness
+    if placement is not None:
+        obj.Placement = placement
+    setComponentProperties(obj, g3d_profile)
+    return obj
+
+
+def setComponentProperties(obj, g3d_profile):
+    obj.Profile = g3d_profile[1]
+    obj.Label = g3d_profile[1]
+    obj.Tag = u"Gespal"
+    obj.Description = str(g3d_profile[0])
+    if App.GuiUp:
+        _ViewProviderG3DComponent(obj.ViewObject)
+    setColor(obj, g3d_profile)
+
+
+def addSubtraction(obj, tool):
+    """Machine a component with the shape of tool."""
+    addSubtractions(obj, [tool])
+
+
+def addSubtractions(obj, tools):
+    """
+    Machine a component with several tools, the component is recomputed
+    once for all of them.
+    :param obj: G3D component
+    :param tools: list of objects
+    """
+    subtractions = obj.Subtractions
+    added = False
+    for tool in tools:
+        if tool not in subtractions:
+            subtractions.append(tool)
+            added = True
+        if App.GuiUp:
+            tool.ViewObject.hide()
+    if added:
+        obj.Subtractions = subtractions
+
+
+def cutTools(shape, tools):
+    """
+    Cut all the tools from shape in a single boolean operation, rather
+    than one cut per tool on a shape getting more complex at each step.
+    Falls back on the cuts one by one if OCC fails on the whole set.
+    :param shape: Part.Shape
+    :param tools: list of Part.Shape
+    :return: Part.Shape
+    """
+    if len(tools) == 0:
+        return shape
+    try:
+        result = shape.cut(tools)
+        if not result.isNull():
+            return result
+    except Part.OCCError as error:
+        print_debug(["cutTools : single cut failed, cutting one by one", error])
+    for tool in tools:
+        shape = shape.cut(tool)
+    return shape
+
+
+class _G3DComponent:
+
+    """
+    A Gespal part built directly from its dimensions : a box or a prism for
+    the beams, a box for the panels. It keeps the Tag, Description and
+    Subtractions properties of the Arch components used by the listing,
+    the machining and the delete tool, without the Arch and IFC ones.
+    """
+
+    def __init__(self, obj, kind="Beam"):
+        obj.addProperty(
+            "App::PropertyString", "Tag", "Gespal",
+            QT_TRANSLATE_NOOP("App::Property", "Gespal tag"))
+        obj.addProperty(
+            "App::PropertyString", "Description", "Gespal",
+            QT_TRANSLATE_NOOP("App::Property", "Component ID in the database"))
+        obj.addProperty(
+            "App::PropertyString", "Profile", "Gespal",
+            QT_TRANSLATE_NOOP("App::Property", "Component name in the database"))
+        obj.addProperty(
+            "App::PropertyString", "Kind", "Gespal",
+            QT_TRANSLATE_NOOP("App::Property", "Beam or Panel"))
+        obj.Kind = kind
+        obj.setEditorMode("Kind", 1)
+        # The listing tells the beams from the panels with Height / Thickness
+        if kind == "Beam":
+            obj.addProperty(
+                "App::PropertyString", "SectionShape", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Shape code of the section : R, T or C"))
+            obj.setEditorMode("SectionShape", 1)
+            obj.addProperty(
+                "App::PropertyLength", "Height", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Height of the section"))
+            obj.addProperty(
+                "App::PropertyLength", "Width", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Width of the section"))
+            obj.addProperty(
+                "App::PropertyLength", "Length", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Length of the beam"))
+        else:
+            obj.addProperty(
+                "App::PropertyLength", "Length", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Length of the panel"))
+            obj.addProperty(
+                "App::PropertyLength", "Width", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Width of the panel"))
+            obj.addProperty(
+                "App::PropertyLength", "Thickness", "Gespal",
+                QT_TRANSLATE_NOOP("App::Property", "Thickness of the panel"))
+        obj.addProperty(
+            "App::PropertyLinkList", "Subtractions", "Gespal",
+            QT_TRANSLATE_NOOP("App::Property", "Machinings cut from the component"))
+        obj.Proxy = self
+        self.Type = "G3D::Component"
+
+    def getSolid(self, obj):
+        """
+        Return the component solid in its local coordinates, or None when a
+        dimension is null.
+        :param obj: object
+        :return: Part.Shape
+        """
+        if obj.Kind == "Panel":
+            length = obj.Length.Value
+            width = obj.Width.Value
+            thickness = obj.Thickness.Value
+            if length <= 0 or width <= 0 or thickness <= 0:
+                return None
+            return Part.makeBox(
+                length, width, thickness,
+                App.Vector(-length / 2, -width / 2, 0))
+
+        height = obj.Height.Value
+        width = obj.Width.Value
+        length = obj.Length.Value
+        if height <= 0 or width <= 0 or length <= 0:
+            return None
+        if obj.SectionShape == "C":
+            return Part.makeCylinder(height / 2, length)
+        if obj.SectionShape == "T":
+            wire = Part.makePolygon([
+                App.Vector(-height / 2, -width / 2, 0),
+                App.Vector(-height / 2, width / 2, 0),
+                App.Vector(height / 2, -width / 2, 0),
+                App.Vector(-height / 2, -width / 2, 0),
+            ])
+            return Part.Face(wire).extrude(App.Vector(0, 0, length))
+        return Part.makeBox(
+            height, width, length,
+            App.Vector(-height / 2, -width / 2, 0))
+
+    def getBaseKey(self, obj):
+        if obj.Kind == "Panel":
+            return (obj.Kind, obj.Length.Value, obj.Width.Value, obj.Thickness.Value)
+        return (obj.Kind, obj.SectionShape, obj.Height.Value,
+                obj.Width.Value, obj.Length.Value)
+
+    def getBaseSolid(self, obj):
+        """
+        Return the solid before machining, built again only when a
+        dimension changes. The cache is not saved with the document.
+        """
+        key = self.getBaseKey(obj)
+        if key != getattr(self, "base_key", None):
+            self.base_solid = self.getSolid(obj)
+            self.base_key = key
+        return self.base_solid
+
+    def getTools(self, obj):
+        """Return the machining shapes in the local coordinates of obj."""
+        local = obj.Placement.inverse()
+        tools = []
+        for tool in obj.Subtractions:
+            if tool.Shape.isNull():
+                continue
+            cut = tool.Shape.copy()
+            cut.Placement = local.multiply(cut.Placement)
+            tools.append(cut)
+        return tools
+
+    def execute(self, obj):
+        pl = obj.Placement
+        shape = self.getBaseSolid(obj)
+        if shape is None:
+            return
+        tools = self.getTools(obj)
+        if len(tools) == 0:
+            # Keep the cached solid apart from the placement set below
+            shape = shape.copy()
+        shape = cutTools(shape, tools)
+        obj.Shape = shape
+        obj.Placement = pl
+
+    def onBeforeChange(self, obj, prop):
+        if prop == "Placement":
+            self.oldPlacement = App.Placement(obj.Placement)
+
+    def onChanged(self, obj, prop):
+        # Machinings made with MoveWithHost follow the component
+        old = getattr(self, "oldPlacement", None)
+        if prop != "Placement" or old is None:
+            return
+        self.oldPlacement = None
+        if old.isSame(obj.Placement):
+            return
+        delta = obj.Placement.multiply(old.inverse())
+        for tool in obj.Subtractions:
+            if getattr(tool, "MoveWithHost", False):
+                tool.Placement = delta.multiply(tool.Placement)
+
+    def __getstate__(self):
+        return self.Type
+
+    def __setstate__(self, state):
+        if state:
+            self.Type = state
+
+
+class _ViewProviderG3DComponent:
+
+    """View provider of the Gespal components, the machinings are its children."""
+
+    def __init__(self, vobj):
+        vobj.Proxy = self
+
+    def attach(self, vobj):
+        self.Object = vobj.Object
+
+    def getIcon(self):
+        import Arch_rc
+        if getattr(self, "Object", None) is not None and self.Object.Kind == "Panel":
+            return ":/icons/Arch_Panel_Tree.svg"
+        return ":/icons/Arch_Structure_Tree.svg"
+
+    def claimChildren(self):
+        return self.Object.Subtractions
+
+    def __getstate__(self):
+        return None
+
+    def __setstate__(self, state):
+        return None
+
+
+def getBeamSection(obj):
+    """
+    Return (shape code, height, width) of the section of an Arch Structure
+    extruded from a Gespal profile, or None.
+    :param obj: object
+    :return: tuple or None
+    """
+    base = getattr(obj, "Base", None)
+    if base is None:
+        return None
+    section = base
+    if getType(base) == "Clone":
+        if len(base.Objects) != 1:
+            return None
+        section = base.Objects[0]
+    if getType(section) != "Profile":
+        return None
+    if hasattr(section, "Diameter"):
+        return ("C", section.Diameter.Value, section.Diameter.Value)
+    code = getattr(section, "SectionKey", "").split(":")[0]
+    if not code:
+        code = type(section.Proxy).__name__.replace("_Profile", "")
+    if code not in BEAM_SECTIONS:
+        return None
+    return (code, section.Height.Value, section.Width.Value)
+
+
+def isSameShape(old, new):
+    """
+    True when both shapes fill the same space : same volume and bounding
+    box, and their common part has the volume of each of them.
+    :param old: Part.Shape
+    :param new: Part.Shape
+    :return: bool
+    """
+    tolerance = MIGRATION_TOLERANCE * max(old.Volume, 1.0)
+    if abs(old.Volume - new.Volume) > tolerance:
+        return False
+    bb_old = old.BoundBox
+    bb_new = new.BoundBox
+    bb_tolerance = MIGRATION_TOLERANCE * max(bb_old.DiagonalLength, 1.0)
+    for attr in ("XMin", "YMin", "ZMin", "XMax", "YMax", "ZMax"):
+        if abs(getattr(bb_old, attr) - getattr(bb_new, attr)) > bb_tolerance:
+            return False
+    # Same volume and box do not mean same faces, e.g. a hole moved
+    try:
+        common = old.common(new).Volume
+    except Part.OCCError:
+        return False
+    return abs(common - old.Volume) <= tolerance and abs(common - new.Volume) <= tolerance
+
+
+# Links of the other objects that can be pointed to the new component
+RELINK_PROPERTIES = ("App::PropertyLink", "App::PropertyLinkList",
+                     "App::PropertyLinkGlobal", "App::PropertyLinkListGlobal")
+
+
+def getLinksTo(obj):
+    """
+    Find the properties of the other objects linking to obj, the TechDraw
+    views of the listing, the mirrors and the groups for example.
+    :param obj: object
+    :return: (list of (parent, property), list of str describing the links
+             which cannot be moved to another object)
+    """
+    links = []
+    blocking = []
+    for parent in obj.InList:
+        found = False
+        for prop in parent.PropertiesList:
+            value = getattr(parent, prop, None)
+            if value is obj or (isinstance(value, list) and obj in value):
+                if parent.getTypeIdOfProperty(prop) in RELINK_PROPERTIES:
+                    links.append((parent, prop))
+                    found = True
+                else:
+                    blocking.append("{}.{}".format(parent.Label, prop))
+                    found = True
+        if not found:
+            # Sub-element links and expressions name faces or properties
+            # the new component may not have
+            blocking.append(parent.Label)
+    return links, blocking
+
+
+def relink(links, old, new):
+    for parent, prop in links:
+        value = getattr(parent, prop)
+        if isinstance(value, list):
+            setattr(parent, prop, [new if item is old else item for item in value])
+        else:
+            setattr(parent, prop, new)
+
+
+def migrateObject(doc, obj, report=None):
+    """
+    Replace an Arch Structure or Panel of Gespal by a component with the
+    same shape, the objects linking to it (TechDraw views, mirrors, groups)
+    are pointed to the new one. The object is kept when it cannot be built
+    in closed form, when the new shape differs or when another object uses
+    it in a way that cannot be moved.
+    :param doc: App.Document
+    :param obj: object
+    :param report: list, receives (label, reason) for each kept object
+    :return: the new component or None
+    """
+    def keep(reason):
+        print_debug("{} is not migrated : {}".format(obj.Name, reason))
+        if report is not None:
+            report.append((obj.Label, reason))
+        return None
+
+    kind = getType(obj)
+    if kind not in ("Structure", "Panel"):
+        return None
+    if len(getattr(obj, "Additions", [])) > 0:
+        return keep("ajouts")
+    links, blocking = getLinksTo(obj)
+    if len(blocking) > 0:
+        return keep("utilisé par " + ", ".join(blocking))
+
+    if kind == "Structure":
+        section = getBeamSection(obj)
+        if section is None or getattr(obj, "Normal", App.Vector()).Length > 0:
+            return keep("section non gérée")
+        code, height, width = section
+        new = doc.addObject("Part::FeaturePython", "Structure")
+        _G3DComponent(new, "Beam")
+        new.SectionShape = code
+        new.Height = height
+        new.Width = width
+        new.Length = obj.Length.Value
+        # beams carry their placement, older ones left it on a clone
+        new.Placement = obj.Placement.multiply(obj.Base.Placement)
+    else:
+        if obj.Base is not None or getattr(obj, "Offset", App.Units.Quantity()).Value != 0:
+            return keep("panneau non rectangulaire")
+        new = doc.addObject("Part::FeaturePython", "Panel")
+        _G3DComponent(new, "Panel")
+        new.Length = obj.Length.Value
+        new.Width = obj.Width.Value
+        new.Thickness = obj.Thickness.Value
+        new.Placement = obj.Placement
+
+    new.Profile = getattr(obj, "Profile", obj.Label)
+    new.Label = obj.Label
+    new.Tag = obj.Tag
+    new.Description = obj.Description
+    new.Subtractions = obj.Subtractions
+    new.recompute()
+    if new.Shape.isNull() or not isSameShape(obj.Shape, new.Shape):
+        doc.removeObject(new.Name)
+        return keep("forme différente")
+
+    if App.GuiUp:
+        _ViewProviderG3DComponent(new.ViewObject)
+        new.ViewObject.ShapeColor = obj.ViewObject.ShapeColor
+        new.ViewObject.Visibility = obj.ViewObject.Visibility
+    relink(links, obj, new)
+    base = getattr(obj, "Base", None)
+    obj.Subtractions = []
+    doc.removeObject(obj.Name)
+    # The clone of the section, the shared section itself is kept
+    if base is not None and len(base.InList) == 0:
+        doc.removeObject(base.Name)
+    return new
+
+
+def migrateDocument(doc=None):
+    """
+    Replace the simple Arch components of a document by Gespal components.
+    :param doc: App.Document, the active one by default
+    :return: (number of migrated objects, number of objects kept)
+    """
+    if doc is None:
+        doc = App.ActiveDocument
+    migrated = 0
+    kept = 0
+    candidates = [
+        obj for obj in doc.Objects
+        if getattr(obj, "Tag", None) == "Gespal"
+        and getType(obj) in ("Structure", "Panel")
+    ]
+    report = []
+    for obj in candidates:
+        if migrateObject(doc, obj, report) is not None:
+            migrated += 1
+        else:
+            kept += 1
+    doc.recompute()
+    for label, reason in report:
+        App.Console.PrintMessage("{} conservé : {}\n".format(label, reason))
+    return migrated, kept
+
+
+class _CommandMigrateComponents:
+
+    "Gespal 3D - Migrate the Arch components"
+
+    def GetResources(self):
+        return {
+            "Pixmap": os.path.join(ICONPATH, "gespal3d_wb.svg"),
+            "MenuText": QT_TRANSLATE_NOOP("Gespal3D", "Alléger les composants"),
+            "ToolTip": "<html><head/><body><p><b>Convertir les composants du document.</b> \
+                    <br><br> \
+                    Remplace les barres et panneaux Arch simples par des composants \
+                    Gespal plus légers. Les composants complexes sont conservés. \
+                    </p></body></html>",
+        }
+
+    def IsActive(self):
+        return g3d_registry.hasProduct()
+
+    def Activated(self):
+        doc = App.ActiveDocument
+        doc.openTransaction(translate("Gespal3D", "Alléger les composants"))
+        migrated, kept = migrateDocument(doc)
+        doc.commitTransaction()
+        App.Console.PrintMessage(
+            "{} composants convertis, {} conservés.\n".format(migrated, kept))
+
+
+if App.GuiUp:
+    Gui.addCommand("G3D_MigrateComponents", _CommandMigrateComponents())
@@ -2,7 +2,6 @@
 
 import sys, os
 import sqlite3
-from sqlite3 import Error
 
 import FreeCAD as App
 
@@ -13,7 +12,9 @@ if App.GuiUp:
                                             PARAMPATH,
                                             ICONPATH,
                                             UIPATH,
+                                            g3d_backup,
                                             g3d_connect_db,
+                                            g3d_importer,
                                             print_debug)
 
 
@@ -28,6 +29,412 @@ def translate(context, text, disambig=None):
     return QtCore.QCoreApplication.translate(context, text, disambig)
 
 
+# Columns of the table : header, tooltip and the SQL expression used to sort.
+COLUMNS = [
+    ("Index", "Index", "c.CO_COMPTEUR"),
+    ("Catégorie", "La catégorie à laquelle appartient le composant.", "f.FC_NOM"),
+    ("Composant", "Le nom du composant.", "c.CO_NOM COLLATE NOCASE"),
+    ("Section", "La forme de la section du composant. R pour Rectangulaire et C pour Cylindrique.", "c.CO_FORME"),
+    ("Largeur (mm)", "Largeur de la section. Ou le diamètre pour une section cylindrique.", "c.CO_LARGEUR"),
+    ("Épaisseur (mm)", "Épaisseur de la section. Ou le diamètre pour une section cylindrique.", "c.CO_EPAISSEUR"),
+    ("Longueur (mm)", "Longueur du composant, laisser à 0 si ce composant doit s'adapter aux dimensions du produit lors de la création.", "c.CO_LONGUEUR"),
+    ("Couleur", "La couleur de la forme.", "c.CO_COULEUR"),
+    ("Masse volumique (kg/m³)", "La masse volumique du matériau utilisé.", "c.CO_MASSE"),
+    ("CAO", "Le fichier CAO du composant.", "c.CO_FICHIER_CAD"),
+]
+# Database field of each column, in the order of the SELECT.
+FIELDS = [
+    "CO_COMPTEUR", "CO_FAMILLE", "CO_NOM", "CO_FORME", "CO_LARGEUR",
+    "CO_EPAISSEUR", "CO_LONGUEUR", "CO_COULEUR", "CO_MASSE", "CO_FICHIER_CAD",
+]
+COLOR_COLUMN = 7
+CAD_COLUMN = 9
+INT_COLUMNS = (4, 5, 6, 8)
+SHAPES = ['R', 'C', 'T']
+ADD_CATEGORY = "Ajouter..."
+PAGE_SIZE = 200
+# Delay after the last edit before the pending changes are written.
+FLUSH_DELAY = 2000
+
+
+class EditSession(QtCore.QObject):
+    """
+    Write-behind queue of the component manager edits. Cell changes and
+    deletions are kept in memory and written in a single transaction with
+    executemany, FLUSH_DELAY ms after the last edit, before the table is
+    read again, or when the manager is validated.
+    """
+
+    def __init__(self, con, on_commit=None, backup=None, on_error=None, parent=None):
+        super(EditSession, self).__init__(parent)
+        self.con = con
+        self.on_commit = on_commit
+        # Called with the error when a flush fails, the changes are then lost
+        self.on_error = on_error
+        # Snapshot taken when the manager opened, restored on cancel
+        self.backup = backup
+        self.written = False
+        # {field: {CO_COMPTEUR: value}}, the last value of a cell wins
+        self.updates = {}
+        self.deletes = set()
+        # Statements executed directly but not committed yet, e.g. inserts
+        self.dirty = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FLUSH_DELAY)
+        QtCore.QObject.connect(self.timer, QtCore.SIGNAL("timeout()"), self.flush)
+
+    def isPending(self):
+        return self.dirty or len(self.updates) > 0 or len(self.deletes) > 0
+
+    def beforeWrite(self):
+        # A snapshot still running would copy the first writes as well
+        if self.backup is not None:
+            self.backup.wait()
+        self.written = True
+
+    def update(self, field, co_compteur, value):
+        if field not in FIELDS:
+            raise ValueError("Unknown field {}".format(field))
+        self.updates.setdefault(field, {})[co_compteur] = value
+        self.timer.start()
+
+    def delete(self, ids):
+        for co_compteur in ids:
+            self.deletes.add(co_compteur)
+            for values in self.updates.values():
+                values.pop(co_compteur, None)
+        self.timer.start()
+
+    def execute(self, sql, params=()):
+        """Execute a statement now and commit it with the next flush."""
+        self.beforeWrite()
+        cur = self.con.cursor()
+        g3d_connect_db.retryLocked(cur.execute, sql, params)
+        self.dirty = True
+        self.timer.start()
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        self.beforeWrite()
+        cur = self.con.cursor()
+        g3d_connect_db.retryLocked(cur.executemany, sql, seq_of_params)
+        self.dirty = True
+        self.timer.start()
+        return cur
+
+    def flush(self):
+        """
+        Write the pending changes in one transaction. On failure nothing is
+        written, the queue is dropped and on_error is called : the flush
+        also runs from the timer, where an exception would not be caught.
+        :return: int, number of rows changed, None on failure
+        """
+        self.timer.stop()
+        if not self.isPending():
+            return 0
+        self.beforeWrite()
+        cur = self.con.cursor()
+        count = 0
+        try:
+            for field, values in self.updates.items():
+                if len(values) == 0:
+                    continue
+                sql = "UPDATE Composant SET {} = ? WHERE CO_COMPTEUR = ?".format(field)
+                g3d_connect_db.retryLocked(
+                    cur.executemany, sql, [(value, key) for key, value in values.items()])
+                count += len(values)
+            if len(self.deletes) > 0:
+                g3d_connect_db.retryLocked(
+                    cur.executemany,
+                    "DELETE FROM Composant WHERE CO_COMPTEUR = ?",
+                    [(key,) for key in self.deletes])
+                count += len(self.deletes)
+            # A busy commit keeps the transaction, it can be tried again
+            g3d_connect_db.retryLocked(self.con.commit)
+        except sqlite3.Error as e:
+            self.con.rollback()
+            self.clear()
+            App.Console.PrintError(
+                "Gestionnaire de composants : échec de l'enregistrement ({}).\n".format(e))
+            if self.on_error is not None:
+                self.on_error(e)
+            return None
+        self.clear()
+        print_debug("edit session : {} changes written".format(count))
+        if self.on_commit is not None:
+            self.on_commit()
+        return count
+
+    def rollback(self):
+        """Forget the pending changes."""
+        self.timer.stop()
+        self.clear()
+        self.con.rollback()
+
+    def clear(self):
+        self.updates = {}
+        self.deletes = set()
+        self.dirty = False
+
+
+class ComponentTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model of the Composant table. The rows are read from the database
+    by pages of PAGE_SIZE as the view scrolls, sorted and filtered by SQL.
+    """
+
+    def __init__(self, con, session, parent=None):
+        super(ComponentTableModel, self).__init__(parent)
+        self.con = con
+        self.session = session
+        self.rows = []
+        self.exhausted = True
+        self.order_by = COLUMNS[0][2]
+        self.descending = False
+        self.filter_text = ""
+        self.categories = {}
+        self.colors = {}
+
+    def loadCategories(self):
+        cur = self.con.cursor()
+        cur.execute("SELECT FC_COMPTEUR, FC_NOM FROM Famille_Composant")
+        self.categories = {row[0]: row[1] for row in cur.fetchall()}
+
+    def getCategoryNames(self):
+        return list(self.categories.values()) + [ADD_CATEGORY]
+
+    def getCategoryId(self, name):
+        for key, value in self.categories.items():
+            if value == name:
+                return key
+        return None
+
+    def getQuery(self):
+        sql = "SELECT " + ", ".join("c." + field for field in FIELDS) + \
+            " FROM Composant c LEFT JOIN Famille_Composant f" \
+            " ON f.FC_COMPTEUR = c.CO_FAMILLE"
+        params = []
+        if self.filter_text:
+            pattern = "%" + self.filter_text.replace("\\", "\\\\") \
+                .replace("%", "\\%").replace("_", "\\_") + "%"
+            sql += " WHERE CAST(c.CO_COMPTEUR AS TEXT) LIKE ? ESCAPE '\\'" \
+                " OR f.FC_NOM LIKE ? ESCAPE '\\'" \
+                " OR c.CO_NOM LIKE ? ESCAPE '\\'" \
+                " OR c.CO_FORME LIKE ? ESCAPE '\\'" \
+                " OR c.CO_FICHIER_CAD LIKE ? ESCAPE '\\'"
+            params = [pattern] * 5
+        sql += " ORDER BY {} {}, c.CO_COMPTEUR".format(
+            self.order_by, "DESC" if self.descending else "ASC")
+        return sql, params
+
+    def refresh(self):
+        """Read the categories and the first page again."""
+        self.session.flush()
+        self.beginResetModel()
+        self.loadCategories()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QtCore.QModelIndex())
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(COLUMNS)
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return not self.exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self.exhausted:
+            return
+        # Deleted rows are no longer in self.rows, they must not be in the
+        # database either or the offset would load shown rows again
+        self.session.flush()
+        if self.exhausted:
+            return
+        sql, params = self.getQuery()
+        sql += " LIMIT ? OFFSET ?"
+        cur = self.con.cursor()
+        cur.execute(sql, params + [PAGE_SIZE, len(self.rows)])
+        page = [list(row) for row in cur.fetchall()]
+        if len(page) < PAGE_SIZE:
+            self.exhausted = True
+        if len(page) == 0:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+        print_debug("component table : {} rows loaded".format(len(self.rows)))
+
+    def findRow(self, co_compteur):
+        """
+        Return the row of a component, the next pages are loaded until it is
+        found. -1 when it is not shown.
+        """
+        row = 0
+        while True:
+            for i in range(row, len(self.rows)):
+                if self.rows[i][0] == co_compteur:
+                    return i
+            if self.exhausted:
+                return -1
+            row = len(self.rows)
+            self.fetchMore(QtCore.QModelIndex())
+
+    def getId(self, row):
+        return self.rows[row][0]
+
+    def getColor(self, value):
+        color = self.colors.get(value)
+        if color is None:
+            try:
+                rgb = [int(x) for x in str(value).split(',')]
+            except ValueError:
+                rgb = []
+            if len(rgb) == 3:
+                color = QtGui.QColor(rgb[0], rgb[1], rgb[2])
+            else:
+                color = QtGui.QColor(0, 0, 0)
+            self.colors[value] = color
+        return color
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        value = self.rows[index.row()][column]
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            if column == COLOR_COLUMN:
+                return None
+            if column == 1:
+                return self.categories.get(value, ADD_CATEGORY)
+            if column in INT_COLUMNS:
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    return 0
+            if value is None:
+                return None
+            return value if column == 0 else str(value)
+        if role == QtCore.Qt.BackgroundRole and column == COLOR_COLUMN:
+            return self.getColor(value)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation != QtCore.Qt.Horizontal:
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return COLUMNS[section][0]
+        if role == QtCore.Qt.ToolTipRole:
+            return COLUMNS[section][1]
+        return None
+
+    def flags(self, index):
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        # Color and CAD file are chosen with a dialog on double click
+        if index.column() not in (0, COLOR_COLUMN, CAD_COLUMN):
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+        row = index.row()
+        column = index.column()
+        if column == 0:
+            return False
+        if column == 1:
+            value = self.getCategoryId(value)
+            if value is None:
+                return False
+        elif column in INT_COLUMNS:
+            value = int(value)
+        else:
+            value = str(value)
+        if self.rows[row][column] == value:
+            return False
+        co_compteur = self.rows[row][0]
+        print_debug("Updating component {} : {} = {}".format(
+            co_compteur, FIELDS[column], value))
+        self.session.update(FIELDS[column], co_compteur, value)
+        self.rows[row][column] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def removeIds(self, ids):
+        """Remove the rows of these components and queue their deletion."""
+        ids = set(ids)
+        self.session.delete(ids)
+        for row in reversed(range(len(self.rows))):
+            if self.rows[row][0] in ids:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.order_by = COLUMNS[column][2]
+        self.descending = order == QtCore.Qt.DescendingOrder
+        self.refresh()
+
+    def setFilter(self, text):
+        self.filter_text = text.strip()
+        self.refresh()
+
+
+class ComponentDelegate(QtGui.QStyledItemDelegate):
+    """Combo boxes for the category and the section, spin boxes for the sizes."""
+
+    def __init__(self, manager, parent=None):
+        super(ComponentDelegate, self).__init__(parent)
+        self.manager = manager
+
+    def createEditor(self, parent, option, index):
+        column = index.column()
+        if column == 1:
+            comboBox = QtGui.QComboBox(parent)
+            comboBox.addItems(index.model().getCategoryNames())
+            return comboBox
+        if column == 3:
+            comboBox = QtGui.QComboBox(parent)
+            comboBox.setEditable(False)
+            comboBox.addItems(SHAPES)
+            return comboBox
+        if column in INT_COLUMNS:
+            spinbox = QtGui.QSpinBox(parent)
+            spinbox.setMinimum(0)
+            spinbox.setMaximum(100000)
+            return spinbox
+        return super(ComponentDelegate, self).createEditor(parent, option, index)
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QtGui.QComboBox):
+            text = index.data(QtCore.Qt.EditRole)
+            editor.setCurrentIndex(editor.findText(text, QtCore.Qt.MatchFixedString))
+        else:
+            super(ComponentDelegate, self).setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QtGui.QComboBox):
+            text = editor.currentText()
+            if index.column() == 1 and text == ADD_CATEGORY:
+                text = self.manager.addCategory()
+                if text is None:
+                    return
+            model.setData(index, text, QtCore.Qt.EditRole)
+        else:
+            super(ComponentDelegate, self).setModelData(editor, model, index)
+
+
 class ComponentManager(QtGui.QDialog):
     def __init__(self, parent=None):
         super(ComponentManager, self).__init__()
@@ -42,11 +449,17 @@ class ComponentManager(QtGui.QDialog):
 
         self.dbCreateButton = self.form.findChild(QtGui.QPushButton, "pushButton_createDB")
         self.dbCreateButton.clicked.connect(self.createNewDatabase)
-        
-        self.componentTable =  self.form.findChild(QtGui.QTableWidget, "tableWidget")
-        self.componentTable.itemChanged.connect(self.updateDB)
-        self.componentTable.itemDoubleClicked.connect(self.doubleClick)
-        self.componentTable.cellClicked.connect(self.cellSimpleClick)
+
+        self.filterEdit = self.form.findChild(QtGui.QLineEdit, "lineEdit_filter")
+        self.filterEdit.textChanged.connect(self.setFilter)
+
+        self.componentTable =  self.form.findChild(QtGui.QTableView, "tableWidget")
+        self.componentTable.setItemDelegate(ComponentDelegate(self, self.componentTable))
+        self.componentTable.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
+        self.componentTable.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+        self.componentTable.doubleClicked.connect(self.doubleClick)
+        self.model = None
+        self.session = None
 
         self.addButton = self.form.findChild(QtGui.QPushButton, "pushButtonAdd")
         self.addButton.clicked.connect(self.addComponent)
@@ -57,6 +470,9 @@ class ComponentManager(QtGui.QDialog):
         self.delButton = self.form.findChild(QtGui.QPushButton, "pushButtonDel")
         self.delButton.clicked.connect(self.deleteComponent)
 
+        self.importButton = self.form.findChild(QtGui.QPushButton, "pushButtonImport")
+        self.importButton.clicked.connect(self.importComponents)
+
         self.cancelButton = self.form.findChild(QtGui.QPushButton, "pushButtonRej")
         self.cancelButton.clicked.connect(self.cancelAndClose)
 
@@ -64,8 +480,6 @@ class ComponentManager(QtGui.QDialog):
         self.validateButton.clicked.connect(self.acceptAndClose)
         print_debug("end setupUi")
 
-        self.lastEditItem = {"row" : None, "column" : None, "value" : None}
-
         self.init_pop()
         self.form.show()
         print_debug("show dialog")
@@ -83,23 +497,79 @@ class ComponentManager(QtGui.QDialog):
                 "Veuillez définir le chemin de la base de donnée de composants en cliquant sur le bouton Choisir ou Créer dans le gestionnaire de composant.")
         else:
             self.database_path_edit.setText(self.dbPath)
-            if self.componentTable.rowCount() > 0:
-                for row in reversed(range(self.componentTable.rowCount())):
-                    self.componentTable.removeRow(row)
 
             self.con = g3d_connect_db.sql_connection()
-            g3d_connect_db.make_backup()
+            backup = g3d_backup.make_backup(self.dbPath)
             self.cur = self.con.cursor()
             print_debug("connecting db")
 
-            self.populate()
+            self.session = EditSession(
+                self.con, g3d_connect_db.invalidateCatalog, backup,
+                self.flushFailed, self.form)
+            self.model = ComponentTableModel(self.con, self.session, self.componentTable)
+            self.model.filter_text = self.filterEdit.text().strip()
+            # setSortingEnabled sorts the model, which reads its first page
+            self.componentTable.setSortingEnabled(False)
+            self.componentTable.setModel(self.model)
+            self.componentTable.setSortingEnabled(True)
             print_debug("populate table")
 
 
     def closeEvent(self, event):
         print_debug(["closeEvent", event])
-        self.con.close()
-        
+        self.commit()
+        g3d_connect_db.close_connection()
+
+    def commit(self):
+        """
+        Commit pending changes and let the component catalog reload them.
+        :return:
+        """
+        if self.session is not None:
+            self.session.flush()
+
+    def flushFailed(self, error):
+        """
+        The queued changes could not be written : show the table as it is
+        in the database again and tell the user.
+        :param error: sqlite3.Error
+        """
+        if self.model is not None:
+            self.model.refresh()
+        QtGui.QMessageBox.warning(
+            None,
+            "Échec de l'enregistrement",
+            "Les dernières modifications n'ont pas pu être enregistrées ({}).\n"
+            "Le tableau affiche de nouveau le contenu de la base de données.".format(error))
+
+    def populate(self):
+        if self.model is not None:
+            self.model.refresh()
+        print_debug("populate done")
+
+    def setFilter(self, text):
+        if self.model is not None:
+            self.model.setFilter(text)
+
+    def getSelectedIds(self):
+        """
+        Return the CO_COMPTEUR of the selected rows, in table order.
+        """
+        if self.model is None:
+            return []
+        rows = set(index.row() for index in self.componentTable.selectionModel().selectedRows())
+        if len(rows) == 0:
+            row = self.componentTable.currentIndex().row()
+            if row > -1:
+                rows.add(row)
+        return [self.model.getId(row) for row in sorted(rows)]
+
+    def selectComponent(self, co_compteur):
+        row = self.model.findRow(co_compteur)
+        if row > -1:
+            index = self.model.index(row, 0)
+            self.componentTable.scrollTo(index)
+            self.componentTable.selectRow(row)
 
     def addComponent(self, data=None):
         """
@@ -107,46 +577,32 @@ class ComponentManager(QtGui.QDialog):
         :param data: tuple
         :return:
         """
-        self.componentTable.setSortingEnabled(False)
-        # FIXME: Check max id or read only
-        count = self.componentTable.rowCount()
         if data is False:
             data = ("Désignation",1,0,100,20,"R","170,170,127",0)
-        print(data)
-        print(type(data))
-        for x in data:
-            print(x, type(x))
+        print_debug(["addComponent", data])
         sql = '''INSERT INTO Composant(CO_NOM, CO_FAMILLE, CO_LONGUEUR, CO_LARGEUR, CO_EPAISSEUR, CO_FORME, CO_COULEUR, CO_MASSE)
                       VALUES(?,?,?,?,?,?,?,?)'''
-        self.cur.execute(sql, data)
-        self.con.commit()
-        self.componentTable.insertRow(count)
+        co_compteur = self.session.execute(sql, data).lastrowid
         self.populate()
-        self.componentTable.scrollToBottom()
+        self.selectComponent(co_compteur)
 
     def duplicateComponent(self):
         """
-        Delete a component row by co_compteur
+        Duplicate the selected component rows by co_compteur
         :return:
         """
-        row = self.componentTable.currentRow()
-        if row > -1:
-            co_compteur = self.componentTable.item(row,0).text()
-            self.cur.execute("SELECT * FROM Composant WHERE CO_COMPTEUR = {}".format(co_compteur))
-            data = self.cur.fetchall()
-            data = data[0]
-            # ['1', 'Composant', '1', '0', '100', '22', 'R', '203,193,124', '350']
-            des = data[1]
-            cat = data[2]
-            length = data[3]
-            width = data[4]
-            height = data[5]
-            section = data[6]
-            color = data[7]
-            mass = data[8]
-
-            data = (des, cat, length, width, height, section, color, mass)
-            self.addComponent(data)
+        ids = self.getSelectedIds()
+        if len(ids) > 0:
+            # The copies are made from the rows as edited
+            self.session.flush()
+            fields = "CO_NOM, CO_FAMILLE, CO_LONGUEUR, CO_LARGEUR, CO_EPAISSEUR, CO_FORME, CO_COULEUR, CO_MASSE"
+            sql = "INSERT INTO Composant({0}) SELECT {0} FROM Composant WHERE CO_COMPTEUR = ?".format(fields)
+            self.session.executemany(sql, [(co_compteur,) for co_compteur in ids])
+            # executemany does not set lastrowid, select the last copy
+            self.cur.execute("SELECT MAX(CO_COMPTEUR) FROM Composant")
+            co_compteur = self.cur.fetchone()[0]
+            self.populate()
+            self.selectComponent(co_compteur)
         else:
             print_debug("Select a component in the table first!")
             QtGui.QMessageBox.warning(None,"Pas de composant sélectionné.","Veuillez sélectionner un composant dans le tableau avant de cliquer sur Dupliquer.")
@@ -154,34 +610,84 @@ class ComponentManager(QtGui.QDialog):
 
     def deleteComponent(self):
         """
-        Delete a component row by co_compteur
+        Delete the selected component rows by co_compteur
         :return:
         """
-        row = self.componentTable.currentRow()
-        if row > -1:
-            co_compteur = int(self.componentTable.item(row,0).text())
-            sql = 'DELETE FROM Composant WHERE co_compteur=?'
-            self.cur.execute(sql, (co_compteur,))
-            self.con.commit()
-            self.populate()
+        ids = self.getSelectedIds()
+        if len(ids) > 0:
+            self.model.removeIds(ids)
         else:
             print_debug("Select a component in the table first!")
             QtGui.QMessageBox.warning(None,"Pas de composant sélectionné.","Veuillez sélectionner un composant dans le tableau avant de cliquer sur Supprimer.")
 
+    def importComponents(self):
+        """
+        Import the components of a supplier CSV or of a profiles file.
+        :return: ImportReport or None when cancelled
+        """
+        if self.session is None:
+            return None
+        fileName = QtGui.QFileDialog.getOpenFileName(None,
+            "Importer des composants",
+            os.path.dirname(self.dbPath),
+            "Fichier CSV (*.csv *.txt);;All files (*)")
+        if not fileName[0]:
+            return None
+        categories = list(self.model.categories.values())
+        (categorie, ok) = QtGui.QInputDialog.getItem(None,
+            "Importer des composants",
+            "Catégorie des lignes sans catégorie :",
+            ["(aucune)"] + categories, 0, False)
+        if not ok:
+            return None
+        if categorie == "(aucune)":
+            categorie = None
+        # The importer commits by chunks, the pending edits go first
+        self.session.flush()
+        self.session.beforeWrite()
+        QtGui.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            report = g3d_importer.importCatalog(
+                fileName[0], categorie=categorie, con=self.con,
+                progress=lambda line: QtGui.QApplication.processEvents())
+        except (sqlite3.Error, IOError, UnicodeDecodeError) as error:
+            QtGui.QApplication.restoreOverrideCursor()
+            QtGui.QMessageBox.warning(None, "Import interrompu",
+                "L'import s'est arrêté : {}\nIl reprendra à la dernière étape enregistrée si vous importez à nouveau ce fichier.".format(error))
+            self.model.loadCategories()
+            self.populate()
+            return None
+        QtGui.QApplication.restoreOverrideCursor()
+        self.model.loadCategories()
+        self.populate()
+        QtGui.QMessageBox.information(None, "Import terminé", report.summary())
+        return report
+
     def cancelAndClose(self):
         """
         Cancel all operations previously done and close window...or not.
-        FIX ME : Make a backup of the db
+        The snapshot taken when the manager opened is restored in the
+        background, only if it was written and the session changed anything.
         :return:
         """
-        g3d_connect_db.restore_backup()
+        if self.session is not None:
+            self.session.rollback()
+            backup = self.session.backup
+            if backup is not None and self.session.written:
+                backup.wait()
+                if backup.ok:
+                    g3d_backup.restore_backup(
+                        backup.source, backup.target,
+                        on_done=lambda job: g3d_connect_db.invalidateCatalog())
+        g3d_connect_db.invalidateCatalog()
         if self.con:
-            self.con.close()
+            g3d_connect_db.close_connection()
         self.form.close()
         print_debug("cancelAndClose done")
 
     def acceptAndClose(self):
-        self.con.close()
+        self.commit()
+        g3d_connect_db.close_connection()
         self.form.close()
         print_debug("acceptAndClose done")
 
@@ -197,13 +703,15 @@ class ComponentManager(QtGui.QDialog):
             None,)
         if len(dbPath) > 0:
             if not self.con is None:
-                self.con.close()
+                self.commit()
+                g3d_connect_db.close_connection()
             dbPath = os.path.join(dbPath, "g3d_component.sqdb")
             self.database_path_edit.setText(dbPath)
             self.dbPath = self.p.SetString("sqlitedb", dbPath)
             print_debug("new db path is : {}".format(self.dbPath))
             sqliteCon = g3d_connect_db.sql_connection()
             g3d_connect_db.create_new_db(sqliteCon)
+            g3d_connect_db.invalidateCatalog()
             self.init_pop()
         else:
             print_debug("user cancel creating a new db")
@@ -219,316 +727,45 @@ class ComponentManager(QtGui.QDialog):
             "sqlite file (*.sqdb);;All files (*)")
         if len(dbPath[0]) > 0:
             if not self.con is None:
-                self.con.close()
+                self.commit()
+                g3d_connect_db.close_connection()
             self.database_path_edit.setText(dbPath[0])
             self.dbPath = self.p.SetString("sqlitedb", dbPath[0])
             self.init_pop()
 
-    def populate(self):
-        self.componentTable.blockSignals(True)
-        self.cur.execute("SELECT * FROM Famille_Composant")
-        cat_list = self.cur.fetchall()
-        if len(cat_list) > 0:
-            self.cat_name_list = [x[1] for x in cat_list]
-        else:
-            self.cat_name_list = []
-        self.cat_name_list.append("Ajouter...")
-        self.cur.execute("SELECT * FROM Composant")
-        data = self.cur.fetchall()
-        count = len(data)
-        self.componentTable.setRowCount(count)
-        for i, item in enumerate(data):
-            index_item = QtGui.QTableWidgetItem()
-            index_item.setData(QtCore.Qt.EditRole, int(item[0]))
-            index_item.setFlags(QtCore.Qt.ItemIsEnabled)
-            self.componentTable.setItem(i, 0, index_item)
-            
-            # Categorie
-            if len(cat_list) > 0 :
-                cat_des = cat_list[int(item[2])-1][1]
-            else:
-                cat_des = "Ajouter..."
-            cat = QtGui.QTableWidgetItem(str(cat_des))
-            self.componentTable.setItem(i, 1, cat)
-            
-            # Component name
-            name = QtGui.QTableWidgetItem(str(item[1]))
-            self.componentTable.setItem(i, 2, name)
-
-            # Shape
-            shape = QtGui.QTableWidgetItem(str(item[6]))
-            self.componentTable.setItem(i, 3, shape)
-            
-            # Width
-            width = QtGui.QTableWidgetItem()
-            width.setData(QtCore.Qt.EditRole, int(item[4]))
-            self.componentTable.setItem(i, 4, width)
-
-            # Height
-            height = QtGui.QTableWidgetItem()
-            height.setData(QtCore.Qt.EditRole, int(item[5]))
-            self.componentTable.setItem(i, 5, height)
-
-            # Length
-            length = QtGui.QTableWidgetItem()
-            length.setData(QtCore.Qt.EditRole, int(item[3]))
-            self.componentTable.setItem(i, 6, length)
-
-            # Color
-            color = [int(x) for x in item[7].split(',')]
-            self.componentTable.setItem(i, 7, QtGui.QTableWidgetItem())
-            if len(color) == 3:
-                self.componentTable.item(i, 7).setBackground(QtGui.QColor(color[0], color[1], color[2],))
-            else:
-                self.componentTable.item(i, 7).setBackground(QtGui.QColor(0, 0, 0,))
-            self.componentTable.item(i, 7).setFlags(QtCore.Qt.ItemIsEnabled)
-            
-            # Mass volumique
-            massvol = QtGui.QTableWidgetItem(str(item[8]))
-            self.componentTable.setItem(i, 8, massvol)
-            
-            # CAO
-            cao_file = QtGui.QTableWidgetItem(str(item[9]))
-            self.componentTable.setItem(i, 9, cao_file)
-        
-        self.componentTable.blockSignals(False)
-        print_debug("populate done")
-
-    def cellSimpleClick(self, row, col):
-        print_debug("Cell simple clicked : row {} column {} value {}".format(row, col,self.componentTable.item(row,col).text()))
-        if self.lastEditItem["row"] != None:
-            if row != self.lastEditItem["row"] or col != self.lastEditItem["column"]:
-                print_debug("Click outside edited cell")
-                self.componentTable.removeCellWidget(self.lastEditItem["row"], self.lastEditItem["column"])
-                self.componentTable.setSortingEnabled(True)
-        self.lastEditItem["row"] = row
-        self.lastEditItem["column"] = col
-        self.lastEditItem["value"] = self.componentTable.item(row,col).text()
-    
-    def doubleClick(self, itm):
-        row = int(itm.row())
-        column = int(itm.column())
-        oldvalue = itm.text()
-        print_debug("Double Click : enter edit mode cell row {} column {} with value : {}".format(row, column, oldvalue))
-        self.lastEditItem["row"] = row
-        self.lastEditItem["column"] = column
-        self.lastEditItem["value"] = oldvalue
-        self.componentTable.setSortingEnabled(False)
-        if column == 1: # Category
-            self.componentTable.blockSignals(True)
-            cat_des = oldvalue
-            comboBox = QtGui.QComboBox()
-            comboBox.addItems(self.cat_name_list)
-            index = comboBox.findText(cat_des, QtCore.Qt.MatchFixedString)
-            comboBox.setCurrentIndex(index)
-            comboBox.setProperty('row', row)
-            comboBox.setProperty('column', column)
-            self.componentTable.blockSignals(False)
-            comboBox.activated.connect(self.Combo_indexchanged)
-            self.componentTable.setCellWidget(row, column, comboBox)
-        elif column == 3: # Section Shape
-            self.componentTable.blockSignals(True)
-            shape_type_name = oldvalue
-            shape_type = QtGui.QTableWidgetItem(str(shape_type_name))
-            self.componentTable.setItem(row, column, shape_type)
-            comboBox = QtGui.QComboBox()
-            comboBox.setEditable(False)
-            comboBox.addItems(['R', 'C', 'T'])
-            index = comboBox.findText(shape_type_name, QtCore.Qt.MatchFixedString)
-            comboBox.setCurrentIndex(index)
-            comboBox.setProperty('row', row)
-            comboBox.setProperty('column', column)
-            self.componentTable.blockSignals(False)
-            comboBox.currentIndexChanged.connect(self.Combo_indexchanged)
-            self.componentTable.setCellWidget(row, column, comboBox)
-        elif column == 4 or column == 5 or column == 6: # WIDTH or HEIGHT or LENGTH
-            self.componentTable.blockSignals(True)
-            value = oldvalue
-            self.componentTable.removeCellWidget(row, column)
-            spinbox = QtGui.QSpinBox()
-            spinbox.setProperty('row', row)
-            spinbox.setProperty('column', column)
-            spinbox.setMinimum(0)
-            spinbox.setMaximum(100000)
-            spinbox.setValue(int(value))
-            spinbox.valueChanged.connect(self.SpinBox_valuechanged)
-            self.componentTable.blockSignals(False)
-            self.componentTable.setCellWidget(row, column, spinbox)
-        elif column == 7:
-            print_debug(["checkState",itm.isSelected()])
-            couleur = QtGui.QColorDialog.getColor()
+    def addCategory(self):
+        """
+        Ask the name and the type of a new category and add it.
+        :return: str, name of the category or None when cancelled
+        """
+        (fc_nom, bool_cat) = QtGui.QInputDialog.getText(None,"Categorie", "Nom de la nouvelle catégorie :")
+        if not bool_cat:
+            return None
+        (fc_type, bool_type) =  QtGui.QInputDialog.getItem(None,"Categorie", "Choisir BO pour des composants de type Bois Massif, choisir PX pour les composants de type Panneaux, choisir QU pour les composants de type Quincaillerie.", ["BO","PX","QU"])
+        if not bool_type:
+            return None
+        data = (fc_nom,fc_type)
+        sql = ''' INSERT INTO Famille_Composant(FC_NOM, FC_TYPE)
+                  VALUES(?,?)'''
+        self.session.execute(sql, data)
+        self.commit()
+        self.model.loadCategories()
+        return fc_nom
+
+    def doubleClick(self, index):
+        column = index.column()
+        print_debug("Double Click : row {} column {}".format(index.row(), column))
+        if column == COLOR_COLUMN:
+            couleur = QtGui.QColorDialog.getColor(index.data(QtCore.Qt.BackgroundRole))
             if couleur.isValid():
-                red   = int(str(couleur.name()[1:3]),16)    # decode hexadecimal to int()
-                green = int(str(couleur.name()[3:5]),16)    # decode hexadecimal to int()
-                blue  = int(str(couleur.name()[5:7]),16)    # decode hexadecimal to int()
-                self.componentTable.item(row, column).setBackground(QtGui.QColor(red, green, blue,))
-        elif column == 8: # Mass Vol
-            self.componentTable.blockSignals(True)
-            value = oldvalue
-            self.componentTable.removeCellWidget(row, column)
-            spinbox = QtGui.QSpinBox()
-            spinbox.setProperty('row', row)
-            spinbox.setProperty('column', column)
-            spinbox.setMinimum(0)
-            spinbox.setMaximum(100000)
-            spinbox.setValue(int(value))
-            spinbox.valueChanged.connect(self.SpinBox_valuechanged)
-            self.componentTable.blockSignals(False)
-            self.componentTable.setCellWidget(row, column, spinbox)
-        elif column == 9: # CAO
+                value = "{},{},{}".format(couleur.red(), couleur.green(), couleur.blue())
+                self.model.setData(index, value, QtCore.Qt.EditRole)
+        elif column == CAD_COLUMN:
             fileName = QtGui.QFileDialog.getOpenFileName(self,
                 "Choisir composant", self.cao_path, "Fichier CAO (*.igs *.iges *.stp *.step)")
-            if fileName:
-                itm.setText(os.path.relpath(fileName[0], self.cao_path))
-
-
-    @QtCore.Slot()
-    def Combo_indexchanged_old(self, idx):
-        combo = self.sender()
-        row = combo.property('row')
-        column = combo.property('column')
-        index = combo.currentIndex()
-        print_debug('Index Changed : combo row %d column %d indexChanged to %d' % (row, column, index))
-        if column == 1: # CATEGORY
-            text = combo.currentText()
-            if text != "Ajouter...":
-                cat = QtGui.QTableWidgetItem(text)
-                self.componentTable.removeCellWidget(row,column)
-                self.componentTable.setItem(row, column, cat)
-            else:
-                (fc_nom, bool_cat) = QtGui.QInputDialog.getText(None,"Categorie", "Nom de la nouvelle catégorie :")
-                if bool_cat:
-                    (fc_type, bool_type) =  QtGui.QInputDialog.getItem(None,"Categorie", "Choisir BO pour des composants de type Bois Massif, choisir PX pour les composants de type Panneaux, choisir QU pour les composants de type Quincaillerie.", ["BO","PX","QU"])
-                    if bool_type:
-                        self.cat_name_list.insert(-1, fc_nom)
-                        data = (index+1,fc_nom,fc_type)
-                        sql = ''' INSERT INTO Famille_Composant(FC_COMPTEUR, FC_NOM, FC_TYPE)
-                                  VALUES(?,?,?)'''
-                        self.cur.execute(sql, data)
-                        self.con.commit()
-                        self.componentTable.removeCellWidget(row,column)
-                        cat = QtGui.QTableWidgetItem(fc_nom)
-                        self.componentTable.setItem(row, column, cat)
-        elif column == 3: #Shape type
-            text = combo.currentText()
-            self.componentTable.removeCellWidget(row,column)
-            shape_type = QtGui.QTableWidgetItem(text)
-            self.componentTable.setItem(row, column, shape_type)
-
-    @QtCore.Slot()
-    def Combo_indexchanged(self, idx):
-        combo = self.sender()
-        row = combo.property('row')
-        column = combo.property('column')
-        index = combo.currentIndex()
-        print_debug('Index Changed : combo row %d column %d indexChanged to %d' % (row, column, index))
-        if column == 1: # CATEGORY
-            text = combo.currentText()
-            if text != "Ajouter...":
-                cat = QtGui.QTableWidgetItem(text)
-                self.componentTable.removeCellWidget(row,column)
-                self.componentTable.setItem(row, column, cat)
-            else:
-                (fc_nom, bool_cat) = QtGui.QInputDialog.getText(None,"Categorie", "Nom de la nouvelle catégorie :")
-                if bool_cat:
-                    (fc_type, bool_type) =  QtGui.QInputDialog.getItem(None,"Categorie", "Choisir BO pour des composants de type Bois Massif, choisir PX pour les composants de type Panneaux, choisir QU pour les composnats de type Quincaillerie.", ["BO","PX","QU"])
-                    if bool_type:
-                        self.cat_name_list.insert(-1, fc_nom)
-                        #data = (index+1,fc_nom,fc_type)
-                        data = (fc_nom,fc_type)
-                        sql = ''' INSERT INTO Famille_Composant(FC_NOM, FC_TYPE)
-                                  VALUES(?,?)'''
-                        self.cur.execute(sql, data)
-                        self.con.commit()
-                        self.componentTable.removeCellWidget(row,column)
-                        cat = QtGui.QTableWidgetItem(fc_nom)
-                        self.componentTable.setItem(row, column, cat)
-        elif column == 3: #Shape type
-            text = combo.currentText()
-            self.componentTable.removeCellWidget(row,column)
-            shape_type = QtGui.QTableWidgetItem(text)
-            self.componentTable.setItem(row, column, shape_type)
-
-    @QtCore.Slot()
-    def categoryCB_textChanged(self, txt):
-        pass
-                
-    @QtCore.Slot()
-    def SpinBox_valuechanged(self, value):
-        spinbox = self.sender()
-        row = spinbox.property('row')
-        column = spinbox.property('column')
-        print_debug('Spinbox value changed : row %d column %d value changed to %d' % (row, column, value))
-        itm = QtGui.QTableWidgetItem()
-        itm.setData(QtCore.Qt.EditRole, value)
-        self.componentTable.setItem(row, column, itm)
-        
-
-    def updateDB(self, itmWid):
-        row = int(itmWid.row())
-        column = int(itmWid.column())
-        co_compteur = int(self.componentTable.item(row,0).text())
-        value = str(itmWid.text())
-        cell = "row " + str(itmWid.row()) + " | col " + str(itmWid.column())
-        print_debug("Updating Cell : {}, with value : {}".format(cell, value))
-        self.componentTable.setSortingEnabled(True)
-
-        if column == 1:
-            value = self.cat_name_list.index(value) + 1
-            sql = ''' UPDATE Composant
-                      SET CO_FAMILLE = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 2:
-            sql = ''' UPDATE Composant
-                      SET CO_NOM = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 3:
-            sql = ''' UPDATE Composant
-                      SET CO_FORME = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 4:
-            sql = ''' UPDATE Composant
-                      SET CO_LARGEUR = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 5:
-            sql = ''' UPDATE Composant
-                      SET CO_EPAISSEUR = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 6:
-            sql = ''' UPDATE Composant
-                      SET CO_LONGUEUR = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 7:
-            value = ""
-            comma = 0
-            for c in itmWid.backgroundColor().getRgb()[0:3]:
-                value += str(c)
-                if comma < 2:
-                    value += ","
-                    comma += 1
-            sql = ''' UPDATE Composant
-                      SET CO_COULEUR = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 8:
-            sql = ''' UPDATE Composant
-                      SET CO_MASSE = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        if column == 9:
-            sql = ''' UPDATE Composant
-                      SET CO_FICHIER_CAD = ?
-                      WHERE CO_COMPTEUR = ?'''
-
-        self.cur.execute(sql, (value, co_compteur))
-        self.con.commit()
-
+            if fileName[0]:
+                value = os.path.relpath(fileName[0], self.cao_path)
+                self.model.setData(index, value, QtCore.Qt.EditRole)
 
 
 class G3D_ComponentsManager:
@@ -1,15 +1,18 @@
 # coding: utf-8
 
 import os
+import pathlib
+import re
 import sqlite3
+import threading
+import time
 from sqlite3 import Error
 
 import FreeCAD as App
 from freecad.workbench_gespal3d import (DEBUG_DB,
                                         PARAMPATH,
                                         BDDPATH,
-                                        print_debug,
-                                        g3d_component_manager)
+                                        print_debug)
 
 
 __title__ = "Gespal3D Connect DB"
@@ -18,58 +21,6 @@ __author__ = "Jonathan Wiedemann"
 __url__ = "https://freecad-france.com"
 
 
-def progress(status, remaining, total):
-    print(f'Copied {total - remaining} of {total} pages...')
-
-def make_backup():
-    params = App.ParamGet(str(PARAMPATH))
-    og_path = params.GetString("sqlitedb")
-    print("og_path : {}".format(og_path))
-    if og_path != '':
-        head_path = os.path.split(og_path)[0]
-        backup_path = os.path.join(head_path, 'Sqlite_backup.sqdb')
-        try:
-            # existing DB
-            sqliteCon = sqlite3.connect(og_path)
-            # copy into this DB
-            backupCon = sqlite3.connect(backup_path)
-            with backupCon:
-                sqliteCon.backup(backupCon, pages=3, progress=progress)
-            print("backup successful")
-        except sqlite3.Error as error:
-            print("Error while taking backup: ", error)
-        finally:
-            if backupCon:
-                backupCon.close()
-                sqliteCon.close()
-        return
-    else:
-        return
-
-def restore_backup():
-    params = App.ParamGet(str(PARAMPATH))
-    og_path = params.GetString("sqlitedb")
-    if og_path != '':
-        head_path = os.path.split(og_path)[0]
-        backup_path = os.path.join(head_path, 'Sqlite_backup.sqdb')
-        try:
-            # existing DB
-            sqliteCon = sqlite3.connect(backup_path)
-            # copy into this DB
-            backupCon = sqlite3.connect(og_path)
-            with backupCon:
-                sqliteCon.backup(backupCon, pages=3, progress=progress)
-            print("backup successful")
-        except sqlite3.Error as error:
-            print("Error while taking backup: ", error)
-        finally:
-            if backupCon:
-                backupCon.close()
-                sqliteCon.close()
-        return
-    else:
-        return
-
 def create_new_db(sqliteCon):
     #con = sqlite3.connect('SQLite_Python.db')
     cursorObj = sqliteCon.cursor()
@@ -94,44 +45,573 @@ def create_new_db(sqliteCon):
                         CO_EPAISSEUR INTEGER,
                         CO_FORME VARCHAR(1),
                         CO_COULEUR VARCHAR(11),
-                        CO_MASSE INTEGER),
-                        CO_FICHIER_CAD VARCHAR(255);''')
+                        CO_MASSE INTEGER,
+                        CO_FICHIER_CAD VARCHAR(255));''')
     sqliteCon.commit()
-    sqliteCon.close()
+    checkDBintegrity(sqliteCon)
 
-def sql_connection():
+# Process-wide connection pool : one long-lived connection per database path.
+_connections = {}
+# Read-only connections used to browse the catalog, by database path.
+_read_connections = {}
+# Database path -> modification time of the file when the integrity check last ran.
+_checked_mtimes = {}
+# Number of sqlite3.connect() calls done during this session.
+_connect_count = 0
+# Defaults of the DatabaseWAL and DatabaseBusyTimeout (ms) parameters.
+DATABASE_WAL = False
+BUSY_TIMEOUT = 5000
+# Attempts and first pause (s) when a statement still finds the database locked.
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+def getDatabasePath():
     params = App.ParamGet(str(PARAMPATH))
     sqlite_db = params.GetString("sqlitedb")
     if sqlite_db == '':
         print_debug(["define database path in BaseApp/Preferences/Mod/Gespal3D"])
         sqlite_db = os.path.join(str(BDDPATH),'component.sqdb')
-        #g3d_component_manager.G3D_ComponentsManager.Activated()
-        #return
+    return sqlite_db
+
+
+def getDatabaseMtime(sqlite_db):
+    """
+    Modification time of the database file, with the time and size of its
+    WAL file since in WAL mode the commits only reach the database file at
+    the next checkpoint.
+    :return: tuple or None when the database does not exist
+    """
     try:
-        con = sqlite3.connect(sqlite_db)
-        checkDBintegrity(con)
+        stat = os.stat(sqlite_db)
+    except OSError:
+        return None
+    try:
+        wal = os.stat(sqlite_db + "-wal")
+    except OSError:
+        return (stat.st_mtime_ns,)
+    return (stat.st_mtime_ns, wal.st_mtime_ns, wal.st_size)
+
+
+def isLockedError(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retryLocked(func, *args):
+    """
+    Call func, and again after a growing pause while the database stays
+    locked by another process beyond the busy timeout.
+    :param func: callable running a statement or a commit
+    :return: the result of func
+    """
+    delay = RETRY_DELAY
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as error:
+            if not isLockedError(error) or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            print_debug(["database locked, retrying", error])
+            time.sleep(delay)
+            delay *= 2
+
+
+def connectDatabase(sqlite_db, read_only=False, check_same_thread=True):
+    """
+    Open a connection waiting DatabaseBusyTimeout ms for the locks of the
+    other processes. With the DatabaseWAL parameter the database is switched
+    to the WAL journal, so that readers no longer wait for the writers. WAL
+    needs every process on the same computer, it must stay off for a
+    database on a network share.
+    :param sqlite_db: str
+    :param read_only: bool
+    :param check_same_thread: bool, False for a connection used by another
+                              thread than the one opening it
+    :return: sqlite3.Connection
+    """
+    params = App.ParamGet(str(PARAMPATH))
+    timeout = params.GetInt("DatabaseBusyTimeout", BUSY_TIMEOUT) / 1000.0
+    if read_only:
+        uri = pathlib.Path(os.path.abspath(sqlite_db)).as_uri() + "?mode=ro"
+        return sqlite3.connect(
+            uri, timeout=timeout, uri=True, check_same_thread=check_same_thread)
+    con = sqlite3.connect(sqlite_db, timeout=timeout)
+    if params.GetBool("DatabaseWAL", DATABASE_WAL):
+        mode = retryLocked(con.execute, "PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode.lower() == "wal":
+            con.execute("PRAGMA synchronous=NORMAL")
+        else:
+            print_debug(["WAL journal not available, journal mode is", mode])
+    return con
+
+
+def sql_connection():
+    """
+    Return the pooled connection to the components database.
+    The connection is opened on first use and reused afterwards, the integrity
+    check only runs again when the database file has been modified.
+    :return: sqlite3.Connection or None
+    """
+    global _connect_count
+    sqlite_db = getDatabasePath()
+    con = _connections.get(sqlite_db)
+    if con is None:
+        try:
+            con = connectDatabase(sqlite_db)
+        except Error as error:
+            print_debug(["sql_connection got an error", error])
+            return None
+        _connections[sqlite_db] = con
+        _connect_count += 1
         if DEBUG_DB:
-            print_debug(["DB Connection is established."])
-    except Error:
-        print_debug(["sql_connection got an error", Error])
+            print_debug(["DB Connection is established.", sqlite_db])
+
+    mtime = getDatabaseMtime(sqlite_db)
+    if _checked_mtimes.get(sqlite_db) != mtime:
+        try:
+            checkDBintegrity(con)
+        except Error as error:
+            print_debug(["checkDBintegrity got an error", error])
+        # the check may have altered the file
+        _checked_mtimes[sqlite_db] = getDatabaseMtime(sqlite_db)
+
+    return con
+
 
+def sql_read_connection():
+    """
+    Return the pooled read-only connection used to browse the catalog. The
+    read-write connection is opened first, so the file exists and its
+    integrity check has run.
+    :return: sqlite3.Connection or None
+    """
+    global _connect_count
+    if sql_connection() is None:
+        return None
+    sqlite_db = getDatabasePath()
+    con = _read_connections.get(sqlite_db)
+    if con is None:
+        try:
+            con = connectDatabase(sqlite_db, read_only=True)
+        except Error as error:
+            print_debug(["sql_read_connection got an error", error])
+            return None
+        _read_connections[sqlite_db] = con
+        _connect_count += 1
     return con
 
 
+def close_connection(sqlite_db=None):
+    """
+    Close the pooled connections of the given database (current one by default).
+    """
+    if sqlite_db is None:
+        sqlite_db = getDatabasePath()
+    con = _connections.pop(sqlite_db, None)
+    _checked_mtimes.pop(sqlite_db, None)
+    read_con = _read_connections.pop(sqlite_db, None)
+    if read_con is not None:
+        read_con.close()
+    if con is not None:
+        con.close()
+        if DEBUG_DB:
+            print_debug(["DB Connection is closed.", sqlite_db])
+
+
+def close_connections():
+    """
+    Close every pooled connection, called when the workbench is deactivated.
+    """
+    for sqlite_db in set(_connections) | set(_read_connections):
+        close_connection(sqlite_db)
+    _search_index.close()
+
+
+def getConnectCount():
+    """
+    Number of connections opened to a database during this session.
+    """
+    return _connect_count
+
+
+class ComponentCatalog:
+    """
+    In-memory copy of the Famille_Composant and Composant tables.
+    Both tables are read once and indexed by FC_TYPE, CO_FAMILLE and
+    CO_COMPTEUR. They are read again only when the database file changes on
+    disk or when invalidate() is called after an edit.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.mtime = None
+        self.categories = []
+        self.by_type = {}
+        self.by_famille = {}
+        self.by_compteur = {}
+        self.load_count = 0
+
+    def invalidate(self):
+        self.path = None
+        self.mtime = None
+
+    def isStale(self):
+        sqlite_db = getDatabasePath()
+        if sqlite_db != self.path:
+            return True
+        return getDatabaseMtime(sqlite_db) != self.mtime
+
+    def refresh(self):
+        if self.isStale():
+            self.load()
+
+    def load(self):
+        sqlite_db = getDatabasePath()
+        con = sql_read_connection()
+        self.categories = []
+        self.by_type = {}
+        self.by_famille = {}
+        self.by_compteur = {}
+        if con is None:
+            return
+        cursorObj = con.cursor()
+        cursorObj.execute("SELECT * FROM Famille_Composant")
+        self.categories = cursorObj.fetchall()
+        for row in self.categories:
+            self.by_type.setdefault(row[2], []).append(row)
+        cursorObj.execute("SELECT * FROM Composant ORDER BY CO_FAMILLE, CO_NOM")
+        for row in cursorObj.fetchall():
+            self.by_compteur[row[0]] = row
+            self.by_famille.setdefault(row[2], []).append(row)
+        self.path = sqlite_db
+        self.mtime = getDatabaseMtime(sqlite_db)
+        self.load_count += 1
+        if DEBUG_DB:
+            print_debug(["ComponentCatalog loaded :",
+                         "{} categories, {} components".format(
+                             len(self.categories), len(self.by_compteur))])
+
+    def getCategories(self, include=[], exclude=[]):
+        self.refresh()
+        categories_list = []
+        if len(include) == 1:
+            categories_list.extend(self.by_type.get(include[0], []))
+        elif len(include) > 0:
+            for row in self.categories:
+                if row[2] in include:
+                    categories_list.append(row)
+        if len(exclude) > 0:
+            for row in self.categories:
+                if not row[2] in exclude:
+                    categories_list.append(row)
+        return categories_list
+
+    def getComposants(self, categorie):
+        self.refresh()
+        try:
+            categorie = int(categorie)
+        except (TypeError, ValueError):
+            pass
+        return list(self.by_famille.get(categorie, []))
+
+    def getComposant(self, id):
+        self.refresh()
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            pass
+        return self.by_compteur.get(id)
+
+
+_catalog = ComponentCatalog()
+
+
+def getCatalog():
+    return _catalog
+
+
+def invalidateCatalog():
+    """
+    Force the catalog to be read again, called after the components manager
+    commits an edit.
+    """
+    _catalog.invalidate()
+    _search_index.invalidate()
+
+
+# Words of a search which are not looked for in the component names.
+SEARCH_STOPWORDS = ("section", "mm", "longueur", "de", "en")
+SEARCH_SECTION = re.compile(r"^(\d+(?:[.,]\d+)?)[x×*](\d+(?:[.,]\d+)?)$")
+SEARCH_LENGTH = re.compile(r"^l=?(\d+(?:[.,]\d+)?)$")
+SEARCH_TOLERANCE = re.compile(r"^(?:±|\+-|\+/-)(\d+(?:[.,]\d+)?)$")
+
+
+def parseSearchNumber(value):
+    return float(value.replace(",", "."))
+
+
+def parseSearchQuery(text):
+    """
+    Split a search into name words and dimensions.
+    "REC 22x100 L1200 douglas ±1" gives the words ["rec", "douglas"],
+    the section (22, 100), the length 1200 and a tolerance of 1 mm.
+    :param text: str
+    :return: dict with the keys words, section, length and tolerance
+    """
+    query = {"words": [], "section": None, "length": None, "tolerance": 0.0}
+    text = text.lower()
+    for sign in ("+/-", "+-", "±"):
+        text = text.replace(sign, " ± ")
+    text = re.sub(r"±\s+", "±", text)
+    for token in text.split():
+        match = SEARCH_SECTION.match(token)
+        if match:
+            query["section"] = (
+                parseSearchNumber(match.group(1)), parseSearchNumber(match.group(2)))
+            continue
+        match = SEARCH_LENGTH.match(token)
+        if match:
+            query["length"] = parseSearchNumber(match.group(1))
+            continue
+        match = SEARCH_TOLERANCE.match(token)
+        if match:
+            query["tolerance"] = parseSearchNumber(match.group(1))
+            continue
+        if token in SEARCH_STOPWORDS:
+            continue
+        word = re.sub(r"[^\w]", "", token)
+        if word:
+            query["words"].append(word)
+    return query
+
+
+# Above this number of matches, the name index is walked in order rather
+# than sorting all the matches
+SEARCH_WALK_MATCHES = 5000
+
+
+class ComponentSearchIndex:
+    """
+    Full-text index of the component names, an FTS5 table in the temporary
+    schema of a read-only connection of its own. It leaves the database file
+    untouched, so the other programs using it do not need FTS5. It is built
+    in a background thread when the file changes, the names are searched
+    with LIKE until it is ready or when FTS5 is not available.
+    """
+
+    def __init__(self):
+        self.con = None
+        self.path = None
+        self.mtime = None
+        self.fts = None
+        self.build_count = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def invalidate(self):
+        self.mtime = None
+
+    def isReady(self):
+        sqlite_db = getDatabasePath()
+        return self.fts and self.path == sqlite_db \
+            and self.mtime == getDatabaseMtime(sqlite_db)
+
+    def ensure(self):
+        """Start building the index in the background when it is stale."""
+        if self.isReady() or self.fts is False:
+            return
+        if self.thread is not None and self.thread.is_alive():
+            return
+        sqlite_db = getDatabasePath()
+        if not os.path.isfile(sqlite_db):
+            return
+        try:
+            con = connectDatabase(sqlite_db, read_only=True, check_same_thread=False)
+        except Error as error:
+            print_debug(["search index connection got an error", error])
+            return
+        self.thread = threading.Thread(
+            target=self.build, args=(con, sqlite_db),
+            name="Gespal3D search index", daemon=True)
+        self.thread.start()
+
+    def build(self, con, sqlite_db):
+        # The time of the file before reading it, a commit during the build
+        # makes the index stale
+        mtime = getDatabaseMtime(sqlite_db)
+        try:
+            cur = con.cursor()
+            cur.execute(
+                "CREATE VIRTUAL TABLE temp.Composant_fts USING fts5("
+                "CO_NOM, tokenize = 'unicode61 remove_diacritics 1')")
+            cur.execute(
+                "INSERT INTO temp.Composant_fts(rowid, CO_NOM) "
+                "SELECT CO_COMPTEUR, CO_NOM FROM Composant")
+            con.commit()
+        except Error as error:
+            con.close()
+            if "fts5" in str(error):
+                print_debug(["FTS5 is not available, searching with LIKE", error])
+                self.fts = False
+            else:
+                print_debug(["search index got an error", error])
+            return
+        with self.lock:
+            old = self.con
+            self.con = con
+            self.path = sqlite_db
+            self.mtime = mtime
+            self.fts = True
+            self.build_count += 1
+        if old is not None:
+            old.close()
+
+    def close(self):
+        with self.lock:
+            if self.con is not None:
+                self.con.close()
+            self.con = None
+            self.path = None
+            self.mtime = None
+
+    def countMatches(self, con, sql, params):
+        """
+        Number of matches of a query, counting stops at SEARCH_WALK_MATCHES.
+        """
+        cursorObj = con.cursor()
+        cursorObj.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM {} LIMIT ?)".format(sql),
+            params + [SEARCH_WALK_MATCHES])
+        return cursorObj.fetchone()[0]
+
+    def search(self, text, categories=None, limit=20):
+        """
+        Return the first components in name order matching a search, see
+        parseSearchQuery.
+        :param text: str
+        :param categories: list of FC_COMPTEUR to search in, all by default
+        :param limit: int
+        :return: list of Composant rows
+        """
+        query = parseSearchQuery(text)
+        if not query["words"] and query["section"] is None and query["length"] is None:
+            return []
+        self.ensure()
+        if self.isReady():
+            with self.lock:
+                return self.query(self.con, True, query, categories, limit)
+        con = sql_read_connection()
+        if con is None:
+            return []
+        return self.query(con, False, query, categories, limit)
+
+    def query(self, con, fts, query, categories, limit):
+        where = []
+        params = []
+        tolerance = query["tolerance"]
+        if query["section"] is not None or query["length"] is not None:
+            # Literal shapes let sqlite walk IDX_CO_DIMENSIONS one shape at a
+            # time, a sub-query on the shapes would not use the index
+            cursorObj = con.cursor()
+            cursorObj.execute("SELECT DISTINCT CO_FORME FROM Composant")
+            formes = [row[0] for row in cursorObj.fetchall()]
+            if not formes:
+                return []
+            where.append("c.CO_FORME IN ({})".format(", ".join("?" * len(formes))))
+            params.extend(formes)
+        if query["section"] is not None:
+            a, b = query["section"]
+            where.append(
+                "((c.CO_LARGEUR BETWEEN ? AND ? AND c.CO_EPAISSEUR BETWEEN ? AND ?)"
+                " OR (c.CO_LARGEUR BETWEEN ? AND ? AND c.CO_EPAISSEUR BETWEEN ? AND ?))")
+            params.extend([
+                a - tolerance, a + tolerance, b - tolerance, b + tolerance,
+                b - tolerance, b + tolerance, a - tolerance, a + tolerance])
+        if query["length"] is not None:
+            where.append("c.CO_LONGUEUR BETWEEN ? AND ?")
+            params.extend([query["length"] - tolerance, query["length"] + tolerance])
+
+        # Sorting every match costs tens of ms when thousands of components
+        # match, walking IDX_CO_NOM in order then stops at the first ones.
+        # Otherwise the rows are read from the narrowest index : the
+        # full-text one when few names match, else IDX_CO_DIMENSIONS, the
+        # words being then checked with LIKE on these rows only. The
+        # dimensions are counted on their covering index.
+        dimension_count = None
+        if where:
+            dimension_count = self.countMatches(
+                con, "Composant c WHERE " + " AND ".join(where), params)
+        names = None
+        name_count = None
+        if query["words"] and fts and (
+                dimension_count is None or dimension_count >= SEARCH_WALK_MATCHES):
+            # Counting the names is only worth it when the dimensions are broad
+            names = " AND ".join('"{}"*'.format(word) for word in query["words"])
+            name_count = self.countMatches(
+                con, "temp.Composant_fts WHERE Composant_fts MATCH ?", [names])
+        # Names searched with LIKE alone are not counted, they are sorted
+        counts = [n for n in (dimension_count, name_count) if n is not None] or [0]
+        table = "Composant c"
+        if min(counts) >= SEARCH_WALK_MATCHES:
+            table += " INDEXED BY IDX_CO_NOM"
+        elif name_count is not None and name_count == min(counts):
+            # The rowids of the full-text matches are looked up directly
+            table += " NOT INDEXED"
+            where.append(
+                "c.CO_COMPTEUR IN (SELECT rowid FROM temp.Composant_fts"
+                " WHERE Composant_fts MATCH ?)")
+            params.append(names)
+        if "NOT INDEXED" not in table:
+            for word in query["words"]:
+                where.append("c.CO_NOM LIKE ?")
+                params.append("%" + word + "%")
+        if categories is not None:
+            where.append("c.CO_FAMILLE IN ({})".format(", ".join("?" * len(categories))))
+            params.extend(categories)
+        sql = "SELECT c.* FROM {} WHERE {} ORDER BY c.CO_NOM, c.CO_COMPTEUR LIMIT ?".format(
+            table, " AND ".join(where))
+        params.append(limit)
+        return self.fetch(con, sql, params)
+
+    def fetch(self, con, sql, params):
+        cursorObj = con.cursor()
+        try:
+            cursorObj.execute(sql, params)
+        except Error as error:
+            print_debug(["searchComposants got an error", error])
+            return []
+        return cursorObj.fetchall()
+
+
+_search_index = ComponentSearchIndex()
+
+
+def prepareSearch():
+    """
+    Start building the search index in the background rather than on the
+    first search, it takes about a second on a catalog of 100 000 components.
+    """
+    _search_index.ensure()
+
+
+def searchComposants(text, categories=None, limit=20):
+    """
+    Search the components by name words and dimensions, for example
+    "REC 22x100 L1200 douglas" or "section 22x100 ±1 mm".
+    :param text: str
+    :param categories: list of FC_COMPTEUR, all the categories by default
+    :param limit: int
+    :return: list of Composant rows
+    """
+    rows = _search_index.search(text, categories, limit)
+    if DEBUG_DB:
+        print_debug(["g3d_connect_db.searchComposants :", text, len(rows)])
+    return rows
+
+
 def getCategories(include=[], exclude=[]):
-    categories_list = []
-    con = sql_connection()
-    cursorObj = con.cursor()
-    cursorObj.execute("SELECT * FROM Famille_Composant")
-    rows = cursorObj.fetchall()
-    if len(include) > 0:
-        for row in rows:
-            if row[2] in include:
-                categories_list.append(row)
-    if len(exclude) > 0:
-        for row in rows:
-            if not row[2] in exclude:
-                categories_list.append(row)
+    categories_list = _catalog.getCategories(include=include, exclude=exclude)
     if DEBUG_DB:
         messages = ["g3d_connect_db.getCategories :"]
         messages.append(categories_list)
@@ -142,43 +622,59 @@ def getCategories(include=[], exclude=[]):
 
 def getComposants(categorie=None):
     if categorie:
-        con = sql_connection()
-        cursorObj = con.cursor()
-        cursorObj.execute(
-            "SELECT * FROM Composant WHERE CO_FAMILLE = "
-            + str(categorie)
-            + " ORDER BY CO_NOM"
-        )
-        rows = cursorObj.fetchall()
+        rows = _catalog.getComposants(categorie)
         if DEBUG_DB:
             messages = ["", "g3d_connect_db.getComposants :"]
             messages.append(rows)
             messages.append("")
             print_debug(messages)
-        
+
         return rows
 
 
 def getComposant(id=1):
-    con = sql_connection()
-    cursorObj = con.cursor()
-    cursorObj.execute("SELECT * FROM Composant WHERE CO_COMPTEUR = " + str(id))
-    rows = cursorObj.fetchall()
-    if rows:
-        component = rows[0]
-    else:
+    component = _catalog.getComposant(id)
+    if component is None:
         component = ['1', 'Composant', '1', '0', '100', '22', 'R', '203,193,124', '350', None]
     print_debug(["", "g3d_connect_db.getComposant :", component, ""])
-    
+
     return component
-    
+
 
 def checkDBintegrity(con):
     print_debug("Vérification de l'intégrité de la base.")
     cur = con.cursor()
     columns = [i[1] for i in cur.execute('PRAGMA table_info(Composant)')]
 
+    if len(columns) == 0:
+        # empty database, create_new_db will build the tables
+        return
+
     if 'CO_FICHIER_CAD' not in columns:
         print_debug("Création de la colonne CO_FICHIER_CAD")
         cur.execute('ALTER TABLE Composant ADD COLUMN CO_FICHIER_CAD VARCHAR(255)')
-        con.commit()
\ No newline at end of file
+        con.commit()
+
+    indexes = [i[1] for i in cur.execute('PRAGMA index_list(Composant)')]
+
+    if 'IDX_CO_FAMILLE' not in indexes:
+        print_debug("Création de l'index IDX_CO_FAMILLE")
+        cur.execute('CREATE INDEX IDX_CO_FAMILLE ON Composant (CO_FAMILLE)')
+        con.commit()
+
+    if 'IDX_CO_FAMILLE_NOM' not in indexes:
+        print_debug("Création de l'index IDX_CO_FAMILLE_NOM")
+        cur.execute('CREATE INDEX IDX_CO_FAMILLE_NOM ON Composant (CO_FAMILLE, CO_NOM)')
+        con.commit()
+
+    if 'IDX_CO_DIMENSIONS' not in indexes:
+        print_debug("Création de l'index IDX_CO_DIMENSIONS")
+        cur.execute('CREATE INDEX IDX_CO_DIMENSIONS ON Composant '
+                    '(CO_FORME, CO_LARGEUR, CO_EPAISSEUR, CO_LONGUEUR)')
+        con.commit()
+
+    if 'IDX_CO_NOM' not in indexes:
+        print_debug("Création de l'index IDX_CO_NOM")
+        cur.execute('CREATE INDEX IDX_CO_NOM ON Composant (CO_NOM)')
+        con.commit()
+
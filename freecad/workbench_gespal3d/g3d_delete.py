@@ -60,22 +60,26 @@ class _Command_Delete:
 
     def Activated(self):
         delete_list = []
+        sections = []
+        masters = []
         selection = Gui.Selection.getSelection()
         for sel in selection:
             if hasattr(sel, "Tag"):
                 if sel.Tag == "Gespal":
                     if len(sel.OutList) > 0:
-                        if sel.Base:
+                        if getattr(sel, "Base", None):
                             delete = True
                             for obj in sel.Base.InList:
                                 if not obj in selection:
                                     delete = False
                             if delete == True:
                                 delete_list.append(sel.Base)
+                                if hasattr(sel.Base, "Objects"):
+                                    sections.extend([o.Name for o in sel.Base.Objects])
                         if len(sel.Subtractions) > 0:
                             for obj in sel.Subtractions:
                                 delete_list.append(obj)
-                        if len(sel.Additions) > 0:
+                        if len(getattr(sel, "Additions", [])) > 0:
                             for obj in sel.Additions:
                                 delete_list.append(obj)
                         delete_list.append(sel)
@@ -83,6 +87,10 @@ class _Command_Delete:
                         delete_list.append(sel)
             if "Part__Mirroring" in sel.Name:
                 delete_list.append(sel)
+            if sel.TypeId == "App::Link":
+                delete_list.append(sel)
+                if sel.LinkedObject:
+                    masters.append(sel.LinkedObject.Name)
         if len(delete_list) > 0:
             App.ActiveDocument.openTransaction(
                 translate("Gespal3D", "Delete composants")
@@ -91,6 +99,29 @@ class _Command_Delete:
                 Gui.doCommand(
                     "App.ActiveDocument.removeObject('%s')" % obj.Name
                 )
+            # Shared sections no longer used by any beam
+            for name in set(sections):
+                section = App.ActiveDocument.getObject(name)
+                if section is None:
+                    continue
+                if hasattr(section, "SectionKey") and len(section.InList) == 0:
+                    Gui.doCommand(
+                        "App.ActiveDocument.removeObject('%s')" % section.Name
+                    )
+            # Accessory masters no longer used by any link, with their base
+            for name in set(masters):
+                master = App.ActiveDocument.getObject(name)
+                if master is None:
+                    continue
+                if getattr(master, "InstanceMaster", False) and len(master.InList) == 0:
+                    base = getattr(master, "Base", None)
+                    Gui.doCommand(
+                        "App.ActiveDocument.removeObject('%s')" % master.Name
+                    )
+                    if base is not None and len(base.InList) == 0:
+                        Gui.doCommand(
+                            "App.ActiveDocument.removeObject('%s')" % base.Name
+                        )
             App.ActiveDocument.commitTransaction()
 
 
@@ -0,0 +1,484 @@
+# coding: utf-8
+
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+import FreeCAD as App
+from freecad.workbench_gespal3d import (RESOURCESPATH,
+                                        g3d_connect_db,
+                                        print_debug)
+
+
+__title__ = "Gespal3D Catalog importer"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+PRESETSPATH = os.path.join(RESOURCESPATH, "Presets", "profiles.csv")
+# Rows written per executemany and per transaction
+CHUNK_SIZE = 10000
+# Fields written by the importer, CO_COMPTEUR is given by the database
+IMPORT_FIELDS = [
+    "CO_NOM", "CO_FAMILLE", "CO_LONGUEUR", "CO_LARGEUR", "CO_EPAISSEUR",
+    "CO_FORME", "CO_COULEUR", "CO_MASSE", "CO_FICHIER_CAD",
+]
+NUMBER_FIELDS = ("CO_LONGUEUR", "CO_LARGEUR", "CO_EPAISSEUR", "CO_MASSE")
+# Values of the fields missing from the file, as a new row of the manager
+DEFAULT_VALUES = {
+    "CO_LONGUEUR": 0,
+    "CO_FORME": "R",
+    "CO_COULEUR": "170,170,127",
+    "CO_MASSE": 0,
+    "CO_FICHIER_CAD": None,
+}
+SHAPES = ("R", "C", "T")
+# Column headers of the supplier files, without accents, units or case
+COLUMN_ALIASES = {
+    "nom": "CO_NOM",
+    "designation": "CO_NOM",
+    "composant": "CO_NOM",
+    "famille": "CO_FAMILLE",
+    "categorie": "CO_FAMILLE",
+    "longueur": "CO_LONGUEUR",
+    "largeur": "CO_LARGEUR",
+    "epaisseur": "CO_EPAISSEUR",
+    "forme": "CO_FORME",
+    "section": "CO_FORME",
+    "couleur": "CO_COULEUR",
+    "masse": "CO_MASSE",
+    "masse volumique": "CO_MASSE",
+    "cao": "CO_FICHIER_CAD",
+    "fichier cao": "CO_FICHIER_CAD",
+}
+
+
+def readPresets(path=PRESETSPATH):
+    """
+    Read a profiles file, one "category,name,shape,dimensions..." line per
+    profile, in the format of the Arch presets.
+    :param path: str
+    :return: list of [id, category, name, shape, dimension, ...]
+    """
+    presets = []
+    bid = 1
+    try:
+        with open(path, "r", encoding="utf-8") as csvfile:
+            for row in csv.reader(csvfile):
+                if (not row) or row[0].startswith("#"):
+                    continue
+                try:
+                    preset = [bid, row[0], row[1], row[2]]
+                    preset.extend(float(value) for value in row[3:])
+                except (IndexError, ValueError):
+                    print_debug("Skipping bad line: " + str(row))
+                    continue
+                if preset[1:] not in [pre[1:] for pre in presets]:
+                    presets.append(preset)
+                    bid += 1
+    except IOError:
+        print_debug("Could not open " + path)
+    return presets
+
+
+def normalizeHeader(header):
+    header = re.sub(r"\(.*?\)", "", header).strip().lower()
+    header = unicodedata.normalize("NFKD", header)
+    return "".join(c for c in header if not unicodedata.combining(c))
+
+
+def mapColumns(headers, mapping=None):
+    """
+    Return the CO_* field of each column, None for the ignored ones.
+    :param headers: list of str
+    :param mapping: dict header or column index -> CO_* field, overrides the aliases
+    :return: list
+    """
+    fields = []
+    for n, header in enumerate(headers):
+        field = None
+        if mapping is not None:
+            field = mapping.get(header, mapping.get(n))
+        if field is None:
+            if header.strip().upper() in IMPORT_FIELDS:
+                field = header.strip().upper()
+            else:
+                field = COLUMN_ALIASES.get(normalizeHeader(header))
+        fields.append(field)
+    return fields
+
+
+def detectEncoding(path):
+    with open(path, "rb") as f:
+        sample = f.read(65536)
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as error:
+        # A multi-byte character may be cut at the end of the sample
+        if error.start < len(sample) - 4:
+            return "cp1252"
+    return "utf-8-sig"
+
+
+def detectDialect(csvfile):
+    sample = csvfile.read(8192)
+    csvfile.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        return csv.excel
+
+
+def parseNumber(value):
+    value = value.strip().replace(" ", "").replace(",", ".")
+    if value == "":
+        return None
+    number = float(value)
+    if number < 0:
+        raise ValueError("valeur négative")
+    if number.is_integer():
+        return int(number)
+    return number
+
+
+def parseColor(value):
+    rgb = [int(c) for c in value.split(",")]
+    if len(rgb) != 3 or any(c < 0 or c > 255 for c in rgb):
+        raise ValueError("couleur {} invalide".format(value))
+    return ",".join(str(c) for c in rgb)
+
+
+class ImportReport:
+    """Result of an import : counts and rejected lines."""
+
+    def __init__(self, path):
+        self.path = path
+        self.inserted = 0
+        self.updated = 0
+        self.categories = 0
+        self.resumed_at = 0
+        self.rejected = []
+        self.elapsed = 0.0
+        self.complete = False
+
+    def reject(self, line, reason):
+        self.rejected.append((line, reason))
+
+    def summary(self, max_rejected=10):
+        lines = [
+            "{} composants ajoutés, {} mis à jour, {} catégories créées en {:.1f} s.".format(
+                self.inserted, self.updated, self.categories, self.elapsed)]
+        if self.resumed_at > 0:
+            lines.append("Import repris après la ligne {}.".format(self.resumed_at))
+        if len(self.rejected) > 0:
+            lines.append("{} lignes rejetées :".format(len(self.rejected)))
+            for line, reason in self.rejected[:max_rejected]:
+                lines.append("  ligne {} : {}".format(line, reason))
+            if len(self.rejected) > max_rejected:
+                lines.append("  ...")
+        return "\n".join(lines)
+
+
+class CatalogImporter:
+    """
+    Streaming import of a supplier CSV or a profiles file into Composant.
+    The rows are read CHUNK_SIZE at a time, each chunk is upserted with
+    executemany in one transaction, matching the existing components by
+    category and name. After each chunk the line reached is saved next to
+    the file, an interrupted import starts again from there.
+    """
+
+    def __init__(self, con, categorie=None, fc_type="BO", mapping=None,
+                 chunk_size=CHUNK_SIZE, progress=None):
+        self.con = con
+        self.categorie = categorie
+        self.fc_type = fc_type
+        self.mapping = mapping
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.report = None
+        # FC_COMPTEUR by lowercase name and the existing ids
+        self.categories_by_name = {}
+        self.categories_ids = set()
+        # CO_COMPTEUR by (CO_FAMILLE, CO_NOM)
+        self.existing = {}
+
+    def loadExisting(self):
+        cur = self.con.cursor()
+        cur.execute("SELECT FC_COMPTEUR, FC_NOM FROM Famille_Composant")
+        for fc_compteur, fc_nom in cur.fetchall():
+            self.categories_ids.add(fc_compteur)
+            self.categories_by_name.setdefault(str(fc_nom).strip().lower(), fc_compteur)
+        cur.execute("SELECT CO_COMPTEUR, CO_FAMILLE, CO_NOM FROM Composant")
+        for co_compteur, co_famille, co_nom in cur.fetchall():
+            self.existing[(co_famille, co_nom)] = co_compteur
+
+    def getCategorie(self, value):
+        """
+        Return the FC_COMPTEUR of a category id or name, the category is
+        created when the name is unknown.
+        """
+        value = str(value).strip()
+        if value == "":
+            raise ValueError("catégorie manquante")
+        if value.isdigit() and int(value) in self.categories_ids:
+            return int(value)
+        fc_compteur = self.categories_by_name.get(value.lower())
+        if fc_compteur is None:
+            cur = self.con.cursor()
+            g3d_connect_db.retryLocked(
+                cur.execute,
+                "INSERT INTO Famille_Composant(FC_NOM, FC_TYPE) VALUES(?,?)",
+                (value, self.fc_type))
+            fc_compteur = cur.lastrowid
+            self.categories_by_name[value.lower()] = fc_compteur
+            self.categories_ids.add(fc_compteur)
+            self.report.categories += 1
+        return fc_compteur
+
+    def makeRecord(self, values):
+        """
+        Check and convert the values of a row.
+        :param values: dict CO_* field -> str
+        :return: tuple in the order of IMPORT_FIELDS
+        """
+        record = dict(DEFAULT_VALUES)
+        nom = (values.get("CO_NOM") or "").strip()
+        if nom == "":
+            raise ValueError("nom manquant")
+        record["CO_NOM"] = nom
+        famille = values.get("CO_FAMILLE")
+        if famille is None or str(famille).strip() == "":
+            famille = self.categorie
+        if famille is None:
+            raise ValueError("catégorie manquante")
+        record["CO_FAMILLE"] = self.getCategorie(famille)
+        for field in NUMBER_FIELDS:
+            value = values.get(field)
+            if value is None:
+                continue
+            try:
+                number = parseNumber(str(value))
+            except ValueError:
+                raise ValueError("{} : '{}' n'est pas un nombre positif".format(field, value))
+            if number is not None:
+                record[field] = number
+        for field in ("CO_LARGEUR", "CO_EPAISSEUR"):
+            if field not in record:
+                raise ValueError("{} manquant".format(field))
+        forme = (values.get("CO_FORME") or "").strip().upper()
+        if forme != "":
+            if forme not in SHAPES:
+                raise ValueError("forme {} non gérée".format(forme))
+            record["CO_FORME"] = forme
+        couleur = (values.get("CO_COULEUR") or "").strip()
+        if couleur != "":
+            try:
+                record["CO_COULEUR"] = parseColor(couleur)
+            except ValueError:
+                raise ValueError("couleur '{}' invalide, attendu r,g,b".format(couleur))
+        cad = (values.get("CO_FICHIER_CAD") or "").strip()
+        if cad != "":
+            record["CO_FICHIER_CAD"] = cad
+        return tuple(record[field] for field in IMPORT_FIELDS)
+
+    def readRows(self, path, skip_to=0):
+        """
+        Yield (line number, dict CO_* field -> str) for each row of the file.
+        A file whose first row names the columns is a supplier file, else
+        it is read as a profiles file.
+        """
+        encoding = detectEncoding(path)
+        with open(path, "r", encoding=encoding, newline="") as csvfile:
+            reader = csv.reader(csvfile, detectDialect(csvfile))
+            fields = None
+            for row in reader:
+                if (not row) or row[0].startswith("#"):
+                    continue
+                if fields is None:
+                    fields = mapColumns(row, self.mapping)
+                    if "CO_NOM" in fields:
+                        continue
+                    # No header : category, name, shape and dimensions
+                    fields = False
+                if reader.line_num <= skip_to:
+                    continue
+                if fields:
+                    values = {}
+                    for field, value in zip(fields, row):
+                        if field is not None:
+                            values[field] = value
+                else:
+                    values = self.profileValues(row)
+                yield reader.line_num, values
+
+    def profileValues(self, row):
+        values = {}
+        if len(row) < 4:
+            return values
+        values["CO_FAMILLE"] = row[0]
+        values["CO_NOM"] = row[1]
+        values["CO_FORME"] = row[2]
+        if row[2].strip().upper() == "C":
+            values["CO_LARGEUR"] = values["CO_EPAISSEUR"] = row[3]
+        elif len(row) >= 5:
+            # Width then height, e.g. 22,100 for a 22x100 board
+            values["CO_EPAISSEUR"] = row[3]
+            values["CO_LARGEUR"] = row[4]
+        return values
+
+    def writeChunk(self, chunk):
+        """Upsert a chunk of records in one transaction."""
+        cur = self.con.cursor()
+        # Holds the write lock from the start, so MAX(CO_COMPTEUR) stays valid,
+        # a category created for this chunk has already taken it
+        if not self.con.in_transaction:
+            g3d_connect_db.retryLocked(cur.execute, "BEGIN IMMEDIATE")
+        try:
+            cur.execute("SELECT MAX(CO_COMPTEUR) FROM Composant")
+            next_id = (cur.fetchone()[0] or 0) + 1
+            inserts = []
+            updates = []
+            for line, record in chunk:
+                key = (record[1], record[0])
+                co_compteur = self.existing.get(key)
+                if co_compteur is None:
+                    co_compteur = next_id
+                    next_id += 1
+                    inserts.append((co_compteur,) + record)
+                    self.existing[key] = co_compteur
+                else:
+                    updates.append(record + (co_compteur,))
+            cur.executemany(
+                "INSERT INTO Composant(CO_COMPTEUR, {}) VALUES({})".format(
+                    ", ".join(IMPORT_FIELDS), ", ".join("?" * (len(IMPORT_FIELDS) + 1))),
+                inserts)
+            cur.executemany(
+                "UPDATE Composant SET {} WHERE CO_COMPTEUR = ?".format(
+                    ", ".join(field + " = ?" for field in IMPORT_FIELDS)),
+                updates)
+            g3d_connect_db.retryLocked(self.con.commit)
+        except sqlite3.Error:
+            self.con.rollback()
+            raise
+        self.report.inserted += len(inserts)
+        self.report.updated += len(updates)
+
+    def run(self, path, resume=True):
+        """
+        Import a file.
+        :param path: str
+        :param resume: bool, start again after the last chunk written by an
+                       interrupted import of the same file
+        :return: ImportReport
+        """
+        start = time.time()
+        self.report = ImportReport(path)
+        checkpoint = Checkpoint(path)
+        skip_to = checkpoint.load() if resume else 0
+        self.report.resumed_at = skip_to
+        if self.con.in_transaction:
+            self.con.commit()
+        self.loadExisting()
+        chunk = []
+        last_line = skip_to
+        for line, values in self.readRows(path, skip_to):
+            last_line = line
+            try:
+                chunk.append((line, self.makeRecord(values)))
+            except ValueError as error:
+                self.report.reject(line, str(error))
+            if len(chunk) >= self.chunk_size:
+                self.writeChunk(chunk)
+                checkpoint.save(line)
+                chunk = []
+                if self.progress is not None:
+                    self.progress(line)
+        if len(chunk) > 0 or self.con.in_transaction:
+            # The categories created for rejected rows are committed too
+            self.writeChunk(chunk)
+        checkpoint.clear()
+        if self.progress is not None:
+            self.progress(last_line)
+        g3d_connect_db.invalidateCatalog()
+        self.report.elapsed = time.time() - start
+        self.report.complete = True
+        return self.report
+
+
+class Checkpoint:
+    """Line reached by the import of a file, saved next to it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = path + ".reprise"
+
+    def getSignature(self):
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return 0
+        # The file was changed since, start again from the beginning
+        if data.get("signature") != self.getSignature():
+            return 0
+        return int(data.get("line", 0))
+
+    def save(self, line):
+        try:
+            with open(self.checkpoint_path, "w") as f:
+                json.dump({"signature": self.getSignature(), "line": line}, f)
+        except IOError as error:
+            print_debug(["Import checkpoint not saved", error])
+
+    def clear(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def importCatalog(path, sqlite_db=None, categorie=None, fc_type="BO",
+                  mapping=None, chunk_size=CHUNK_SIZE, resume=True,
+                  progress=None, con=None):
+    """
+    Import the components of a supplier CSV or of a profiles file.
+    From FreeCADCmd :
+    FreeCADCmd -c "from freecad.workbench_gespal3d import g3d_importer;
+    print(g3d_importer.importCatalog('fournisseur.csv').summary())"
+    :param path: str, CSV with a header row or profiles file
+    :param sqlite_db: str, the database of the preferences by default
+    :param categorie: FC_COMPTEUR or name for the rows without category
+    :param fc_type: str, BO, PX or QU, type of the categories created
+    :param mapping: dict header or column index -> CO_* field
+    :param chunk_size: int
+    :param resume: bool
+    :param progress: callable taking the line number reached
+    :param con: sqlite3.Connection to use, e.g. the one of the manager
+    :return: ImportReport
+    """
+    own_con = None
+    if con is None:
+        if sqlite_db is None:
+            con = g3d_connect_db.sql_connection()
+        else:
+            own_con = con = g3d_connect_db.connectDatabase(sqlite_db)
+            g3d_connect_db.checkDBintegrity(con)
+    if con is None:
+        raise IOError("No component database")
+    importer = CatalogImporter(con, categorie, fc_type, mapping, chunk_size, progress)
+    try:
+        report = importer.run(path, resume)
+    finally:
+        if own_con is not None:
+            own_con.close()
+    App.Console.PrintMessage(
+        "Import de {} :\n{}\n".format(os.path.basename(path), report.summary()))
+    return report
@@ -2,21 +2,27 @@
 
 import os
 import string
+import json
+import hashlib
+import filecmp
 import math
+from collections import OrderedDict
 from datetime import datetime
 from fractions import Fraction
 
 import FreeCAD as App
+import Part
+import DraftGeomUtils, DraftVecUtils
+from freecad.workbench_gespal3d import PARAMPATH
+from freecad.workbench_gespal3d import print_debug
+from freecad.workbench_gespal3d import g3d_registry
 
 if App.GuiUp:
     import FreeCADGui as Gui
-    import Draft, Part
+    import Draft
     import TechDraw, TechDrawGui
-    import DraftGeomUtils, DraftVecUtils
     from PySide import QtCore, QtGui
     from freecad.workbench_gespal3d import __version__ as wb_version
-    from freecad.workbench_gespal3d import PARAMPATH
-    from freecad.workbench_gespal3d import print_debug
     from freecad.workbench_gespal3d import RESOURCESPATH
 
 
@@ -26,9 +32,97 @@ __author__ = "Jonathan Wiedemann"
 __url__ = "https://freecad-france.com"
 
 
+# Aligned boundbox of the last component geometries analysed, unchanged
+# components skip the analysis on the next export. The least recently used
+# geometry is dropped first.
+_aligned_boundbox_cache = OrderedDict()
+BOUNDBOX_CACHE_SIZE = 512
+
+# Fingerprint and listing row of the components of the last export, by
+# document name then object name. Kept out of the document so that an
+# export does not modify it.
+_listing_rows = {}
+
+# Same layout as Spreadsheet exportFile defaults.
+CSV_DELIMITER = "\t"
+CSV_QUOTECHAR = '"'
+CSV_ESCAPECHAR = "\\"
+
+
+def getBOMKey(obj):
+    """
+    Key of the bill of material line of a listing row. Unlike the former
+    comparison, the dimensions are rounded to 1/100 mm and the machining is
+    part of the key : a machined part gets its own line.
+    :param obj: dict, listing row
+    :return: tuple
+    """
+    return (
+        obj["ID"],
+        round(obj["Length"], 2),
+        round(obj["Width"], 2),
+        round(obj["Height"], 2),
+        obj["Machining"],
+    )
+
+
+def createBOMComponent(obj):
+    component = {"ID":int,
+            "Label":str,
+            "Type":str,
+            "Width":float,
+            "Height":float,
+            "Length":float,
+            "Machining":bool,
+            "Quantity":int,
+            "Reference":int}
+    component["Quantity"] = 1
+    component["ID"] = obj["ID"]
+    component["Label"] = obj["Label"]
+    component["Type"] = obj["Type"]
+    component["Width"] = obj["Width"]
+    component["Height"] = obj["Height"]
+    component["Length"] = obj["Length"]
+    component["Machining"] = obj["Machining"]
+    component["Reference"] = 0
+    return component
+
+
+def condenseListing(listing):
+    """
+    Group the listing rows into the bill of material. Rows with the same
+    getBOMKey share one line whose quantity is incremented. References are
+    numbered from 1 in the order the lines first appear in the listing.
+    :param listing: list of dict, listing rows
+    :return: list of dict, BOM lines
+    """
+    bom = []
+    bom_index = {}
+    for obj in listing:
+        key = getBOMKey(obj)
+        component = bom_index.get(key)
+        if component is not None:
+            component["Quantity"] += 1
+            print_debug("{} is already listed, let's add +1 to qty.".format(obj))
+        else:
+            print_debug("{} is not listed yet, creating a new component.".format(obj))
+            component = createBOMComponent(obj)
+            component["Reference"] = len(bom) + 1
+            bom_index[key] = component
+            bom.append(component)
+    return bom
+
+
 class gespal3d_exports:
-    def __init__(self):
-        self.doc = App.ActiveDocument
+    def __init__(self, doc=None, use_spreadsheets=None):
+        """
+        :param doc: document to export, the active document by default
+        :param use_spreadsheets: refresh the spreadsheets of the document,
+            read from the ListingSpreadsheets parameter by default
+        """
+        if doc is None:
+            doc = App.ActiveDocument
+        self.doc = doc
         
         if len(self.doc.Label.split("PL_")) > 1:
             self.project_id = self.doc.Label.split("PL_")[1]
@@ -37,6 +131,14 @@ class gespal3d_exports:
         self.path_project = os.path.split(self.doc.FileName)[0]
 
         self.p = App.ParamGet(str(PARAMPATH))
+        # Reuse the listing row of unchanged components and leave the
+        # sheets and CSV files untouched when the listing is the same.
+        self.incremental = self.p.GetBool("IncrementalExport", True)
+        # CSV files are always written from the listing, the spreadsheets
+        # are only a view of it inside the document.
+        if use_spreadsheets is None:
+            use_spreadsheets = self.p.GetBool("ListingSpreadsheets", True)
+        self.use_spreadsheets = use_spreadsheets
 
         #self.GespalObjetcs = []
         self.GespalListing = []
@@ -54,35 +156,29 @@ class gespal3d_exports:
         self.makeCondensedListing()
 
     def makeListing(self):
-        # get all objects in the current document
-        objs = self.doc.Objects
-        print_debug("There is %s object in document." % len(objs))
+        # get the gespal objects of the current document from the registry
+        registry = g3d_registry.getRegistry(self.doc)
+        print_debug("There is %s object in document." % len(self.doc.Objects))
 
         _gespal_objects = []
-        _objother = []
         # sorting out gespal objects
-        for obj in objs:
+        for obj in registry.getListedObjects():
             print_debug("Checking object : {} ({}).".format(obj.Name, obj.Label, obj.TypeId))
             if self.is_gespal_object(obj):
-                _gespal_objects.append(obj)
-            elif obj.TypeId == "Part::Mirroring":
+                # masters of the accessory links are only counted through them
+                if not getattr(obj, "InstanceMaster", False):
+                    _gespal_objects.append(obj)
+            elif obj.TypeId in ("Part::Mirroring", "App::Link"):
                 src = self.getSource(obj)
                 if self.is_gespal_object(src):
                     _gespal_objects.append(obj)
-            elif obj.Name == "Product":
-                self.gespal_ProjectProduct = obj
-            elif obj.Name == "Box":
-                self.gespal_ProductBBox = obj
-            elif "Dimension" in obj.Name:
-                self.gespal_DimensionsFolder.append(obj)
-            elif obj.Name == "Gespal3DListe":
-                self.InventoryList_Sheet = obj
-            elif obj.Name == "Gespal3DDebit":
-                self.CuttingList_Sheet = obj
-            elif obj.Name == "BoundBoxs_Sheet":
-                self.BoundBoxs_Sheet = obj
-            else:
-                _objother.append(obj)
+
+        self.gespal_ProjectProduct = registry.getProduct()
+        self.gespal_ProductBBox = registry.getProductBox()
+        self.gespal_DimensionsFolder = registry.getDimensions()
+        self.InventoryList_Sheet = self.doc.getObject("Gespal3DListe")
+        self.CuttingList_Sheet = self.doc.getObject("Gespal3DDebit")
+        self.BoundBoxs_Sheet = self.doc.getObject("BoundBoxs_Sheet")
 
         if len(_gespal_objects) < 0:
             App.Console.PrintMessage("La liste des composants Gespal est vide.\n")
@@ -99,7 +195,7 @@ class gespal3d_exports:
 
         _gespal_listing = []
         for obj in _gespal_objects:
-            if obj.TypeId == "Part::Mirroring":
+            if obj.TypeId in ("Part::Mirroring", "App::Link"):
                 src = self.getSource(obj)
                 _gespal_listing.append(src)
                 if hasattr(src, "EquipmentPower"):
@@ -117,142 +213,148 @@ class gespal3d_exports:
                 else:
                     self.GespalObjectsToDrawings.append(obj)
 
-        accessoryBB_group.ViewObject.Visibility = False
+        if App.GuiUp:
+            accessoryBB_group.ViewObject.Visibility = False
         print_debug("There is %s object in GespalObjectsToDrawings :" % len(self.GespalObjectsToDrawings))
 
+        # mirrors and links share the row of their source
+        cached = self.getCachedRows()
+        rows = {}
         for obj in _gespal_listing:
-
-            component = {"ID":int,
-                    "Label":str,
-                    "Type":str,
-                    "Width":float,
-                    "Height":float,
-                    "Length":float,
-                    "Machining":bool,}
-
-            component["ID"] = int(obj.Description)
-            component["Label"] = str(obj.Label)
-            component["Machining"] = False
-
-            if not hasattr(obj, "EquipmentPower"):
-                boundbox = self.getAlignedBoundBox(obj.Shape)
-                #print_debug("row %s : object's name is %s." % (n, obj.Name))
-                #print_debug(boundbox)
-                boundbox = [round(float(boundbox[0]), 2),
-                            round(float(boundbox[1]), 2),
-                            round(float(boundbox[2]), 2)]
-
-                boundbox0 = boundbox[0]
-                boundbox1 = boundbox[1]
-                boundbox2 = boundbox[2]
-
-                if hasattr(obj, "Height"):
-                    component["Type"] = "Barre"
-                    width = boundbox1
-                    height = boundbox0
-                    length = boundbox2
-                elif hasattr(obj, "Thickness"):
-                    component["Type"] = "Panneaux"
-                    width = obj.Thickness.Value
-                    m = 0
-                    for dim in boundbox:
-                        print_debug([dim, width])
-                        if round(dim,2) == width:
-                            boundbox.pop(m)
-                        m += 1
-                    height = float(min(boundbox))
-                    length = float(max(boundbox))
-                else:
-                    component["Type"] = "Barre"
-                    width = boundbox0
-                    height = boundbox1
-                    length = boundbox2
-                if hasattr(obj, "Subtractions"):
-                    if len(obj.Subtractions) > 0:
-                        component["Machining"] = True
-            else:
-                component["Type"] = "Quincaillerie"
-                width = 0.00
-                height = 0.00
-                length = 0.00
-            
-            component["Width"] = width
-            component["Height"] = height
-            component["Length"] = length
-            
-            self.GespalListing.append(component)
-
-    def makeCondensedListing(self):
-        for obj in self.GespalListing:
-            if len(self.GespalBOM) > 0:
-                listed = False
-                for comp in self.GespalBOM:
-                    if obj["ID"] == comp["ID"]:
-                        if obj["Length"] == comp["Length"]:
-                            if obj["Width"] == comp["Width"] and obj["Height"] == comp["Height"] :
-                                comp["Quantity"] += 1
-                                listed = True
-                                print_debug("{} is already listed, let's add +1 to qty.".format(obj))
-                        
-                if listed == False:
-                    print_debug("{} is not listed yet, creating a new component.".format(obj))
-                    component = self.createComponent(obj)
-                    component["Reference"] = reference_count
-                    reference_count += 1
-                    self.GespalBOM.append(component)
-            else:
-                print_debug("{} is not listed yet, creating a new component.".format(obj))
-                component = self.createComponent(obj)
-                reference_count = 1
-                component["Reference"] = reference_count
-                reference_count += 1
-                self.GespalBOM.append(component)
-
-    def createComponent(self, obj):
+            component = rows.get(obj.Name)
+            if component is None:
+                fingerprint = self.getFingerprint(obj)
+                if self.incremental:
+                    component = self.getCachedComponent(cached, obj, fingerprint)
+                if component is None:
+                    component = self.makeComponent(obj)
+                rows[obj.Name] = component
+                cached[obj.Name] = (fingerprint, component)
+            self.GespalListing.append(dict(component))
+        # only the components of this export are kept
+        _listing_rows[self.doc.Name] = {name: cached[name] for name in rows}
+
+    def makeComponent(self, obj):
         component = {"ID":int,
                 "Label":str,
                 "Type":str,
                 "Width":float,
                 "Height":float,
                 "Length":float,
-                "Machining":bool,
-                "Quantity":int,
-                "Reference":int}
-        component["Quantity"] = 1
-        component["ID"] = obj["ID"]
-        component["Label"] = obj["Label"]
-        component["Type"] = obj["Type"]
-        component["Width"] = obj["Width"]
-        component["Height"] = obj["Height"]
-        component["Length"] = obj["Length"]
-        component["Machining"] = obj["Machining"]
-        component["Reference"] = 0
+                "Machining":bool,}
+
+        component["ID"] = int(obj.Description)
+        component["Label"] = str(obj.Label)
+        component["Machining"] = False
+
+        if not hasattr(obj, "EquipmentPower"):
+            boundbox = self.getAlignedBoundBox(obj.Shape)
+            #print_debug("row %s : object's name is %s." % (n, obj.Name))
+            #print_debug(boundbox)
+            boundbox = [round(float(boundbox[0]), 2),
+                        round(float(boundbox[1]), 2),
+                        round(float(boundbox[2]), 2)]
+
+            boundbox0 = boundbox[0]
+            boundbox1 = boundbox[1]
+            boundbox2 = boundbox[2]
+
+            if hasattr(obj, "Height"):
+                component["Type"] = "Barre"
+                width = boundbox1
+                height = boundbox0
+                length = boundbox2
+            elif hasattr(obj, "Thickness"):
+                component["Type"] = "Panneaux"
+                width = obj.Thickness.Value
+                m = 0
+                for dim in boundbox:
+                    print_debug([dim, width])
+                    if round(dim,2) == width:
+                        boundbox.pop(m)
+                    m += 1
+                height = float(min(boundbox))
+                length = float(max(boundbox))
+            else:
+                component["Type"] = "Barre"
+                width = boundbox0
+                height = boundbox1
+                length = boundbox2
+            if hasattr(obj, "Subtractions"):
+                if len(obj.Subtractions) > 0:
+                    component["Machining"] = True
+        else:
+            component["Type"] = "Quincaillerie"
+            width = 0.00
+            height = 0.00
+            length = 0.00
+        
+        component["Width"] = width
+        component["Height"] = height
+        component["Length"] = length
+        
         return component
 
+    def getFingerprint(self, obj):
+        bb = obj.Shape.BoundBox
+        fingerprint = [
+            obj.Label,
+            obj.Description,
+            round(obj.Shape.Volume, 3),
+            round(obj.Shape.Area, 3),
+            round(bb.XMin, 3), round(bb.YMin, 3), round(bb.ZMin, 3),
+            round(bb.XMax, 3), round(bb.YMax, 3), round(bb.ZMax, 3),
+        ]
+        if hasattr(obj, "Subtractions"):
+            fingerprint.append(len(obj.Subtractions))
+        return json.dumps(fingerprint)
+
+    def getCachedRows(self):
+        # forget the documents closed since the last export
+        documents = App.listDocuments()
+        for name in list(_listing_rows):
+            if name not in documents:
+                del _listing_rows[name]
+        return dict(_listing_rows.get(self.doc.Name, {}))
+
+    def getCachedComponent(self, cached, obj, fingerprint):
+        cache = cached.get(obj.Name)
+        if cache is None or cache[0] != fingerprint:
+            return None
+        print_debug("{} is unchanged, using its cached listing row.".format(obj.Name))
+        return cache[1]
+
+    def makeCondensedListing(self):
+        """Group the listing rows into GespalBOM, see condenseListing."""
+        self.GespalBOM = condenseListing(self.GespalListing)
+
+    def createComponent(self, obj):
+        return createBOMComponent(obj)
 
     def is_gespal_object(self, obj):
-        if hasattr(obj, "Tag"):
-            if obj.Tag == "Gespal":
-                if hasattr(obj, "Description"):
-                    if obj.Description is not None:
-                        return True
-        return False
+        return g3d_registry.is_gespal_object(obj)
 
     def makeEquipmentBBox(self, obj):
+        # links have no Shape property, get their placed shape
+        boundbox = Part.getShape(obj).BoundBox
         bb = self.doc.addObject("Part::Box","BBox")
         bb.Label = obj.Label
-        bb.Length = obj.Shape.BoundBox.XLength
-        bb.Width = obj.Shape.BoundBox.YLength
-        bb.Height = obj.Shape.BoundBox.ZLength
-        bb.Placement.Base = [obj.Shape.BoundBox.XMin,obj.Shape.BoundBox.YMin,obj.Shape.BoundBox.ZMin]
+        bb.Length = boundbox.XLength
+        bb.Width = boundbox.YLength
+        bb.Height = boundbox.ZLength
+        bb.Placement.Base = [boundbox.XMin,boundbox.YMin,boundbox.ZMin]
         return bb
 
     def getSource(self, obj):
         print_debug("Looking for source of %s." % obj.Name)
-        src = obj.Source
-        while src.TypeId == "Part::Mirroring":
-            print_debug("Source is {}. It's a Part::Mirror object.".format(src.Name))
-            src = src.Source
+        src = obj
+        while src.TypeId in ("Part::Mirroring", "App::Link"):
+            if src.TypeId == "App::Link":
+                print_debug("Source is {}. It's an App::Link object.".format(src.Name))
+                src = src.LinkedObject
+            else:
+                print_debug("Source is {}. It's a Part::Mirror object.".format(src.Name))
+                src = src.Source
         print_debug("Source is : %s." % src.Name)
         return src
 
@@ -278,87 +380,215 @@ class gespal3d_exports:
                 listeCouple.append([faces[n], faces[n + 1]])
         return listeCouple
 
+    def getShapeSignature(self, shape):
+        ## Placement independent description of the geometry, two components
+        ## with the same signature share the same aligned boundbox
+        return (
+            shape.ShapeType,
+            len(shape.Faces),
+            round(shape.Volume, 3),
+            round(shape.Area, 3),
+            tuple(sorted(round(e.Length, 3) for e in shape.Edges)),
+        )
+
     def getAlignedBoundBox(self, shape):
-        ## Create a new object with the shape of the current arch object
-        ## His placment is set to 0,0,0
-        obj = App.ActiveDocument.addObject("Part::Feature", "AlignedBoundBox")
-        obj.Shape = shape
-        obj.Placement.Base = App.Vector(0.0, 0.0, 0.0)
-        obj.Placement.Rotation = App.Rotation(App.Vector(0.0, 0.0, 1.0), 0.0)
-        App.ActiveDocument.recompute()
+        signature = self.getShapeSignature(shape)
+        analyse = _aligned_boundbox_cache.get(signature)
+        if analyse is None:
+            analyse = self.computeAlignedBoundBox(shape)
+            _aligned_boundbox_cache[signature] = analyse
+            if len(_aligned_boundbox_cache) > BOUNDBOX_CACHE_SIZE:
+                _aligned_boundbox_cache.popitem(last=False)
+        else:
+            _aligned_boundbox_cache.move_to_end(signature)
+            print_debug("Aligned boundbox found in cache.")
+        return list(analyse)
+
+    def computeAlignedBoundBox(self, shape):
+        ## Work on a copy of the shape placed at the origin, the document
+        ## is never touched
+        shape = shape.copy()
+        shape.Placement = App.Placement()
         ## Get the face to align with XY plane
-        faces = obj.Shape.Faces
+        faces = shape.Faces
         facesMax = self.getFacesMax(faces)
         coupleEquerre = self.getCoupleFacesEquerre(facesMax)
         ## Get the normal of this face
         nv1 = coupleEquerre[0][0].normalAt(0, 0)
         ## Get the goal normal vector
         zv = App.Vector(0, 0, 1)
-        ## Find and apply a rotation to the object to align face
-        pla = obj.Placement
-        rot = pla.Rotation
-        rot1 = App.Rotation(nv1, zv)
-        newrot = rot.multiply(rot1)
-        pla.Rotation = newrot
+        ## Find and apply a rotation to the shape to align face
+        shape.Placement = App.Placement(App.Vector(0.0, 0.0, 0.0), App.Rotation(nv1, zv))
         ## Get the face to align with XY plane
-        faces = obj.Shape.Faces
+        faces = shape.Faces
         facesMax = self.getFacesMax(faces)
         coupleEquerre = self.getCoupleFacesEquerre(facesMax)
-        ## Get the longest edge from aligned face
+        ## Get the longest edge from aligned face
         maxLength = 0.0
         for e in coupleEquerre[0][0].Edges:
             if e.Length > maxLength:
                 maxLength = e.Length
                 edgeMax = e
-        ## Get the angle between edge and X axis and rotate object
+        ## Get the angle between edge and X axis and rotate shape
         vec = DraftGeomUtils.vec(edgeMax)
         vecZ = App.Vector(vec[0], vec[1], 0.0)
-        pos2 = obj.Placement.Base
         rotZ = math.degrees(
             DraftVecUtils.angle(vecZ, App.Vector(1.0, 0.0, 0.0), zv)
         )
-        Draft.rotate([obj], rotZ, pos2, axis=zv, copy=False)
-        bb = obj.Shape.BoundBox
-        movex = bb.XMin * -1
-        movey = bb.YMin * -1
-        movez = bb.ZMin * -1
-        Draft.move([obj], App.Vector(movex, movey, movez))
-        App.ActiveDocument.recompute()
+        shape.rotate(App.Vector(0.0, 0.0, 0.0), zv, rotZ)
         ## Get the boundbox
+        bb = shape.BoundBox
         analyse = [
-            obj.Shape.BoundBox.YLength,
-            obj.Shape.BoundBox.ZLength,
-            obj.Shape.BoundBox.XLength,
+            bb.YLength,
+            bb.ZLength,
+            bb.XLength,
         ]
-        # if not "Shape" in self.export :
-        App.ActiveDocument.removeObject(obj.Name)
         return analyse
 
 
-    def makeInventory_Sheet(self):
-        print_debug("Start making Inventory sheet...")
-        if self.InventoryList_Sheet:
-            self.InventoryList_Sheet.clearAll()
+    def getDigest(self, rows):
+        return hashlib.sha1(json.dumps(rows, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def isSheetUpToDate(self, sheet, digest):
+        if not self.incremental or sheet is None:
+            return False
+        return getattr(sheet, "ListingDigest", None) == digest
+
+    def setSheetDigest(self, sheet, digest):
+        if not hasattr(sheet, "ListingDigest"):
+            sheet.addProperty(
+                "App::PropertyString",
+                "ListingDigest",
+                "Gespal",
+                "Digest of the listing written in this sheet")
+            sheet.setEditorMode("ListingDigest", 2)
+        sheet.ListingDigest = digest
+
+    def formatCSVField(self, value):
+        """
+        Format a cell the way Spreadsheet exportFile does : numbers with 6
+        significant digits, text quoted only when it holds a quote, the
+        delimiter or a line break.
+
+        :param value: str, int or float
+        :return: str
+        """
+        if isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, (int, float)):
+            return "{:g}".format(value)
+        if any(char in value for char in (CSV_QUOTECHAR, CSV_DELIMITER, "\n")):
+            value = value.replace(CSV_QUOTECHAR, CSV_ESCAPECHAR + CSV_QUOTECHAR)
+            return CSV_QUOTECHAR + value + CSV_QUOTECHAR
+        return value
+
+    def writeCSV(self, rows, path_csv):
+        """
+        Write the rows straight to a CSV file, without going through a
+        spreadsheet. The file is written next to the previous one and only
+        replaces it when its content changed, so it keeps its date when
+        nothing moved.
+
+        :param rows: list of rows, each row is a list of str or numbers
+        :param path_csv: str
+        """
+        path_tmp = path_csv + ".tmp"
+        with open(path_tmp, "w", encoding="utf-8", newline="\n") as csv_file:
+            for row in rows:
+                row = list(row)
+                while row and row[-1] == "":
+                    row.pop()
+                fields = [self.formatCSVField(value) for value in row]
+                csv_file.write(CSV_DELIMITER.join(fields) + "\n")
+        if os.path.exists(path_csv) and filecmp.cmp(path_tmp, path_csv, shallow=False):
+            os.remove(path_tmp)
+            print_debug("{} is unchanged.".format(path_csv))
         else:
-            App.ActiveDocument.addObject("Spreadsheet::Sheet", "Gespal3DListe")
-            self.InventoryList_Sheet = App.ActiveDocument.getObject("Gespal3DListe")
-        App.ActiveDocument.recompute()
+            os.replace(path_tmp, path_csv)
 
-        spreadsheet = self.InventoryList_Sheet
-        debitSheet = self.CuttingList_Sheet
-        headers = [
+    def getInventoryRows(self):
+        rows = [[
             "ID",
             "Désignation",
             "Largeur",
             "Hauteur",
             "Longueur",
             "Usinage",
+        ]]
+        for component in self.GespalListing:
+            rows.append([
+                str(component["ID"]),
+                str(component["Label"]),
+                component["Width"],
+                component["Height"],
+                component["Length"],
+                "C" if component["Machining"] is True else "",
+            ])
+        return rows
+
+    def getCuttingListRows(self):
+        rows = [[
+            "ID",
+            "Désignation",
+            "Quantité",
+            "Largeur",
+            "Hauteur",
+            "Longueur",
+            "Référence plan",
+        ]]
+        for component in self.GespalBOM:
+            label = str(component["Label"])
+            if component["Machining"] is True:
+                label += " (Usinage)"
+            rows.append([
+                str(component["ID"]),
+                label,
+                str(component["Quantity"]),
+                component["Width"],
+                component["Height"],
+                component["Length"],
+                str(component["Reference"]),
+            ])
+        return rows
+
+    def getBoundBoxRows(self):
+        boundbox = self.getBoundBoxs()
+        rows = [["", "Longeur", "Largeur", "Hauteur"]]
+        labels = [
+            "Dimensions intérieur",
+            "Dimensions extérieur sans quincaillerie",
+            "Dimensions extérieur avec quincaillerie",
         ]
+        for label, bb in zip(labels, boundbox):
+            rows.append([label, bb.XLength, bb.YLength, bb.ZLength])
+        return rows
+
+    def makeInventory_Sheet(self):
+        print_debug("Start making Inventory list...")
+        rows = self.getInventoryRows()
+        name_csv = "CP_" + self.project_id + ".csv"
+        self.writeCSV(rows, os.path.join(self.path_project, name_csv))
+        if not self.use_spreadsheets:
+            print_debug("Iventory list done.")
+            return
+
+        digest = self.getDigest(rows)
+        if self.isSheetUpToDate(self.InventoryList_Sheet, digest):
+            print_debug("Inventory sheet is up to date.")
+            return
+
+        if self.InventoryList_Sheet:
+            self.InventoryList_Sheet.clearAll()
+        else:
+            self.doc.addObject("Spreadsheet::Sheet", "Gespal3DListe")
+            self.InventoryList_Sheet = self.doc.getObject("Gespal3DListe")
+
+        spreadsheet = self.InventoryList_Sheet
         columns = list(string.ascii_uppercase)
         count = 0
-        for header in headers:
+        for header in rows[0]:
             index = str(columns[count]) + "1"
-            spreadsheet.set(index, headers[count])
+            spreadsheet.set(index, header)
             count += 1
         n = 2
         for component in self.GespalListing:
@@ -376,40 +606,39 @@ class gespal3d_exports:
                 spreadsheet.set("F" + str(n), "C")
             n += 1
 
-        App.ActiveDocument.recompute()
-        name_csv = "CP_" + self.project_id + ".csv"
-        path_csv = os.path.join(self.path_project, name_csv)
-        spreadsheet.exportFile(path_csv)
+        self.setSheetDigest(spreadsheet, digest)
+        spreadsheet.recompute()
 
         print_debug("Iventory sheet done.")
         return
 
 
     def makeCuttingList_Sheet(self):
-        print_debug("Start making Cutting list sheet...")
+        print_debug("Start making Cutting list...")
+        rows = self.getCuttingListRows()
+        name_csv = "BOM_" + self.project_id + ".csv"
+        self.writeCSV(rows, os.path.join(self.path_project, name_csv))
+        if not self.use_spreadsheets:
+            print_debug("Cutting list done.")
+            return
+
+        digest = self.getDigest(rows)
+        if self.isSheetUpToDate(self.CuttingList_Sheet, digest):
+            print_debug("Cutting list sheet is up to date.")
+            return
+
         if self.CuttingList_Sheet:
             self.CuttingList_Sheet.clearAll()
         else:
-            App.ActiveDocument.addObject("Spreadsheet::Sheet", "Gespal3DDebit")
-            self.CuttingList_Sheet = App.ActiveDocument.getObject("Gespal3DDebit")
-        App.ActiveDocument.recompute()
+            self.doc.addObject("Spreadsheet::Sheet", "Gespal3DDebit")
+            self.CuttingList_Sheet = self.doc.getObject("Gespal3DDebit")
 
         spreadsheet = self.CuttingList_Sheet
-        headers = [
-            "ID",
-            "Désignation",
-            "Quantité",
-            "Largeur",
-            "Hauteur",
-            "Longueur",
-            "Référence plan"
-            #"Volume",
-        ]
         columns = list(string.ascii_uppercase)
         count = 0
-        for header in headers:
+        for header in rows[0]:
             index = str(columns[count]) + "1"
-            spreadsheet.set(index, headers[count])
+            spreadsheet.set(index, header)
             count += 1
         n = 2
         for component in self.GespalBOM:
@@ -441,10 +670,8 @@ class gespal3d_exports:
 
             n += 1
 
-        App.ActiveDocument.recompute()
-        name_csv = "BOM_" + self.project_id + ".csv"
-        path_csv = os.path.join(self.path_project, name_csv)
-        spreadsheet.exportFile(path_csv)
+        self.setSheetDigest(spreadsheet, digest)
+        spreadsheet.recompute()
 
         print_debug("Cutting list sheet done.")
         return
@@ -635,37 +862,38 @@ class gespal3d_exports:
         return internalBB, externalBB, externalBB_with_accessory
 
     def makeBoundBox_sheet(self):
-        print_debug("Start making BoundBox dimensions sheet...")
+        print_debug("Start making BoundBox dimensions...")
+        rows = self.getBoundBoxRows()
+        name_csv = "DIM_" + self.project_id + ".csv"
+        self.writeCSV(rows, os.path.join(self.path_project, name_csv))
+        if not self.use_spreadsheets:
+            print_debug("BoundBox dimensions done.")
+            return
+
+        digest = self.getDigest(rows)
+        if self.isSheetUpToDate(self.BoundBoxs_Sheet, digest):
+            print_debug("BoundBox dimensions sheet is up to date.")
+            return
+
         if self.BoundBoxs_Sheet:
             self.BoundBoxs_Sheet.clearAll()
         else:
-            App.ActiveDocument.addObject("Spreadsheet::Sheet", "BoundBoxs_Sheet")
-            self.BoundBoxs_Sheet = App.ActiveDocument.getObject("BoundBoxs_Sheet")
-        
+            self.doc.addObject("Spreadsheet::Sheet", "BoundBoxs_Sheet")
+            self.BoundBoxs_Sheet = self.doc.getObject("BoundBoxs_Sheet")
 
-        self.BoundBoxs_Sheet.set("B1", "Longeur")
-        self.BoundBoxs_Sheet.set("C1", "Largeur")
-        self.BoundBoxs_Sheet.set("D1", "Hauteur")
-        self.BoundBoxs_Sheet.set("A2", "Dimensions intérieur")
-        self.BoundBoxs_Sheet.set("A3", "Dimensions extérieur sans quincaillerie")
-        self.BoundBoxs_Sheet.set("A4", "Dimensions extérieur avec quincaillerie")
-        
-        boundbox = self.getBoundBoxs()
+        columns = list(string.ascii_uppercase)
+        n = 1
+        for row in rows:
+            count = 0
+            for value in row:
+                if value != "":
+                    index = str(columns[count]) + str(n)
+                    self.BoundBoxs_Sheet.set(index, str(value))
+                count += 1
+            n += 1
 
-        self.BoundBoxs_Sheet.set("B2", str(boundbox[0].XLength))
-        self.BoundBoxs_Sheet.set("C2", str(boundbox[0].YLength))
-        self.BoundBoxs_Sheet.set("D2", str(boundbox[0].ZLength))
-        self.BoundBoxs_Sheet.set("B3", str(boundbox[1].XLength))
-        self.BoundBoxs_Sheet.set("C3", str(boundbox[1].YLength))
-        self.BoundBoxs_Sheet.set("D3", str(boundbox[1].ZLength))
-        self.BoundBoxs_Sheet.set("B4", str(boundbox[2].XLength))
-        self.BoundBoxs_Sheet.set("C4", str(boundbox[2].YLength))
-        self.BoundBoxs_Sheet.set("D4", str(boundbox[2].ZLength))
-
-        App.ActiveDocument.recompute()
-        name_csv = "DIM_" + self.project_id + ".csv"
-        path_csv = os.path.join(self.path_project, name_csv)
-        self.BoundBoxs_Sheet.exportFile(path_csv)
+        self.setSheetDigest(self.BoundBoxs_Sheet, digest)
+        self.BoundBoxs_Sheet.recompute()
 
         print_debug("BoundBox dimensions sheet done.")
         return
@@ -700,9 +928,7 @@ class _ListCreator:
             self.doc = App.ActiveDocument
             if len(self.doc.FileName) > 0:
                 if hasattr(Gui.activeDocument().activeView(), "zoomIn"):
-                    for obj in self.doc.Objects:
-                        if obj.Name == "Product":
-                            active = True
+                    active = g3d_registry.hasProduct(self.doc)
         return active
 
     def Activated(self):
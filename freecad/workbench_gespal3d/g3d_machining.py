@@ -11,6 +11,8 @@ if App.GuiUp:
     from DraftTools import translate
     from PySide.QtCore import QT_TRANSLATE_NOOP
     from freecad.workbench_gespal3d import ICONPATH
+    from freecad.workbench_gespal3d import g3d_registry
+    from freecad.workbench_gespal3d import g3d_component
 else:
     # \cond
     def translate(ctxt, txt):
@@ -60,11 +62,7 @@ class _CommandMachining:
 
     def IsActive(self):
         "Conditions for the tool to be active"
-        active = False
-        if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if "Structure" in obj.Name or "Panel" in obj.Name:
-                    active = True
+        active = g3d_registry.hasMachinable()
         return active
 
     def Activated(self):
@@ -217,8 +215,13 @@ class _CommandMachining:
             self.parent_obj.ViewObject.Transparency = 0
             machining = Arch.makeStructure(self.profil.InList[0])
             machining.MoveWithHost = True
-            Arch.removeComponents([machining],self.parent_obj)
-            App.ActiveDocument.recompute()
+            if g3d_component.isComponent(self.parent_obj):
+                g3d_component.addSubtraction(self.parent_obj, machining)
+                # only the host and the new tool need it, not the whole document
+                self.parent_obj.recompute(True)
+            else:
+                Arch.removeComponents([machining],self.parent_obj)
+                App.ActiveDocument.recompute()
 
 if App.GuiUp:
     Gui.addCommand("G3D_Machining", _CommandMachining())
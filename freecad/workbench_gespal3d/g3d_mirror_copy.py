@@ -8,6 +8,7 @@ if App.GuiUp:
     from PySide import QtCore, QtGui
     from DraftTools import translate
     from PySide.QtCore import QT_TRANSLATE_NOOP
+    from freecad.workbench_gespal3d import g3d_registry
     from freecad.workbench_gespal3d import DEBUG
     from freecad.workbench_gespal3d import PARAMPATH
 else:
@@ -149,12 +150,7 @@ class _CommandCopyMirror:
         }
 
     def IsActive(self):
-        if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if obj.Name == "Product":
-                    active = True
-        else:
-            active = False
+        active = g3d_registry.hasProduct()
         return active
 
     def Activated(self):
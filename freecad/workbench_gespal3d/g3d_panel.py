@@ -9,6 +9,8 @@ if App.GuiUp:
     import DraftVecUtils
     from freecad.workbench_gespal3d import g3d_tracker
     from freecad.workbench_gespal3d import g3d_connect_db
+    from freecad.workbench_gespal3d import g3d_search
+    from freecad.workbench_gespal3d import g3d_registry
     from freecad.workbench_gespal3d import PARAMPATH
     from freecad.workbench_gespal3d import ICONPATH
     from freecad.workbench_gespal3d import DEBUG
@@ -56,11 +58,7 @@ class _CommandPanel:
         }
 
     def IsActive(self):
-        active = False
-        if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if obj.Name == "Product":
-                    active = True
+        active = g3d_registry.hasProduct()
 
         return active
 
@@ -80,6 +78,7 @@ class _CommandPanel:
         self.basepoint = None
         self.TrackerRect = g3d_tracker.rectangleTracker()
         self.TrackerRect.setPlane(self.wp.axis)
+        self.scheduler = g3d_tracker.UpdateScheduler(self.applyUpdate)
         title = translate("Gespal3D", "Premier coin du panneau ") + ":"
         Gui.Snapper.getPoint(
             callback=self.getpoint,
@@ -93,8 +92,10 @@ class _CommandPanel:
         # no point
         if point is None:
             print_debug("no point : finalize panel tracker")
+            self.scheduler.stop()
             self.TrackerRect.finalize()
             return
+        self.scheduler.reset()
         # first clic : pick rectangle origin
         if self.basepoint is None:
             print_debug("first point : set origin panel tracker")
@@ -112,12 +113,17 @@ class _CommandPanel:
             return
         # second clic : make panel
         print_debug("second point : finalize panel tracker")
+        self.scheduler.stop()
         self.TrackerRect.finalize()
         print_debug("second point : make panel transaction")
         self.makeTransaction(point)
 
     def update(self, point, info):
         "this function is called by the Snapper when the mouse is moved"
+        self.scheduler.push(point, info)
+
+    def applyUpdate(self, point, info):
+        "update the rectangle tracker, at most once per frame"
         if Gui.Control.activeDialog():
             if self.basepoint:
                 self.TrackerRect.update(point)
@@ -130,6 +136,10 @@ class _CommandPanel:
         taskwidget.setWindowTitle(translate("Gespal3D", "Ajout d'un panneau"))
         grid = QtGui.QGridLayout(taskwidget)
 
+        # search box
+        self.component_search = g3d_search.ComponentSearch(self)
+        self.component_search.addToGrid(grid, 1)
+
         # categories box
         categories_items = [x[1] for x in self.categories]
         categories_label = QtGui.QLabel(translate("Gespal3D", "C&atégorie"))
@@ -387,41 +397,21 @@ class _CommandPanel:
                 translate("Gespal3D", "Ajouter un panneau")
             )
             print_debug("open transaction : Ok")
-            Gui.addModule("Arch")
-            print_debug("addModule Arch : Ok")
-            # Create panel wit Arch Tool
-            Gui.doCommand(
-                "p = Arch.makePanel("
-                + "length="
-                + str(length)
-                + ","
-                + "width="
-                + str(height)
-                + ","
-                + "thickness="
-                + str(self.thickness)
-                + ")"
-            )
-
-            Gui.doCommand("pl = App.Placement()")
-            Gui.doCommand("pl.Rotation.Q = " + qr)
-            Gui.doCommand("pl.Base = " + DraftVecUtils.toString(base))
-            Gui.doCommand("p.Placement = pl")
-
-            # Info Gespal
-            Gui.doCommand('p.Label = "' + self.Profile[1] + '"')
-            Gui.doCommand('p.IfcType = u"Transport Element"')
-            Gui.doCommand('p.PredefinedType = u"NOTDEFINED"')
-            Gui.doCommand('p.Tag = u"Gespal"')
-            Gui.doCommand('p.Description = "' + str(self.Profile[0]) + '"')
-
-            color = self.Profile[7].split(",")
-            r = str(int(color[0]) / 255)
-            g = str(int(color[1]) / 255)
-            b = str(int(color[2]) / 255)
-            Gui.doCommand(
-                "p.ViewObject.ShapeColor = (" + r + "," + g + "," + b + ")"
-            )
+            if self.p.GetBool("LightweightComponents", False):
+                Gui.addModule("freecad.workbench_gespal3d.g3d_component")
+                Gui.doCommand("pl = App.Placement()")
+                Gui.doCommand("pl.Rotation.Q = " + qr)
+                Gui.doCommand("pl.Base = " + DraftVecUtils.toString(base))
+                Gui.doCommand(
+                    "p = freecad.workbench_gespal3d.g3d_component.makeG3DComponentPanel("
+                    + "g3d_profile={}, ".format(str(self.Profile))
+                    + "length={}, ".format(length)
+                    + "width={}, ".format(height)
+                    + "thickness={}, ".format(self.thickness)
+                    + "placement=pl)"
+                )
+            else:
+                self.makeArchPanel(length, height, qr, base)
 
             print_debug("all doCommand : Ok")
             App.ActiveDocument.commitTransaction()
@@ -437,6 +427,44 @@ class _CommandPanel:
         if self.continueCmd:
             self.Activated()
 
+    def makeArchPanel(self, length, height, qr, base):
+        "create the panel with the Arch tool, inside the open transaction"
+        Gui.addModule("Arch")
+        print_debug("addModule Arch : Ok")
+        # Create panel wit Arch Tool
+        Gui.doCommand(
+            "p = Arch.makePanel("
+            + "length="
+            + str(length)
+            + ","
+            + "width="
+            + str(height)
+            + ","
+            + "thickness="
+            + str(self.thickness)
+            + ")"
+        )
+
+        Gui.doCommand("pl = App.Placement()")
+        Gui.doCommand("pl.Rotation.Q = " + qr)
+        Gui.doCommand("pl.Base = " + DraftVecUtils.toString(base))
+        Gui.doCommand("p.Placement = pl")
+
+        # Info Gespal
+        Gui.doCommand('p.Label = "' + self.Profile[1] + '"')
+        Gui.doCommand('p.IfcType = u"Transport Element"')
+        Gui.doCommand('p.PredefinedType = u"NOTDEFINED"')
+        Gui.doCommand('p.Tag = u"Gespal"')
+        Gui.doCommand('p.Description = "' + str(self.Profile[0]) + '"')
+
+        color = self.Profile[7].split(",")
+        r = str(int(color[0]) / 255)
+        g = str(int(color[1]) / 255)
+        b = str(int(color[2]) / 255)
+        Gui.doCommand(
+            "p.ViewObject.ShapeColor = (" + r + "," + g + "," + b + ")"
+        )
+
 
 if App.GuiUp:
     Gui.addCommand("G3D_PanelComposant", _CommandPanel())
@@ -9,6 +9,7 @@ if App.GuiUp:
     from PySide import QtCore, QtGui
     from DraftTools import translate
     from PySide.QtCore import QT_TRANSLATE_NOOP
+    from freecad.workbench_gespal3d import g3d_registry
 else:
     # \cond
     def translate(ctxt, txt):
@@ -136,13 +137,9 @@ class _CommandEnveloppe:
         }
 
     def IsActive(self):
-        active = True
+        active = False
         if App.ActiveDocument:
-            for obj in App.ActiveDocument.Objects:
-                if obj.Name == "Product":
-                    active = False
-        else:
-            active = False
+            active = not g3d_registry.hasProduct()
 
         return active
 
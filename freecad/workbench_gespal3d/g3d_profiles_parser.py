@@ -2,6 +2,7 @@
 
 import FreeCAD as App
 import os
+from collections import OrderedDict
 
 if App.GuiUp:
     import FreeCADGui
@@ -10,6 +11,7 @@ if App.GuiUp:
     from PySide import QtCore, QtGui
     from DraftTools import translate
     from PySide.QtCore import QT_TRANSLATE_NOOP
+    from freecad.workbench_gespal3d.g3d_importer import readPresets
 else:
     # \cond
     def translate(ctxt, txt):
@@ -26,6 +28,170 @@ __author__ = "Jonathan Wiedemann"
 __url__ = "https://freecad-france.com"
 
 
+# Name of the shared section object of each section key, per document.
+_sections = {}
+
+# Profile faces already built, by (shape code, dimensions), least recently
+# used first.
+_faces = OrderedDict()
+FACE_CACHE_SIZE = 64
+
+
+def getProfileFace(code, dimensions):
+    """
+    Return the face of a profile, centered on the origin in the XY plane.
+    The faces are built once per shape code and dimensions, the caller
+    applies its placement to the copy held by its Shape property.
+    :param code: str, shape code C, H, R, RH, T or U
+    :param dimensions: tuple[float]
+    :return: Part.Face
+    """
+    key = (code, tuple(round(float(d), 6) for d in dimensions))
+    face = _faces.get(key)
+    if face is not None:
+        _faces.move_to_end(key)
+        return face
+    face = FACE_BUILDERS[code](*key[1])
+    _faces[key] = face
+    if len(_faces) > FACE_CACHE_SIZE:
+        _faces.popitem(last=False)
+    return face
+
+
+def makePolygonFace(points):
+    return Part.Face(Part.makePolygon(points + [points[0]]))
+
+
+def makeFaceC(diameter):
+    circle = Part.Circle(
+        App.Vector(0.0, 0.0, 0.0),
+        App.Vector(0.0, 0.0, 1.0),
+        diameter / 2)
+    return Part.Face(Part.Wire(circle.toShape()))
+
+
+def makeFaceH(width, height, web, flange):
+    w = width / 2
+    h = height / 2
+    t = web / 2
+    return makePolygonFace([
+        App.Vector(-w, -h, 0), App.Vector(w, -h, 0),
+        App.Vector(w, -h + flange, 0), App.Vector(t, -h + flange, 0),
+        App.Vector(t, h - flange, 0), App.Vector(w, h - flange, 0),
+        App.Vector(w, h, 0), App.Vector(-w, h, 0),
+        App.Vector(-w, h - flange, 0), App.Vector(-t, h - flange, 0),
+        App.Vector(-t, -h + flange, 0), App.Vector(-w, -h + flange, 0),
+    ])
+
+
+def makeFaceR(height, width):
+    h = height / 2
+    w = width / 2
+    # Counterclockwise, the normal is +Z
+    return makePolygonFace([
+        App.Vector(-h, -w, 0), App.Vector(h, -w, 0),
+        App.Vector(h, w, 0), App.Vector(-h, w, 0),
+    ])
+
+
+def makeFaceRH(width, height, thickness):
+    w = width / 2
+    h = height / 2
+    outer = Part.makePolygon([
+        App.Vector(-w, -h, 0), App.Vector(w, -h, 0),
+        App.Vector(w, h, 0), App.Vector(-w, h, 0),
+        App.Vector(-w, -h, 0),
+    ])
+    w -= thickness
+    h -= thickness
+    inner = Part.makePolygon([
+        App.Vector(-w, -h, 0), App.Vector(w, -h, 0),
+        App.Vector(w, h, 0), App.Vector(-w, h, 0),
+        App.Vector(-w, -h, 0),
+    ])
+    # The inner wire is a hole of the outer one, no boolean needed
+    return Part.Face([outer, inner], "Part::FaceMakerBullseye")
+
+
+def makeFaceT(height, width):
+    h = height / 2
+    w = width / 2
+    return makePolygonFace([
+        App.Vector(-h, -w, 0), App.Vector(h, -w, 0), App.Vector(-h, w, 0),
+    ])
+
+
+def makeFaceU(width, height, web, flange):
+    w = width / 2
+    h = height / 2
+    return makePolygonFace([
+        App.Vector(-w, -h, 0), App.Vector(w, -h, 0),
+        App.Vector(w, h, 0), App.Vector(w - flange, h, 0),
+        App.Vector(w - flange, web - h, 0), App.Vector(-w + flange, web - h, 0),
+        App.Vector(-w + flange, h, 0), App.Vector(-w, h, 0),
+    ])
+
+
+FACE_BUILDERS = {
+    "C": makeFaceC,
+    "H": makeFaceH,
+    "R": makeFaceR,
+    "RH": makeFaceRH,
+    "T": makeFaceT,
+    "U": makeFaceU,
+}
+
+
+def getSectionKey(profile):
+    """
+    Return the key shared by the profiles giving the same section.
+    :param profile: list[int, str, int, int, int, int, str]
+    :return: str, shape code and dimensions, e.g. "R:100x22"
+    """
+    return "{}:{:g}x{:g}".format(profile[6], float(profile[4]), float(profile[5]))
+
+
+def getSection(profile=[0, 'REC100x100', 1, 100, 100, 100, 'R']):
+    """
+    getSection(profile): returns the section object of the active document
+    for this profile. Profiles with the same shape code and dimensions share
+    one hidden section placed at the origin, it is created the first time.
+    The key is stored in the SectionKey property so the sections are found
+    again when the document is reopened.
+    :param profile: list[int, str, int, int, int, int, str]
+    :return: object
+    """
+    doc = App.ActiveDocument
+    if not doc:
+        App.Console.PrintError("No active document. Aborting\n")
+        return
+    key = getSectionKey(profile)
+    registry = _sections.get(doc.Name)
+    if registry is None:
+        registry = {}
+        for obj in doc.Objects:
+            if hasattr(obj, "SectionKey"):
+                registry[obj.SectionKey] = obj.Name
+        _sections[doc.Name] = registry
+
+    section = None
+    if key in registry:
+        section = doc.getObject(registry[key])
+    if section is None or getattr(section, "SectionKey", None) != key:
+        section = makeProfile(profile)
+        section.addProperty(
+            "App::PropertyString",
+            "SectionKey",
+            "Draft",
+            QT_TRANSLATE_NOOP("App::Property", "Key of the shared section")
+            ).SectionKey = key
+        section.setEditorMode("SectionKey", 1)
+        if App.GuiUp:
+            section.ViewObject.Visibility = False
+        registry[key] = section.Name
+    return section
+
+
 def makeProfile(profile=[0, 'REC100x100', 1, 100, 100, 100, 'R']):
     """
     makeProfile(profile): returns a shape with the face defined by the \
@@ -88,13 +254,7 @@ class _ProfileC(_Profile):
 
     def execute(self, obj):
         pl = obj.Placement
-        c = Part.Circle(
-            App.Vector(0.0, 0.0, 0.0),
-            App.Vector(0.0, 0.0, 1.0),
-            obj.Diameter.Value/2)
-        w = Part.Wire(c.toShape())
-        f = Part.Face(w)
-        obj.Shape = f
+        obj.Shape = getProfileFace("C", (obj.Diameter.Value,))
         obj.Placement = pl
 
 
@@ -111,22 +271,9 @@ class _ProfileH(_Profile):
 
     def execute(self,obj):
         pl = obj.Placement
-        p1 = App.Vector(-obj.Width.Value/2,-obj.Height.Value/2,0)
-        p2 = App.Vector(obj.Width.Value/2,-obj.Height.Value/2,0)
-        p3 = App.Vector(obj.Width.Value/2,(-obj.Height.Value/2)+obj.FlangeThickness.Value,0)
-        p4 = App.Vector(obj.WebThickness.Value/2,(-obj.Height.Value/2)+obj.FlangeThickness.Value,0)
-        p5 = App.Vector(obj.WebThickness.Value/2,obj.Height.Value/2-obj.FlangeThickness.Value,0)
-        p6 = App.Vector(obj.Width.Value/2,obj.Height.Value/2-obj.FlangeThickness.Value,0)
-        p7 = App.Vector(obj.Width.Value/2,obj.Height.Value/2,0)
-        p8 = App.Vector(-obj.Width.Value/2,obj.Height.Value/2,0)
-        p9 = App.Vector(-obj.Width.Value/2,obj.Height.Value/2-obj.FlangeThickness.Value,0)
-        p10 = App.Vector(-obj.WebThickness.Value/2,obj.Height.Value/2-obj.FlangeThickness.Value,0)
-        p11 = App.Vector(-obj.WebThickness.Value/2,(-obj.Height.Value/2)+obj.FlangeThickness.Value,0)
-        p12 = App.Vector(-obj.Width.Value/2,(-obj.Height.Value/2)+obj.FlangeThickness.Value,0)
-        p = Part.makePolygon([p1,p2,p3,p4,p5,p6,p7,p8,p9,p10,p11,p12,p1])
-        p = Part.Face(p)
-        #p.reverse()
-        obj.Shape = p
+        obj.Shape = getProfileFace("H", (
+            obj.Width.Value, obj.Height.Value,
+            obj.WebThickness.Value, obj.FlangeThickness.Value))
         obj.Placement = pl
 
 
@@ -151,14 +298,7 @@ class _ProfileR(_Profile):
 
     def execute(self, obj):
         pl = obj.Placement
-        p1 = App.Vector(-obj.Height.Value/2, -obj.Width.Value/2, 0)
-        p2 = App.Vector(-obj.Height.Value/2, obj.Width.Value/2, 0)
-        p3 = App.Vector(obj.Height.Value/2, obj.Width.Value/2, 0)
-        p4 = App.Vector(obj.Height.Value/2, -obj.Width.Value/2, 0)
-        p = Part.makePolygon([p1, p2, p3, p4, p1])
-        p = Part.Face(p)
-        p.reverse()
-        obj.Shape = p
+        obj.Shape = getProfileFace("R", (obj.Height.Value, obj.Width.Value))
         obj.Placement = pl
 
 
@@ -183,14 +323,7 @@ class _ProfileT(_Profile):
 
     def execute(self, obj):
         pl = obj.Placement
-        p1 = App.Vector(-obj.Height.Value/2, -obj.Width.Value/2, 0)
-        p2 = App.Vector(-obj.Height.Value/2, obj.Width.Value/2, 0)
-        p3 = App.Vector(obj.Height.Value/2, -obj.Width.Value/2, 0)
-        #p4 = App.Vector(obj.Height.Value/2, -obj.Width.Value/2, 0)
-        p = Part.makePolygon([p1, p2, p3, p1])
-        p = Part.Face(p)
-        p.reverse()
-        obj.Shape = p
+        obj.Shape = getProfileFace("T", (obj.Height.Value, obj.Width.Value))
         obj.Placement = pl
 
 
@@ -206,22 +339,8 @@ class _ProfileRH(_Profile):
 
     def execute(self,obj):
         pl = obj.Placement
-        p1 = App.Vector(-obj.Width.Value/2,-obj.Height.Value/2,0)
-        p2 = App.Vector(obj.Width.Value/2,-obj.Height.Value/2,0)
-        p3 = App.Vector(obj.Width.Value/2,obj.Height.Value/2,0)
-        p4 = App.Vector(-obj.Width.Value/2,obj.Height.Value/2,0)
-        q1 = App.Vector(-obj.Width.Value/2+obj.Thickness.Value,-obj.Height.Value/2+obj.Thickness.Value,0)
-        q2 = App.Vector(obj.Width.Value/2-obj.Thickness.Value,-obj.Height.Value/2+obj.Thickness.Value,0)
-        q3 = App.Vector(obj.Width.Value/2-obj.Thickness.Value,obj.Height.Value/2-obj.Thickness.Value,0)
-        q4 = App.Vector(-obj.Width.Value/2+obj.Thickness.Value,obj.Height.Value/2-obj.Thickness.Value,0)
-        p = Part.makePolygon([p1,p2,p3,p4,p1])
-        q = Part.makePolygon([q1,q2,q3,q4,q1])
-        #r = Part.Face([p,q])
-        #r.reverse()
-        p = Part.Face(p)
-        q = Part.Face(q)
-        r = p.cut(q)
-        obj.Shape = r
+        obj.Shape = getProfileFace("RH", (
+            obj.Width.Value, obj.Height.Value, obj.Thickness.Value))
         obj.Placement = pl
 
 
@@ -238,18 +357,9 @@ class _ProfileU(_Profile):
 
     def execute(self,obj):
         pl = obj.Placement
-        p1 = App.Vector(-obj.Width.Value/2,-obj.Height.Value/2,0)
-        p2 = App.Vector(obj.Width.Value/2,-obj.Height.Value/2,0)
-        p3 = App.Vector(obj.Width.Value/2,obj.Height.Value/2,0)
-        p4 = App.Vector(obj.Width.Value/2-obj.FlangeThickness.Value,obj.Height.Value/2,0)
-        p5 = App.Vector(obj.Width.Value/2-obj.FlangeThickness.Value,obj.WebThickness.Value-obj.Height.Value/2,0)
-        p6 = App.Vector(-obj.Width.Value/2+obj.FlangeThickness.Value,obj.WebThickness.Value-obj.Height.Value/2,0)
-        p7 = App.Vector(-obj.Width.Value/2+obj.FlangeThickness.Value,obj.Height.Value/2,0)
-        p8 = App.Vector(-obj.Width.Value/2,obj.Height.Value/2,0)
-        p = Part.makePolygon([p1,p2,p3,p4,p5,p6,p7,p8,p1])
-        p = Part.Face(p)
-        #p.reverse()
-        obj.Shape = p
+        obj.Shape = getProfileFace("U", (
+            obj.Width.Value, obj.Height.Value,
+            obj.WebThickness.Value, obj.FlangeThickness.Value))
         obj.Placement = pl
 
 
@@ -334,8 +444,8 @@ class ProfileTaskPanel:
             # try to find by size
             if hasattr(self.obj, "Width") and hasattr(self.obj, "Height"):
                 for pre in self.presets:
-                    if abs(self.obj.Width - self.profile[5]) < 0.1 and \
-                       abs(self.obj.Height - self.Profile[5]) < 0.1:
+                    if len(pre) > 5 and abs(self.obj.Width - pre[4]) < 0.1 and \
+                       abs(self.obj.Height - pre[5]) < 0.1:
                         self.profile = pre
                         break
         if self.profile:
@@ -371,9 +481,9 @@ class ProfileTaskPanel:
     def accept(self):
 
         if self.profile:
-            self.obj.Label = self.profile[1]
+            self.obj.Label = self.profile[2]
             if self.type in ["H", "R", "RH", "U", "T"]:
-                self.obj.Width = self.profile[5]
+                self.obj.Width = self.profile[4]
                 self.obj.Height = self.profile[5]
                 if self.type in ["H", "U"]:
                     self.obj.WebThickness = self.profile[6]
@@ -381,8 +491,7 @@ class ProfileTaskPanel:
                 elif self.type == "RH":
                     self.obj.Thickness = self.profile[6]
             elif self.type == "C":
-                self.obj.OutDiameter = self.profile[5]
-                self.obj.Thickness = self.profile[5]
+                self.obj.Diameter = self.profile[4]
             App.ActiveDocument.recompute()
             FreeCADGui.ActiveDocument.resetEdit()
         return True
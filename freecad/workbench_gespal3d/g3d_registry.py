@@ -0,0 +1,177 @@
+# coding: utf-8
+
+import FreeCAD as App
+
+from freecad.workbench_gespal3d import print_debug
+
+
+__title__ = "Gespal 3D Registry"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+# Registry of each document, by document name. Only used while the
+# observer is installed, otherwise the registries are built on demand.
+_registries = {}
+_observer = None
+
+
+def is_gespal_object(obj):
+    if hasattr(obj, "Tag"):
+        if obj.Tag == "Gespal":
+            if hasattr(obj, "Description"):
+                if obj.Description is not None:
+                    return True
+    return False
+
+
+class DocumentRegistry:
+    """
+    Names of the Gespal objects of a document : tagged components,
+    mirrors and links, dimensions and the objects which can be machined. The
+    Product, its Box and the listing sheets have fixed names and are
+    found with doc.getObject.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        # Components, mirrors and links share one dict
+        self.listed = {}
+        self.dimensions = {}
+        self.machinable = {}
+        for obj in doc.Objects:
+            self.track(obj)
+
+    def track(self, obj):
+        name = obj.Name
+        if is_gespal_object(obj) or obj.TypeId in ("Part::Mirroring", "App::Link"):
+            self.listed[name] = True
+        else:
+            self.listed.pop(name, None)
+        if "Dimension" in name:
+            self.dimensions[name] = True
+        if "Structure" in name or "Panel" in name:
+            self.machinable[name] = True
+
+    def untrack(self, obj):
+        name = obj.Name
+        self.listed.pop(name, None)
+        self.dimensions.pop(name, None)
+        self.machinable.pop(name, None)
+
+    def getObjects(self, names):
+        # doc.Objects gives the order of the original document scan
+        if len(names) == 0:
+            return []
+        return [obj for obj in self.doc.Objects if obj.Name in names]
+
+    def getProduct(self):
+        return self.doc.getObject("Product")
+
+    def getProductBox(self):
+        return self.doc.getObject("Box")
+
+    def hasProduct(self):
+        return self.getProduct() is not None
+
+    def hasMachinable(self):
+        return len(self.machinable) > 0
+
+    def getListedObjects(self):
+        """
+        Return the Gespal components, the mirrors and the links in document
+        order, the source of the mirrors and links is not checked.
+        """
+        return self.getObjects(self.listed)
+
+    def getDimensions(self):
+        return self.getObjects(self.dimensions)
+
+
+class RegistryObserver:
+    """Keep the registries up to date with the document changes."""
+
+    def slotCreatedObject(self, obj):
+        registry = _registries.get(obj.Document.Name)
+        if registry is not None:
+            registry.track(obj)
+
+    def slotDeletedObject(self, obj):
+        registry = _registries.get(obj.Document.Name)
+        if registry is not None:
+            registry.untrack(obj)
+
+    def slotChangedObject(self, obj, prop):
+        if prop not in ("Tag", "Description"):
+            return
+        registry = _registries.get(obj.Document.Name)
+        if registry is not None:
+            registry.track(obj)
+
+    def slotFinishRestoreDocument(self, doc):
+        # Objects are created before their properties are restored
+        _registries.pop(doc.Name, None)
+
+    def slotDeletedDocument(self, doc):
+        _registries.pop(doc.Name, None)
+
+    def slotUndoDocument(self, doc):
+        _registries.pop(doc.Name, None)
+
+    def slotRedoDocument(self, doc):
+        _registries.pop(doc.Name, None)
+
+
+def install():
+    """Install the document observer, called once by the workbench."""
+    global _observer
+    if _observer is None:
+        _observer = RegistryObserver()
+        App.addDocumentObserver(_observer)
+        print_debug("Gespal3D registry observer installed.")
+
+
+def uninstall():
+    global _observer
+    if _observer is not None:
+        App.removeDocumentObserver(_observer)
+        _observer = None
+    _registries.clear()
+
+
+def getRegistry(doc=None):
+    """
+    Return the registry of the document, the active one by default.
+    Without the observer the registry is built from the document each time.
+    :param doc: App.Document
+    :return: DocumentRegistry or None
+    """
+    if doc is None:
+        doc = App.ActiveDocument
+    if doc is None:
+        return None
+    if _observer is None:
+        return DocumentRegistry(doc)
+    registry = _registries.get(doc.Name)
+    if registry is None:
+        registry = DocumentRegistry(doc)
+        _registries[doc.Name] = registry
+    return registry
+
+
+def hasProduct(doc=None):
+    """True if the document, the active one by default, has a Product."""
+    if doc is None:
+        doc = App.ActiveDocument
+    if doc is None:
+        return False
+    return doc.getObject("Product") is not None
+
+
+def hasMachinable(doc=None):
+    """True if the document has a structure or a panel to machine."""
+    registry = getRegistry(doc)
+    if registry is None:
+        return False
+    return registry.hasMachinable()
@@ -0,0 +1,118 @@
+# coding: utf-8
+
+import FreeCAD as App
+
+if App.GuiUp:
+    from PySide import QtCore, QtGui
+    from DraftTools import translate
+    from freecad.workbench_gespal3d import g3d_connect_db
+    from freecad.workbench_gespal3d import print_debug
+else:
+    # \cond
+    def translate(ctxt, txt):
+        return txt
+
+    # \endcond
+
+
+__title__ = "Gespal 3D Component search"
+__license__ = "LGPLv2.1"
+__author__ = "Jonathan Wiedemann"
+__url__ = "https://freecad-france.com"
+
+
+# Number of components proposed by the completer
+SEARCH_LIMIT = 20
+# Shorter searches would match most of the catalog
+SEARCH_MIN_LENGTH = 2
+
+
+def selectComposant(panel, comp):
+    """
+    Select a component in the category and type combo boxes of a task panel.
+    :param panel: task panel with categories, categories_cb, composant_cb
+                  and composant_items
+    :param comp: Composant row
+    :return: True if the component was found in the panel
+    """
+    for n, categorie in enumerate(panel.categories):
+        if categorie[0] == comp[2]:
+            # Fills composant_items through setCategory when the index changes
+            panel.categories_cb.setCurrentIndex(n)
+            break
+    else:
+        return False
+    for n, composant in enumerate(panel.composant_items):
+        if composant[0] == comp[0]:
+            panel.composant_cb.setCurrentIndex(n)
+            return True
+    return False
+
+
+class ComponentSearch(QtCore.QObject):
+    """
+    Search field of the task panels. The completer proposes the components
+    of the panel categories matching the name words and dimensions typed,
+    e.g. "22x100 L1200 douglas" or "section 22x100 ±1 mm", and the chosen
+    one is selected in the combo boxes of the panel.
+    """
+
+    def __init__(self, panel, parent=None):
+        super(ComponentSearch, self).__init__(parent)
+        self.panel = panel
+        self.label = QtGui.QLabel(translate("Gespal3D", "&Recherche"))
+        self.line_edit = QtGui.QLineEdit()
+        self.line_edit.setPlaceholderText("22x100 L1200 douglas ±1")
+        self.line_edit.setToolTip(
+            "<html><head/><body><p><b>Rechercher un composant.</b> \
+            <br><br> \
+            Saisir des mots du nom, une section (22x100), une longueur \
+            (L1200) et une tolérance (±1). \
+            </p></body></html>")
+        self.label.setBuddy(self.line_edit)
+
+        self.model = QtGui.QStandardItemModel(self)
+        self.completer = QtGui.QCompleter(self.model, self.line_edit)
+        # The rows come from the search index, the completer must not filter them again
+        self.completer.setCompletionMode(QtGui.QCompleter.UnfilteredPopupCompletion)
+        self.completer.setMaxVisibleItems(SEARCH_LIMIT)
+        self.line_edit.setCompleter(self.completer)
+
+        QtCore.QObject.connect(
+            self.line_edit,
+            QtCore.SIGNAL("textEdited(QString)"),
+            self.search,
+        )
+        QtCore.QObject.connect(
+            self.completer,
+            QtCore.SIGNAL("activated(QModelIndex)"),
+            self.select,
+        )
+        # The index is built in the background while the panel is filled in
+        g3d_connect_db.prepareSearch()
+
+    def addToGrid(self, grid, row):
+        grid.addWidget(self.label, row, 0, 1, 1)
+        grid.addWidget(self.line_edit, row, 1, 1, 1)
+
+    def search(self, text):
+        self.model.clear()
+        if len(text.strip()) < SEARCH_MIN_LENGTH:
+            return
+        categories = [x[0] for x in self.panel.categories]
+        rows = g3d_connect_db.searchComposants(
+            text, categories=categories, limit=SEARCH_LIMIT)
+        for row in rows:
+            item = QtGui.QStandardItem(row[1])
+            item.setData(row[0], QtCore.Qt.UserRole)
+            self.model.appendRow(item)
+        if len(rows) > 0:
+            self.completer.complete()
+
+    def select(self, index):
+        co_compteur = index.data(QtCore.Qt.UserRole)
+        comp = g3d_connect_db.getComposant(id=co_compteur)
+        if comp is None:
+            return
+        print_debug(["ComponentSearch select :", comp[1]])
+        selectComposant(self.panel, comp)
@@ -1,8 +1,11 @@
 # coding: utf-8
 
+import time
+
 import FreeCAD as App
 from FreeCAD import Vector
 import DraftVecUtils
+from PySide import QtCore
 from draftguitools.gui_trackers import Tracker
 from pivy import coin
 from freecad.workbench_gespal3d import DEBUG
@@ -18,6 +21,74 @@ __author__ = "Jonathan Wiedemann"
 __url__ = "https://freecad-france.com"
 
 
+class UpdateScheduler:
+    """
+    Rate limiter between the snapper mouse events and a tracker update.
+    Events are coalesced : at most one update per frame is applied, with
+    the latest point, and a point equal to the last applied one is
+    skipped. The received, applied and skipped counters tell how much
+    work was saved.
+    """
+
+    def __init__(self, callback, fps=30):
+        self.callback = callback
+        self.interval = 1.0 / fps
+        self.received = 0
+        self.applied = 0
+        self.skipped = 0
+        self.pending = None
+        self.last_point = None
+        self.last_time = 0.0
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        QtCore.QObject.connect(self.timer, QtCore.SIGNAL("timeout()"), self.flush)
+
+    def push(self, point, info=None):
+        """Called by the snapper movecallback."""
+        self.received += 1
+        self.pending = (point, info)
+        elapsed = time.monotonic() - self.last_time
+        if elapsed >= self.interval:
+            self.timer.stop()
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start(int((self.interval - elapsed) * 1000))
+
+    def flush(self):
+        if self.pending is None:
+            return
+        point, info = self.pending
+        self.pending = None
+        if point is not None and self.last_point is not None \
+                and DraftVecUtils.equals(point, self.last_point):
+            self.skipped += 1
+            return
+        self.last_point = point
+        self.last_time = time.monotonic()
+        self.applied += 1
+        self.callback(point, info)
+
+    def reset(self):
+        """Forget the last point, the next event is always applied."""
+        self.pending = None
+        self.last_point = None
+        self.timer.stop()
+
+    def stop(self):
+        self.reset()
+        if DEBUG_T:
+            App.Console.PrintMessage(
+                "update scheduler : {} events received, {} applied, {} skipped\n".format(
+                    self.received, self.applied, self.skipped))
+
+    def getStats(self):
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "skipped": self.skipped,
+        }
+
+
 class beamTracker(Tracker):
     '''A box tracker, can be based on a line object.'''
 
@@ -53,8 +124,6 @@ class beamTracker(Tracker):
     ):
         '''Update the tracker.'''
 
-        import DraftGeomUtils
-
         if base_snap_vertex == None:
             base_snap_vertex = Vector(0.0, 0.0, 0.0)
         if final_snap_vertex == None:
@@ -144,28 +213,55 @@ class beamTracker(Tracker):
             return self.cube.depth.getValue()
 
 
-class arrayBoxTracker(Tracker):
-    """A tracker to show multiple box distributed along a line"""
+class arrayBoxTracker(beamTracker):
+    """A tracker to show multiple box distributed along a line.
 
-    def __init__(self):
+    One box is placed like a beamTracker on the first segment, a
+    SoMultipleCopy draws it again at the offset of every other segment.
+    All the copies are set with a single field update per mouse move.
+    """
+
+    def __init__(self, width=0.1, height=1):
         self.trans = coin.SoTransform()
         w = coin.SoDrawStyle()
         w.style = coin.SoDrawStyle.LINES
-        cube = coin.SoCube()
-        self.array = coin.SoArray()
-        self.array.addChild(cube)
+        self.cube = coin.SoCube()
+        self.cube.height.setValue(width)
+        self.cube.depth.setValue(height)
+        self.baseline = None
+        self.copies = coin.SoMultipleCopy()
+        self.copies.addChild(self.trans)
+        self.copies.addChild(self.cube)
         Tracker.__init__(
-            self, children=[self.trans, w, self.array], name="arrayBoxTracker"
+            self, children=[w, self.copies], name="arrayBoxTracker"
         )
 
-    def update(self, qte=1, line=None, start=False, end=False):
-        if qte == 1:
-            # mettre la barre au milieu des 2 points
-            pass
-        if qte > 1:
-            for i in range(qte):
-                cube = coin.SoCube()
-                self.array.addChild(cube)
+    def setSize(self, width, height):
+        """Set the section of the boxes."""
+        self.cube.height.setValue(width)
+        self.cube.depth.setValue(height)
+
+    def update(self, inclination=0.0, anchor_idx=0, segments=None):
+        """Update the tracker from a list of (p1, p2) segments, all the
+        segments must have the same direction and length."""
+        if not segments:
+            return
+        base, final = segments[0]
+        beamTracker.update(
+            self,
+            inclination=inclination,
+            anchor_idx=anchor_idx,
+            base_snap_vertex=base,
+            final_snap_vertex=final,
+        )
+        matrices = []
+        for p1, p2 in segments:
+            offset = p1.sub(base)
+            matrix = coin.SbMatrix()
+            matrix.setTranslate(coin.SbVec3f(offset.x, offset.y, offset.z))
+            matrices.append(matrix)
+        self.copies.matrix.setValues(0, len(matrices), matrices)
+        self.copies.matrix.setNum(len(matrices))
 
 
 class rectangleTracker(Tracker):
@@ -6,7 +6,9 @@ import FreeCAD as App
 from freecad.workbench_gespal3d import ICONPATH
 from freecad.workbench_gespal3d import PARAMPATH
 from freecad.workbench_gespal3d import g3d_connect_db
+from freecad.workbench_gespal3d import g3d_registry
 from freecad.workbench_gespal3d import g3d_product
+from freecad.workbench_gespal3d import g3d_component
 from freecad.workbench_gespal3d import g3d_beam
 from freecad.workbench_gespal3d import g3d_panel
 from freecad.workbench_gespal3d import g3d_accessory
@@ -57,6 +59,7 @@ class gespal3d_workbench(Gui.Workbench):
         "Draft_Upgrade",
         "Arch_Remove",
         "G3D_Delete",
+        "G3D_MigrateComponents",
     ]
     toolbox_create = [
         "Draft_Line",
@@ -83,6 +86,7 @@ class gespal3d_workbench(Gui.Workbench):
         d = App.ParamGet("User parameter:BaseApp/Preferences/Mod/Draft")
         d.SetBool("grid", False)
 
+        g3d_registry.install()
 
         self.appendToolbar(u"G3D Ajouter", self.toolbox_gespal3d)
         self.appendMenu(u"G3D Ajouter", self.toolbox_gespal3d)
@@ -124,7 +128,8 @@ class gespal3d_workbench(Gui.Workbench):
             if len(pages) > 0:
                 for page in pages:
                     page.KeepUpdated = True
-        pass
+
+        g3d_connect_db.close_connections()
 
 
 Gui.addWorkbench(gespal3d_workbench())